@@ -1,3 +1,18 @@
 from django.contrib import admin
+from .models import CrawlJob, PageValidator
 
 # Register your models here.
+
+@admin.register(CrawlJob)
+class CrawlJobAdmin(admin.ModelAdmin):
+    list_display = ('key', 'status', 'requests', 'pages_fetched', 'items_scraped', 'new_rows',
+                    'error_count', 'duration', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('key', 'keyword')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(PageValidator)
+class PageValidatorAdmin(admin.ModelAdmin):
+    list_display = ('url', 'etag', 'last_modified', 'content_length', 'unchanged_count', 'checked_at', 'changed_at')
+    search_fields = ('url',)
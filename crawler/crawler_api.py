@@ -4,10 +4,16 @@ This is a simplified version that works without scraping for demo purposes
 """
 import threading
 import hashlib
+import logging
 import random
 import datetime
+from collections import Counter
 
 from newsapp.models import NewsArticle, NewsSource
+from newsapp.page_cache import bump_ingest_generation
+from .dedup import is_duplicate, record_insert, save_filter
+
+logger = logging.getLogger(__name__)
 
 # Sample headlines and summaries for demo purposes with common keywords like politics, sports, technology, business, entertainment
 SAMPLE_NEWS = [
@@ -195,6 +201,7 @@ class NewsCrawler(threading.Thread):
         threading.Thread.__init__(self)
         self.keyword = keyword
         self.source_id = source_id
+        self.dedup_counters = Counter()
         
     def run(self):
         """Run the crawler in a separate thread"""
@@ -211,6 +218,11 @@ class NewsCrawler(threading.Thread):
         # Simulate crawling by creating demo articles
         for source in sources:
             self.generate_articles(source)
+
+        bump_ingest_generation()
+        save_filter(NewsArticle)
+        logger.info(f"Dedup filter: {self.dedup_counters['lookups_skipped']} lookups skipped, "
+                    f"{self.dedup_counters['hits']} hits, {self.dedup_counters['false_positives']} false positives")
                 
     def generate_articles(self, source):
         """Generate sample articles for demo purposes"""
@@ -234,7 +246,7 @@ class NewsCrawler(threading.Thread):
                 content_hash = hashlib.sha256(content).hexdigest()
                 
                 # Check if article already exists
-                if not NewsArticle.objects.filter(content_hash=content_hash).exists():
+                if not is_duplicate(NewsArticle, content_hash, self.dedup_counters):
                     try:
                         # Save to database
                         NewsArticle.objects.create(
@@ -244,6 +256,7 @@ class NewsCrawler(threading.Thread):
                             url=url,
                             content_hash=content_hash
                         )
+                        record_insert(NewsArticle, content_hash)
                         print(f"Generated article: {headline}")
                     except Exception as e:
                         print(f"Error saving article: {str(e)}")
@@ -262,7 +275,7 @@ class NewsCrawler(threading.Thread):
                 content_hash = hashlib.sha256(content).hexdigest()
                 
                 # Save if not a duplicate
-                if not NewsArticle.objects.filter(content_hash=content_hash).exists():
+                if not is_duplicate(NewsArticle, content_hash, self.dedup_counters):
                     try:
                         NewsArticle.objects.create(
                             source=source,
@@ -271,6 +284,7 @@ class NewsCrawler(threading.Thread):
                             url=url,
                             content_hash=content_hash
                         )
+                        record_insert(NewsArticle, content_hash)
                         print(f"Generated article: {headline}")
                     except Exception as e:
                         print(f"Error saving article: {str(e)}")
@@ -311,7 +325,7 @@ class NewsCrawler(threading.Thread):
                 content_hash = hashlib.sha256(content).hexdigest()
                 
                 # Check if article already exists
-                if not NewsArticle.objects.filter(content_hash=content_hash).exists():
+                if not is_duplicate(NewsArticle, content_hash, self.dedup_counters):
                     try:
                         # Save to database
                         NewsArticle.objects.create(
@@ -321,6 +335,7 @@ class NewsCrawler(threading.Thread):
                             url=url,
                             content_hash=content_hash
                         )
+                        record_insert(NewsArticle, content_hash)
                         print(f"Generated article: {headline}")
                     except Exception as e:
                         print(f"Error saving article: {str(e)}")
@@ -0,0 +1,317 @@
+"""
+Probabilistic content-hash pre-filter for ingest deduplication
+
+Every ingest path checks ``content_hash`` against the database before
+writing. On a re-crawl most candidates are duplicates, but the ones that
+are new cost a query just to learn that. A Bloom filter over the stored
+hashes answers "definitely new" without touching the database; only
+possible duplicates are looked up.
+
+One filter is kept per model, built from the table on first use in the
+process, updated on insert and persisted to DEDUP_FILTER_DIR so the next
+process only has to catch up on rows added since the snapshot. The
+snapshot records the hash of the newest row it covers; if the database no
+longer has that row (e.g. it was recreated), the snapshot is rebuilt
+instead, as its ids would not match the table's.
+
+Rows moved to the archive by the retention job (newsapp/archive.py) keep
+counting as stored: their hashes are in the filter and in the lookups, so
+an archived story is not ingested again.
+"""
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_MIN_CAPACITY = 100000
+
+# magic, version, num_bits, num_hashes, capacity, count, max_pk, content_hash of max_pk
+_HEADER = struct.Struct('<4sHQIQQQ64s')
+_MAGIC = b'NFBF'
+_VERSION = 2
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over SHA-256 hex digests
+    """
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, content_hash):
+        # Content hashes are already SHA-256 hex digests, so the k positions are
+        # derived from two 64-bit slices of the digest (double hashing)
+        try:
+            h1 = int(content_hash[:16], 16)
+            h2 = int(content_hash[16:32], 16) | 1
+        except ValueError:
+            digest = hashlib.sha256(content_hash.encode('utf-8')).hexdigest()
+            h1 = int(digest[:16], 16)
+            h2 = int(digest[16:32], 16) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, content_hash):
+        for pos in self._positions(content_hash):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, content_hash):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(content_hash))
+
+    @property
+    def saturated(self):
+        return self.count > self.capacity
+
+
+class ContentHashFilter:
+    """
+    Bloom filter over one model's ``content_hash`` column
+    """
+    def __init__(self, model, path=None, error_rate=DEFAULT_ERROR_RATE, min_capacity=DEFAULT_MIN_CAPACITY):
+        self.model = model
+        self.path = path
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.bloom = None
+        self.max_pk = 0
+        self.last_hash = ''
+        self.totals = Counter()
+        self.lock = threading.Lock()
+
+    def load_or_build(self):
+        """Load the persisted snapshot and catch up on newer rows, or rebuild"""
+        if self.path and os.path.exists(self.path):
+            try:
+                self._load()
+                if not self._matches_database():
+                    logger.info(f"Dedup filter in {self.path} was built from another database, rebuilding")
+                else:
+                    self.refresh()
+                    if not self.bloom.saturated:
+                        return self
+                    logger.info(f"Dedup filter for {self.model.__name__} is saturated, rebuilding")
+            except Exception as e:
+                logger.warning(f"Could not load dedup filter from {self.path}: {str(e)}")
+        self.rebuild()
+        return self
+
+    def rebuild(self):
+        """Build a new filter from every content_hash in the table and its archive"""
+        from newsapp.archive import archived_count, iter_archived_hashes
+
+        rows = self.model.objects.count() + archived_count(self.model)
+        bloom = BloomFilter(max(self.min_capacity, rows * 2), self.error_rate)
+        max_pk, last_hash = 0, ''
+        for pk, content_hash in self.model.objects.order_by().values_list('pk', 'content_hash').iterator(chunk_size=5000):
+            bloom.add(content_hash)
+            if pk > max_pk:
+                max_pk, last_hash = pk, content_hash
+        for content_hash in iter_archived_hashes(self.model):
+            bloom.add(content_hash)
+        with self.lock:
+            self.bloom = bloom
+            self.max_pk = max_pk
+            self.last_hash = last_hash
+        logger.info(f"Built dedup filter for {self.model.__name__} from {rows} rows")
+
+    def refresh(self):
+        """Add rows inserted since the last snapshot, e.g. by another process"""
+        rows = self.model.objects.filter(pk__gt=self.max_pk).order_by().values_list('pk', 'content_hash')
+        with self.lock:
+            for pk, content_hash in rows.iterator(chunk_size=5000):
+                self.bloom.add(content_hash)
+                if pk > self.max_pk:
+                    self.max_pk, self.last_hash = pk, content_hash
+
+    def might_contain(self, content_hash):
+        return content_hash in self.bloom
+
+    def add(self, content_hash):
+        with self.lock:
+            self.bloom.add(content_hash)
+
+    def partition(self, hashes):
+        """Split hashes into (definitely new, possibly present)"""
+        new, maybe = set(), set()
+        for content_hash in hashes:
+            (maybe if content_hash in self.bloom else new).add(content_hash)
+        return new, maybe
+
+    def save(self):
+        """Persist the filter atomically next to the other snapshots"""
+        if not self.path:
+            return
+        with self.lock:
+            bloom = self.bloom
+            header = _HEADER.pack(_MAGIC, _VERSION, bloom.num_bits, bloom.num_hashes,
+                                  bloom.capacity, bloom.count, self.max_pk, self.last_hash.encode('ascii'))
+            data = bytes(bloom.bits)
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not save dedup filter to {self.path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            magic, version, num_bits, num_hashes, capacity, count, max_pk, last_hash = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError('unrecognised filter file')
+            bloom = BloomFilter(capacity, self.error_rate)
+            bloom.num_bits = num_bits
+            bloom.num_hashes = num_hashes
+            bloom.bits = bytearray(f.read())
+            bloom.count = count
+            if len(bloom.bits) != (num_bits + 7) // 8:
+                raise ValueError('truncated filter file')
+        self.bloom = bloom
+        self.max_pk = max_pk
+        self.last_hash = last_hash.rstrip(b'\0').decode('ascii')
+
+    def _matches_database(self):
+        """Whether the snapshot's newest row is still stored, live or archived"""
+        if not self.max_pk:
+            return True
+        return (self.model.objects.filter(pk=self.max_pk, content_hash=self.last_hash).exists()
+                or bool(_archived_hashes(self.model, [self.last_hash])))
+
+
+_filters = {}
+_filters_lock = threading.Lock()
+
+
+def get_filter(model):
+    """
+    Return the process-wide filter for a model, or None when disabled
+    """
+    if not getattr(settings, 'DEDUP_FILTER_ENABLED', True):
+        return None
+
+    with _filters_lock:
+        hash_filter = _filters.get(model)
+        if hash_filter is None:
+            directory = getattr(settings, 'DEDUP_FILTER_DIR', None)
+            path = os.path.join(directory, f'{model._meta.db_table}.bloom') if directory else None
+            hash_filter = ContentHashFilter(
+                model,
+                path=path,
+                error_rate=getattr(settings, 'DEDUP_FILTER_ERROR_RATE', DEFAULT_ERROR_RATE),
+            ).load_or_build()
+            _filters[model] = hash_filter
+    return hash_filter
+
+
+def is_duplicate(model, content_hash, counters=None):
+    """
+    Check whether a content hash is already stored, consulting the filter
+    first so definitely-new hashes never reach the database
+
+    Args:
+        model: Model class with a unique ``content_hash`` field
+        content_hash (str): Hash of the candidate article
+        counters (Counter, optional): Per-crawl counters to update
+    """
+    hash_filter = get_filter(model)
+    if hash_filter is None:
+        return _stored(model, content_hash)
+
+    counters = counters if counters is not None else Counter()
+    if not hash_filter.might_contain(content_hash):
+        _count(hash_filter, counters, 'lookups_skipped')
+        return False
+
+    _count(hash_filter, counters, 'hits')
+    exists = _stored(model, content_hash)
+    if not exists:
+        _count(hash_filter, counters, 'false_positives')
+    return exists
+
+
+def existing_hashes(model, hashes, counters=None):
+    """
+    Batch variant of is_duplicate: return the subset of hashes already stored
+    """
+    hashes = set(hashes)
+    hash_filter = get_filter(model)
+    if hash_filter is None:
+        maybe = hashes
+    else:
+        new, maybe = hash_filter.partition(hashes)
+        counters = counters if counters is not None else Counter()
+        _count(hash_filter, counters, 'lookups_skipped', len(new))
+        _count(hash_filter, counters, 'hits', len(maybe))
+
+    if not maybe:
+        return set()
+
+    existing = set(model.objects.filter(content_hash__in=maybe).values_list('content_hash', flat=True))
+    existing |= _archived_hashes(model, maybe - existing)
+    if hash_filter is not None:
+        _count(hash_filter, counters, 'false_positives', len(maybe) - len(existing))
+    return existing
+
+
+def record_insert(model, *hashes):
+    """Add newly stored hashes to the model's filter"""
+    hash_filter = get_filter(model)
+    if hash_filter is not None:
+        for content_hash in hashes:
+            hash_filter.add(content_hash)
+
+
+def refresh_filter(model):
+    """Catch the model's filter up with rows written by other processes"""
+    hash_filter = get_filter(model)
+    if hash_filter is not None:
+        hash_filter.refresh()
+
+
+def save_filter(model):
+    """Persist the model's filter if it has been loaded in this process"""
+    hash_filter = _filters.get(model)
+    if hash_filter is not None:
+        hash_filter.save()
+
+
+def report_stats(stats, counters):
+    """Copy per-crawl filter counters into Scrapy crawl stats"""
+    for key in ('lookups_skipped', 'hits', 'false_positives'):
+        stats.set_value(f'dedup_filter/{key}', counters.get(key, 0))
+
+
+def _archived_hashes(model, hashes):
+    from newsapp.archive import archived_hashes
+    return archived_hashes(model, hashes)
+
+
+def _stored(model, content_hash):
+    """Whether a hash is in the table or its archive"""
+    return model.objects.filter(content_hash=content_hash).exists() or bool(_archived_hashes(model, [content_hash]))
+
+
+def _count(hash_filter, counters, key, amount=1):
+    if amount:
+        counters[key] += amount
+        hash_filter.totals[key] += amount
@@ -0,0 +1,171 @@
+"""
+Scrapy extensions for the NewsFusion crawlers
+"""
+import django
+import os
+import sys
+import time
+import logging
+from django.conf import settings as django_settings
+from django.db import DatabaseError
+from django.utils import timezone
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+# Add the project directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'newsfusion.settings')
+django.setup()
+
+from .models import CrawlJob
+from . import metrics
+from .record_writer import defer_write
+
+DEFAULT_PROGRESS_INTERVAL = 2.0
+
+
+class CrawlJobProgress:
+    """
+    Keeps the spider's CrawlJob row up to date while it runs
+
+    Counters come from the crawl stats and are written with one UPDATE at
+    most every CRAWL_JOB_PROGRESS_INTERVAL seconds, plus a final write when
+    the spider closes. The writes run on the record_writer thread, off the
+    reactor. The spider's ``crawl_job_id`` argument names the row,
+    and whoever passed it (crawl service or crawl_worker) sets the final
+    status. Spiders started without one (e.g. ``scrapy crawl``) get a new
+    row, and the extension sets its final status itself.
+    """
+
+    def __init__(self, stats, interval=DEFAULT_PROGRESS_INTERVAL):
+        self.stats = stats
+        self.interval = interval
+        self.job_id = None
+        self.owns_job = False
+        self.started = None
+        self.last_write = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # Scrapy settings win, then the Django settings
+        if not crawler.settings.getbool('CRAWL_JOB_TRACKING',
+                                        getattr(django_settings, 'CRAWL_JOB_TRACKING', True)):
+            raise NotConfigured
+        interval = crawler.settings.getfloat(
+            'CRAWL_JOB_PROGRESS_INTERVAL',
+            getattr(django_settings, 'CRAWL_JOB_PROGRESS_INTERVAL', DEFAULT_PROGRESS_INTERVAL),
+        )
+        extension = cls(crawler.stats, interval)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.maybe_write, signal=signals.response_received)
+        crawler.signals.connect(extension.maybe_write, signal=signals.item_scraped)
+        return extension
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        self.last_write = self.started
+        return defer_write(self.open_record, getattr(spider, 'keyword', None), getattr(spider, 'crawl_job_id', None))
+
+    def open_record(self, keyword, job_id):
+        """Mark the job's row running, or create one (writer thread)"""
+        from .google_news_crawler import normalize_keyword
+
+        now = timezone.now()
+        try:
+            if job_id and CrawlJob.objects.filter(pk=job_id).update(
+                    status=CrawlJob.RUNNING, started_at=now, updated_at=now):
+                self.job_id = job_id
+                return
+            self.job_id = CrawlJob.objects.create(
+                key=normalize_keyword(keyword), keyword=keyword or None,
+                status=CrawlJob.RUNNING, started_at=now,
+            ).pk
+            self.owns_job = True
+        except DatabaseError as e:
+            self.job_id = None
+            logger.error(f"Could not record crawl job: {str(e)}")
+
+    def progress(self):
+        return {
+            'pages_fetched': self.stats.get_value('response_received_count', 0),
+            'items_scraped': self.stats.get_value('item_scraped_count', 0),
+            'new_rows': self.stats.get_value('new_articles_count', 0),
+            'error_count': self.stats.get_value('log_count/ERROR', 0),
+        }
+
+    def write(self, **fields):
+        """Queue an UPDATE of the row with the current counters; returns its Deferred"""
+        self.last_write = time.monotonic()
+        return defer_write(self.update_record, {**self.progress(), **fields})
+
+    def update_record(self, fields):
+        """Write progress fields to the job's row (writer thread)"""
+        if self.job_id is None:
+            return
+        try:
+            CrawlJob.objects.filter(pk=self.job_id).update(updated_at=timezone.now(), **fields)
+        except DatabaseError as e:
+            logger.error(f"Could not update crawl job {self.job_id}: {str(e)}")
+
+    def maybe_write(self, *args, **kwargs):
+        """Signal handler: write progress if the last write is older than the interval"""
+        if time.monotonic() - self.last_write >= self.interval:
+            # Not returned: response_received handlers cannot return Deferreds
+            self.write()
+
+    def spider_closed(self, spider, reason):
+        fields = {
+            'finished_at': timezone.now(),
+            'duration': time.monotonic() - self.started if self.started else None,
+        }
+        if self.owns_job:
+            finished = reason == 'finished'
+            fields['status'] = CrawlJob.COMPLETED if finished else CrawlJob.FAILED
+            fields['error'] = '' if finished else f'Spider closed: {reason}'
+        # The crawl's Deferred waits for this, so the row is final before the status is set
+        return self.write(**fields)
+
+
+class IngestMetrics:
+    """
+    Records per-stage ingest timings and adds them to the stored totals
+
+    Fetch latency is observed here for every response; the spider and the
+    pipelines time their own stages into the crawl stats. When the spider
+    closes, the run's histograms and counters are added to IngestMetric
+    (see crawler/metrics.py). Not loaded when INGEST_METRICS_ENABLED is False.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not metrics.is_enabled(crawler.settings):
+            raise NotConfigured
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            metrics.observe(self.stats, 'fetch', latency)
+
+    def spider_closed(self, spider, reason):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        items = self.stats.get_value('item_scraped_count', 0) or 0
+        self.stats.set_value('ingest/items_per_second', round(items / elapsed, 2) if elapsed > 0 else 0.0)
+        try:
+            metrics.record_run(self.stats, elapsed)
+        except DatabaseError as e:
+            logger.error(f"Could not record ingest metrics: {str(e)}")
@@ -0,0 +1,125 @@
+"""
+Compiled selector cascades for article extraction
+
+``Selector.css()`` translates CSS to XPath and builds a new XPath
+evaluator on every call, so running five fallback lists per article
+repeats that work thousands of times per page. ExtractionEngine translates
+and compiles every selector once into an ``lxml.etree.XPath`` object. It
+then walks the article elements of a document once, evaluating each
+field's cascade against the raw lxml element.
+
+Every extraction records which selector in the cascade matched. The hit
+counts show which fallbacks are actually used, so the cascade order can
+be tuned from real pages.
+"""
+import threading
+from collections import Counter
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_translator = HTMLTranslator()
+
+
+def compile_css(css):
+    """Translate a CSS selector (with ::text / ::attr() support) to a compiled XPath"""
+    return etree.XPath(_translator.css_to_xpath(css))
+
+
+def _first(results):
+    # Mirror SelectorList.get(): first result as a string, or None
+    if not results:
+        return None
+    value = results[0]
+    if isinstance(value, str):
+        return str(value)
+    return etree.tostring(value, encoding='unicode', method='html', with_tail=False)
+
+
+class FieldCascade:
+    """Ordered fallback selectors for one field, compiled once"""
+
+    def __init__(self, name, selectors):
+        self.name = name
+        self.selectors = list(selectors)
+        self.xpaths = [compile_css(selector) for selector in self.selectors]
+
+    def extract(self, element):
+        """
+        Return (value, index of the matching selector), or (None, None)
+        """
+        for index, xpath in enumerate(self.xpaths):
+            value = _first(xpath(element))
+            if value:
+                return value, index
+        return None, None
+
+
+class ExtractionEngine:
+    """
+    Extracts every field of every article on a page in one pass
+    """
+
+    def __init__(self, article_selector, field_selectors, page_selectors=None):
+        self.article_xpath = compile_css(article_selector)
+        self.fields = {name: FieldCascade(name, selectors) for name, selectors in field_selectors.items()}
+        self.page_fields = {name: FieldCascade(name, selectors)
+                            for name, selectors in (page_selectors or {}).items()}
+        self.hits = {name: Counter() for name in list(self.fields) + list(self.page_fields)}
+        self.lock = threading.Lock()
+
+    def articles(self, root):
+        """Return the article elements of a parsed document"""
+        return self.article_xpath(root)
+
+    def extract(self, root):
+        """
+        Extract all fields from every article under ``root``
+
+        Args:
+            root: lxml root element, e.g. ``response.selector.root``
+
+        Returns:
+            list[dict]: One dict per article mapping field name to value (or None)
+        """
+        records = []
+        hits = {name: Counter() for name in self.fields}
+        for element in self.articles(root):
+            record = {}
+            for name, cascade in self.fields.items():
+                value, index = cascade.extract(element)
+                record[name] = value
+                hits[name][index] += 1
+            records.append(record)
+        self._merge_hits(hits)
+        return records
+
+    def extract_page_field(self, root, name):
+        """Extract a document-level field such as the next page link"""
+        value, index = self.page_fields[name].extract(root)
+        self._merge_hits({name: Counter([index])})
+        return value
+
+    def hit_rates(self):
+        """
+        Return {field: [(selector, hits), ..., (None, misses)]} in cascade order
+        """
+        rates = {}
+        with self.lock:
+            for name, cascade in {**self.fields, **self.page_fields}.items():
+                counts = self.hits[name]
+                rates[name] = [(selector, counts[index]) for index, selector in enumerate(cascade.selectors)]
+                rates[name].append((None, counts[None]))
+        return rates
+
+    def record_stats(self, stats, prefix='extraction'):
+        """Copy selector hit counts into Scrapy crawl stats"""
+        for name, rates in self.hit_rates().items():
+            for index, (selector, count) in enumerate(rates):
+                key = 'miss' if selector is None else f'selector_{index}'
+                stats.set_value(f'{prefix}/{name}/{key}', count)
+
+    def _merge_hits(self, hits):
+        with self.lock:
+            for name, counts in hits.items():
+                self.hits[name].update(counts)
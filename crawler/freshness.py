@@ -0,0 +1,143 @@
+"""
+Crawl freshness registry
+
+Records when each keyword (trending news under its own key) was last
+crawled successfully, so page views inside CRAWL_FRESHNESS_TTL are served
+from stored articles without starting a crawl. Once the window has passed
+the stored articles are still served, and one background refresh is
+started; further requests see the refresh marker and do not start another.
+
+State lives in the Django cache, which is shared between the processes of
+a machine by default. The CrawlJob rows back it up, so a per-process cache
+or a crawl finished on another machine still works. A keyword whose cache
+entry is missing counts as fresh if a crawl for it completed in the
+database inside the window. With CRAWL_BACKEND = 'queue', a refresh marker
+whose keyword has no queued or running job is released. The crawl_worker
+that failed the job may not have been able to delete it.
+"""
+import hashlib
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .google_news_crawler import COMPLETED, normalize_keyword, submit_crawl, uses_job_queue
+from .models import CrawlJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 900
+DEFAULT_REFRESH_TIMEOUT = 600
+
+# Results of request_refresh
+FRESH = 'fresh'
+REFRESHING = 'refreshing'
+STARTED = 'started'
+
+
+def _cache_safe(key):
+    # Keywords can hold spaces and non-ASCII text that some cache backends reject
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def _crawled_key(key):
+    return f'crawl:last-success:{_cache_safe(key)}'
+
+
+def _refresh_key(key):
+    return f'crawl:refreshing:{_cache_safe(key)}'
+
+
+def last_crawled(keyword=None):
+    """Timestamp of the last successful crawl for a keyword, or None"""
+    return cache.get(_crawled_key(normalize_keyword(keyword)))
+
+
+def mark_crawled(keyword=None, when=None):
+    """Record a successful crawl for a keyword"""
+    _mark_key(normalize_keyword(keyword), when)
+
+
+def is_fresh(keyword=None):
+    """Whether the keyword was crawled successfully inside the freshness TTL"""
+    return _is_key_fresh(normalize_keyword(keyword))
+
+
+def _mark_key(key, when=None):
+    cache.set(_crawled_key(key), when or time.time(), timeout=None)
+
+
+def _is_key_fresh(key):
+    crawled_at = cache.get(_crawled_key(key))
+    ttl = getattr(settings, 'CRAWL_FRESHNESS_TTL', DEFAULT_TTL)
+    if crawled_at is not None and time.time() - crawled_at < ttl:
+        return True
+
+    # The crawl may have been recorded by a process that cannot reach this cache
+    finished_at = (CrawlJob.objects.filter(key=key, status=CrawlJob.COMPLETED,
+                                           finished_at__gte=timezone.now() - timedelta(seconds=ttl))
+                   .order_by('-finished_at').values_list('finished_at', flat=True).first())
+    if finished_at is None:
+        return False
+    _mark_key(key, finished_at.timestamp())
+    return True
+
+
+def _refresh_outstanding(key):
+    """Whether a queued crawl for the key is still waiting or running"""
+    jobs = CrawlJob.objects.filter(key=key, status__in=CrawlJob.ACTIVE_STATUSES)
+    return any(job.in_progress for job in jobs)
+
+
+def request_refresh(keyword=None):
+    """
+    Start a background crawl for a keyword unless its stored articles are
+    still fresh or a refresh is already outstanding
+
+    Args:
+        keyword (str, optional): Search keyword. None means trending news.
+
+    Returns:
+        str: FRESH, REFRESHING or STARTED
+    """
+    key = normalize_keyword(keyword)
+    if _is_key_fresh(key):
+        return FRESH
+
+    # cache.add only succeeds for the first caller, so at most one refresh
+    # per key is outstanding; the timeout covers a worker dying mid-crawl
+    refresh_timeout = getattr(settings, 'CRAWL_REFRESH_TIMEOUT', DEFAULT_REFRESH_TIMEOUT)
+    if not cache.add(_refresh_key(key), time.time(), timeout=refresh_timeout):
+        # A failed queued crawl leaves its marker behind; the worker cannot always delete it
+        if not uses_job_queue() or _refresh_outstanding(key):
+            return REFRESHING
+        cache.set(_refresh_key(key), time.time(), timeout=refresh_timeout)
+
+    try:
+        job = submit_crawl(keyword)
+    except Exception as e:
+        cache.delete(_refresh_key(key))
+        logger.error(f"Failed to start refresh for '{key}': {str(e)}")
+        return REFRESHING
+
+    # Queued jobs report back from crawl_worker through refresh_finished()
+    if not uses_job_queue():
+        job.add_done_callback(_on_refresh_finished)
+    logger.info(f"Started background refresh for '{key}'")
+    return STARTED
+
+
+def refresh_finished(key, succeeded, when=None):
+    """Record the outcome of a refresh crawl and release its marker"""
+    if succeeded:
+        _mark_key(key, when)
+    else:
+        logger.warning(f"Refresh for '{key}' failed, will retry on the next request")
+    cache.delete(_refresh_key(key))
+
+
+def _on_refresh_finished(job):
+    refresh_finished(job.key, job.status == COMPLETED, job.finished_at)
@@ -1,70 +1,384 @@
 """
 Module for running the Google News crawler from Django views
+
+All crawls in the process go through one CrawlService, which owns a single
+Twisted reactor running in a background thread. The reactor cannot be
+restarted once stopped, so it is started on first use and left running.
+Requests for a keyword that is already queued or crawling are coalesced
+into the in-flight job instead of starting another spider.
+
+Each job is mirrored in a CrawlJob row (crawler.models), which the
+CrawlJobProgress extension keeps current while the spider runs. The row
+lets any worker process see what this one is crawling.
 """
+import queue
 import threading
+import time
 import logging
-from twisted.internet import reactor
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from twisted.internet import reactor, task
 from scrapy.crawler import CrawlerRunner
 from scrapy.utils.project import get_project_settings
 from scrapy.utils.log import configure_logging
+from .models import CrawlJob as CrawlJobRecord
+from .record_writer import defer_write
 from .spiders.google_news_spider import GoogleNewsSpider
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Dictionary to keep track of crawler states
-crawler_states = {}
+TRENDING_KEY = 'trending'
+SEARCH_KEY_PREFIX = 'search:'
+
+# Job states
+QUEUED = CrawlJobRecord.QUEUED
+RUNNING = CrawlJobRecord.RUNNING
+COMPLETED = CrawlJobRecord.COMPLETED
+FAILED = CrawlJobRecord.FAILED
+
+PRUNE_INTERVAL = 3600
+
+
+def normalize_keyword(keyword):
+    """
+    Normalize a search keyword so equivalent searches share one crawl
+
+    Args:
+        keyword (str, optional): Raw keyword. Empty or None means trending news.
+
+    Returns:
+        str: 'trending', or 'search:' plus the lowercased keyword with
+        collapsed whitespace, so a search for "trending" is not confused
+        with the top stories crawl
+    """
+    if not keyword or not keyword.strip():
+        return TRENDING_KEY
+    return SEARCH_KEY_PREFIX + ' '.join(keyword.split()).lower()
+
+
+def crawl_settings():
+    """
+    Project settings pinned to the reactor installed by this module, so
+    Scrapy does not reject it in favour of its own default reactor
+    """
+    crawl_settings = get_project_settings()
+    reactor_class = type(reactor)
+    crawl_settings.set('TWISTED_REACTOR', f'{reactor_class.__module__}.{reactor_class.__name__}')
+    return crawl_settings
+
+
+class CrawlJob:
+    """State of a single (possibly coalesced) crawl"""
 
-class GoogleNewsCrawlerThread(threading.Thread):
-    """Thread class for running Scrapy crawler in the background"""
-    
     def __init__(self, keyword=None):
-        threading.Thread.__init__(self)
-        self.keyword = keyword
-        self.runner = CrawlerRunner(get_project_settings())
-        self.daemon = True  # Daemon thread will be terminated when main thread exits
-        
-    def run(self):
-        """Run the crawler process"""
+        self.key = normalize_keyword(keyword)
+        self.keyword = ' '.join(keyword.split()) if keyword and keyword.strip() else None
+        self.status = QUEUED
+        self.requests = 1
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stats = {}
+        self.error = None
+        self.record_id = None
+        self.done = threading.Event()
+        self.callbacks = []
+        self.callbacks_lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in (COMPLETED, FAILED)
+
+    def add_done_callback(self, callback):
+        """Call ``callback(job)`` once the job finishes, or now if it already has"""
+        with self.callbacks_lock:
+            if not self.done.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self):
+        self.finished_at = time.time()
+        with self.callbacks_lock:
+            self.done.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Error in crawl job callback: {str(e)}")
+
+    def as_dict(self):
+        return {
+            'key': self.key,
+            'keyword': self.keyword,
+            'status': self.status,
+            'requests': self.requests,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'new_articles_count': self.stats.get('new_articles_count', 0),
+            'item_scraped_count': self.stats.get('item_scraped_count', 0),
+            'error': self.error,
+        }
+
+    def create_record(self):
+        """Insert the CrawlJob row other processes will see"""
+        from .job_queue import SERVICE_LABEL, lease_timeout, worker_name
+
+        try:
+            # Owned by this process from the start, so crawl_worker never leases it;
+            # the lease is renewed while the process runs (CrawlService._renew_leases)
+            self.record_id = CrawlJobRecord.objects.create(
+                key=self.key, keyword=self.keyword, worker=worker_name(SERVICE_LABEL),
+                lease_expires_at=timezone.now() + timedelta(seconds=lease_timeout()),
+            ).pk
+        except Exception as e:
+            logger.error(f"Could not record crawl job for '{self.key}': {str(e)}")
+
+    def update_record(self, **fields):
+        if self.record_id is None:
+            return
+        try:
+            CrawlJobRecord.objects.filter(pk=self.record_id).update(updated_at=timezone.now(), **fields)
+        except Exception as e:
+            logger.error(f"Could not update crawl job {self.record_id}: {str(e)}")
+
+
+class CrawlService:
+    """
+    Process-wide crawl scheduler
+
+    Jobs are submitted from any thread through a thread-safe queue and
+    started on the reactor thread, at most ``max_concurrent`` at a time.
+    Finished jobs are kept in a bounded history for status lookups. The
+    leases of the jobs' CrawlJob rows are renewed like a crawl worker's, so
+    rows left behind by a process that died can be told apart.
+    """
+
+    def __init__(self, max_concurrent=2, history_size=200):
+        self.max_concurrent = max_concurrent
+        self.history_size = history_size
+        self.pending = queue.Queue()
+        self.active = {}
+        self.history = OrderedDict()
+        self.running = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.runner = None
+        self.renewer = None
+        self.last_prune = float('-inf')
+
+    def start(self):
+        """Start the reactor thread if it is not already running"""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._run_reactor, name='crawl-service', daemon=True)
+            self.thread.start()
+
+    def submit(self, keyword=None):
+        """
+        Queue a crawl for a keyword, or join the one already in flight
+
+        Returns:
+            CrawlJob: The job that will crawl this keyword
+        """
+        key = normalize_keyword(keyword)
+        with self.lock:
+            job = self.active.get(key)
+            if job is not None:
+                job.requests += 1
+                logger.info(f"Coalesced crawl request for '{key}' into {job.status} job ({job.requests} requests)")
+                coalesced = True
+            else:
+                job = CrawlJob(keyword)
+                # Recorded under the lock so coalesced requests always find the row
+                job.create_record()
+                self.active[key] = job
+                coalesced = False
+
+        if coalesced:
+            job.update_record(requests=F('requests') + 1)
+            return job
+
+        self.pending.put(job)
+        self.start()
+        reactor.callFromThread(self._dispatch)
+        return job
+
+    def get_job(self, keyword=None):
+        """Return the in-flight or most recent job for a keyword, if any"""
+        key = normalize_keyword(keyword)
+        with self.lock:
+            return self.active.get(key) or self.history.get(key)
+
+    def status(self):
+        """Snapshot of the service for monitoring"""
+        with self.lock:
+            return {
+                'running': sum(1 for job in self.active.values() if job.status == RUNNING),
+                'queued': sum(1 for job in self.active.values() if job.status == QUEUED),
+                'max_concurrent': self.max_concurrent,
+                'jobs': [job.as_dict() for job in self.active.values()],
+                'recent': [job.as_dict() for job in reversed(self.history.values())],
+            }
+
+    def _run_reactor(self):
+        from .job_queue import fail_abandoned
+
+        try:
+            # Jobs of an earlier process that died mid-crawl would otherwise show as running forever
+            fail_abandoned()
+        except Exception as e:
+            logger.error(f"Could not clean up abandoned crawl jobs: {str(e)}")
         try:
             # Configure logging for this thread
             configure_logging()
-            
-            # Create a key for this crawler
-            crawler_key = f"crawler_{self.keyword}_{id(self)}"
-            crawler_states[crawler_key] = "running"
-            
-            # Define a callback for when the spider closes
-            def on_spider_closed(spider):
-                logger.info(f"Spider closed: {spider.name}")
-                crawler_states[crawler_key] = "completed"
-                
-                # Check if any other crawlers are running
-                running_crawlers = [k for k, v in crawler_states.items() if v == "running"]
-                if not running_crawlers:
-                    try:
-                        # Only stop the reactor if it's running
-                        if reactor.running:
-                            reactor.stop()
-                    except Exception as e:
-                        logger.error(f"Error stopping reactor: {str(e)}")
-            
-            # Start the crawler
-            deferred = self.runner.crawl(GoogleNewsSpider, keyword=self.keyword)
-            deferred.addCallback(on_spider_closed)
-            
-            # Start the reactor in this thread if it's not running
+            self.runner = CrawlerRunner(crawl_settings())
             if not reactor.running:
                 reactor.run(installSignalHandlers=False)  # Don't install signal handlers
-                
-            logger.info(f"Finished crawling for keyword: {self.keyword or 'trending'}")
         except Exception as e:
-            logger.error(f"Error in crawler process: {str(e)}")
+            logger.error(f"Crawl service reactor stopped: {str(e)}")
+
+    def _dispatch(self):
+        """Start queued jobs while below the concurrency cap (reactor thread)"""
+        if self.runner is None:
+            reactor.callLater(0.1, self._dispatch)
+            return
+        if self.renewer is None:
+            from .job_queue import lease_timeout
+            self.renewer = task.LoopingCall(self._renew_leases)
+            self.renewer.start(max(1.0, lease_timeout() / 3), now=False)
+
+        while self.running < self.max_concurrent:
+            try:
+                job = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            self._start_job(job)
+
+    def _start_job(self, job):
+        self.running += 1
+        job.status = RUNNING
+        job.started_at = time.time()
+        logger.info(f"Started Google News crawler with keyword: {job.keyword or 'trending'}")
+
+        crawler = self.runner.create_crawler(GoogleNewsSpider)
+        deferred = self.runner.crawl(crawler, keyword=job.keyword, crawl_job_id=job.record_id)
+        deferred.addCallbacks(self._on_success, self._on_failure,
+                              callbackArgs=(job, crawler), errbackArgs=(job, crawler))
+        deferred.addBoth(self._on_finished, job)
+
+    def _renew_leases(self):
+        """Extend the leases of this service's queued and running jobs (reactor thread)"""
+        with self.lock:
+            record_ids = [job.record_id for job in self.active.values() if job.record_id is not None]
+        if record_ids:
+            # The LoopingCall waits for the write before scheduling the next one
+            return defer_write(self._write_leases, record_ids)
+
+    def _write_leases(self, record_ids):
+        from .job_queue import lease_timeout
+
+        now = timezone.now()
+        try:
+            CrawlJobRecord.objects.filter(pk__in=record_ids, status__in=CrawlJobRecord.ACTIVE_STATUSES).update(
+                lease_expires_at=now + timedelta(seconds=lease_timeout()), updated_at=now,
+            )
+        except Exception as e:
+            logger.error(f"Could not renew crawl job leases: {str(e)}")
+
+    def _on_success(self, _, job, crawler):
+        job.stats = crawler.stats.get_stats() if crawler.stats else {}
+        job.status = COMPLETED
+        logger.info(f"Finished crawling for keyword: {job.keyword or 'trending'}")
+        # Returned so _on_finished runs once the row says completed
+        return defer_write(job.update_record, status=COMPLETED, finished_at=timezone.now(), lease_expires_at=None)
+
+    def _on_failure(self, failure, job, crawler):
+        job.stats = crawler.stats.get_stats() if crawler.stats else {}
+        job.status = FAILED
+        job.error = failure.getErrorMessage()
+        logger.error(f"Error in crawler process: {job.error}")
+        # The spider may have failed before the progress extension could report it
+        return defer_write(job.update_record, status=FAILED, error=job.error, finished_at=timezone.now(),
+                           lease_expires_at=None)
+
+    def _on_finished(self, _, job):
+        self.running -= 1
+        with self.lock:
+            if self.active.get(job.key) is job:
+                del self.active[job.key]
+            self.history.pop(job.key, None)
+            self.history[job.key] = job
+            while len(self.history) > self.history_size:
+                self.history.popitem(last=False)
+        job.finish()
+        self._dispatch()
+        self._prune_records()
+
+    def _prune_records(self):
+        """Delete finished CrawlJob rows older than CRAWL_JOB_RETENTION_DAYS, at most hourly"""
+        if time.monotonic() - self.last_prune < PRUNE_INTERVAL:
+            return
+        self.last_prune = time.monotonic()
+        defer_write(self._delete_old_records)
+
+    def _delete_old_records(self):
+        cutoff = timezone.now() - timedelta(days=getattr(settings, 'CRAWL_JOB_RETENTION_DAYS', 30))
+        try:
+            deleted, _ = CrawlJobRecord.objects.filter(
+                created_at__lt=cutoff, status__in=[COMPLETED, FAILED]
+            ).delete()
+            if deleted:
+                logger.info(f"Pruned {deleted} old crawl job records")
+        except Exception as e:
+            logger.error(f"Could not prune crawl job records: {str(e)}")
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_crawl_service():
+    """Return the process-wide crawl service, creating it on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CrawlService(
+                max_concurrent=getattr(settings, 'CRAWL_SERVICE_MAX_CONCURRENT', 2),
+                history_size=getattr(settings, 'CRAWL_SERVICE_HISTORY_SIZE', 200),
+            )
+        return _service
+
+
+def uses_job_queue():
+    """Whether crawls go to crawl_worker processes (CRAWL_BACKEND = 'queue')"""
+    return getattr(settings, 'CRAWL_BACKEND', 'thread') == 'queue'
+
+
+def submit_crawl(keyword=None):
+    """
+    Start a crawl with the configured backend
+
+    Returns:
+        The in-process CrawlJob, or the queued CrawlJob row with CRAWL_BACKEND = 'queue'
+    """
+    if uses_job_queue():
+        from .job_queue import enqueue
+        return enqueue(keyword)
+    return get_crawl_service().submit(keyword)
+
 
 def run_google_news_crawler(keyword=None):
     """
-    Start a Google News crawler in a separate thread
+    Queue a Google News crawl with the configured backend
     
     Args:
         keyword (str, optional): Keyword to search for. If None, crawls trending news.
@@ -73,10 +387,10 @@ def run_google_news_crawler(keyword=None):
         str: Message indicating crawler was started
     """
     try:
-        crawler_thread = GoogleNewsCrawlerThread(keyword=keyword)
-        crawler_thread.start()
-        logger.info(f"Started Google News crawler with keyword: {keyword or 'trending'}")
+        job = submit_crawl(keyword)
+        if job.requests > 1:
+            return f"Already crawling Google News for {keyword or 'trending news'}"
         return f"Started crawling Google News for {keyword or 'trending news'}"
     except Exception as e:
         logger.error(f"Failed to start crawler: {str(e)}")
-        return f"Error starting crawler: {str(e)}" 
\ No newline at end of file
+        return f"Error starting crawler: {str(e)}"
@@ -1,5 +1,6 @@
 import scrapy
 
+
 class GoogleNewsItem(scrapy.Item):
     title = scrapy.Field()
     summary = scrapy.Field()
@@ -7,4 +8,12 @@ class GoogleNewsItem(scrapy.Item):
     source = scrapy.Field()
     published_time = scrapy.Field()
     keyword = scrapy.Field()
-    content_hash = scrapy.Field() 
\ No newline at end of file
+    content_hash = scrapy.Field()
+
+
+class NewsItem(scrapy.Item):
+    headline = scrapy.Field()
+    summary = scrapy.Field()
+    url = scrapy.Field()
+    # Page the article was listed on, matched to its NewsSource by the pipeline
+    source_url = scrapy.Field()
@@ -0,0 +1,184 @@
+"""
+Database-backed crawl job queue
+
+With CRAWL_BACKEND = 'queue', web processes only insert CrawlJob rows and
+``manage.py crawl_worker`` processes run them, on any machine sharing the
+database.
+
+A worker leases a job by moving it from queued to running with a
+conditional UPDATE. Only one worker's UPDATE can match, so no database
+locking support is needed. The lease lasts CRAWL_QUEUE_LEASE_TIMEOUT
+seconds and the worker renews it while the spider runs. If the worker dies,
+the lease expires and the job can be leased again (a visibility timeout).
+Failed attempts are retried with exponential backoff, up to the job's
+max_attempts.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .google_news_crawler import normalize_keyword
+from .models import CrawlJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 30
+
+# Jobs considered per lease attempt, in case others win the first ones
+LEASE_CANDIDATES = 10
+# ``worker`` label of rows run by a web process's in-process crawl service
+SERVICE_LABEL = 'service'
+
+
+def worker_name(label=None):
+    """Identify this process in the ``worker`` column: host:pid[:label]"""
+    name = f'{socket.gethostname()}:{os.getpid()}'
+    return f'{name}:{label}' if label else name
+
+
+def lease_timeout():
+    return getattr(settings, 'CRAWL_QUEUE_LEASE_TIMEOUT', DEFAULT_LEASE_TIMEOUT)
+
+
+def enqueue(keyword=None):
+    """
+    Queue a crawl for a keyword, or join the queued or running job for it
+
+    The lookup and the insert share one transaction. With
+    SQLITE_CONCURRENT_MODE it begins IMMEDIATE, taking the write lock
+    first, so concurrent searches for a keyword cannot both insert a job.
+
+    Returns:
+        CrawlJob: The job row that will crawl this keyword
+    """
+    key = normalize_keyword(keyword)
+    with transaction.atomic():
+        job = CrawlJob.objects.filter(key=key, status__in=CrawlJob.ACTIVE_STATUSES).order_by('-created_at').first()
+        if job is not None:
+            CrawlJob.objects.filter(pk=job.pk).update(requests=F('requests') + 1)
+            job.requests += 1
+            logger.info(f"Coalesced crawl request for '{key}' into {job.status} job {job.pk}")
+            return job
+
+        job = CrawlJob.objects.create(
+            key=key,
+            keyword=' '.join(keyword.split()) if keyword and keyword.strip() else None,
+            max_attempts=getattr(settings, 'CRAWL_QUEUE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+        )
+    logger.info(f"Queued crawl job {job.pk} for '{key}'")
+    return job
+
+
+def lease(worker, timeout=None):
+    """
+    Claim the next runnable job for ``worker``
+
+    Runnable jobs are queued ones whose retry delay has passed, and running
+    ones whose lease has expired. Expired jobs with no attempts left are
+    marked failed instead.
+
+    Returns:
+        CrawlJob or None
+    """
+    timeout = timeout or lease_timeout()
+    now = timezone.now()
+    candidates = CrawlJob.objects.filter(
+        Q(status=CrawlJob.QUEUED, worker='', available_at__lte=now) |
+        Q(status=CrawlJob.RUNNING, lease_expires_at__lt=now)
+    ).order_by('available_at', 'id').values_list('id', 'status', 'lease_expires_at', 'attempts', 'max_attempts')
+
+    for pk, status, expires, attempts, max_attempts in candidates[:LEASE_CANDIDATES]:
+        # Matches only while the row is as we read it, so one worker wins
+        current = CrawlJob.objects.filter(pk=pk, status=status, lease_expires_at=expires)
+        if attempts >= max_attempts:
+            if current.update(status=CrawlJob.FAILED, finished_at=now, lease_expires_at=None, updated_at=now,
+                              error=f'Lease expired on the last of {max_attempts} attempts'):
+                logger.warning(f"Crawl job {pk} failed: lease expired after {attempts} attempts")
+            continue
+
+        if current.update(status=CrawlJob.RUNNING, worker=worker, attempts=F('attempts') + 1,
+                          lease_expires_at=now + timedelta(seconds=timeout),
+                          started_at=now, finished_at=None, updated_at=now):
+            return CrawlJob.objects.get(pk=pk)
+    return None
+
+
+def fail_abandoned():
+    """
+    Mark in-process crawl service jobs whose lease lapsed as failed
+
+    The service renews its jobs' leases while its web process runs. A lapsed
+    lease means the process died mid-crawl, and nothing else will finish
+    the row.
+
+    Returns:
+        int: Jobs marked failed
+    """
+    now = timezone.now()
+    failed = CrawlJob.objects.filter(
+        status__in=CrawlJob.ACTIVE_STATUSES, worker__endswith=f':{SERVICE_LABEL}', lease_expires_at__lt=now,
+    ).update(status=CrawlJob.FAILED, error='The crawl service stopped before the job finished',
+             finished_at=now, lease_expires_at=None, updated_at=now)
+    if failed:
+        logger.warning(f"Marked {failed} abandoned crawl service jobs as failed")
+    return failed
+
+
+def renew(job_ids, worker, timeout=None):
+    """Extend the leases ``worker`` holds; returns the number still held"""
+    if not job_ids:
+        return 0
+    timeout = timeout or lease_timeout()
+    now = timezone.now()
+    return CrawlJob.objects.filter(pk__in=job_ids, worker=worker, status=CrawlJob.RUNNING).update(
+        lease_expires_at=now + timedelta(seconds=timeout), updated_at=now,
+    )
+
+
+def complete(job, worker):
+    """Mark a leased job completed; False if the lease was lost meanwhile"""
+    now = timezone.now()
+    return bool(CrawlJob.objects.filter(pk=job.pk, worker=worker, status=CrawlJob.RUNNING).update(
+        status=CrawlJob.COMPLETED, error='', finished_at=now, lease_expires_at=None, updated_at=now,
+    ))
+
+
+def fail(job, worker, error):
+    """
+    Record a failed attempt: requeue with backoff, or mark the job failed
+    once it has used all its attempts
+
+    Returns:
+        bool: True if the job will be retried
+    """
+    now = timezone.now()
+    current = CrawlJob.objects.filter(pk=job.pk, worker=worker, status=CrawlJob.RUNNING)
+    attempts, max_attempts = current.values_list('attempts', 'max_attempts').first() or (0, 0)
+    if attempts and attempts < max_attempts:
+        delay = getattr(settings, 'CRAWL_QUEUE_RETRY_DELAY', DEFAULT_RETRY_DELAY) * 2 ** (attempts - 1)
+        if current.update(status=CrawlJob.QUEUED, worker='', error=error, lease_expires_at=None,
+                          available_at=now + timedelta(seconds=delay), updated_at=now):
+            logger.warning(f"Crawl job {job.pk} attempt {attempts} failed, retrying in {delay}s: {error}")
+            return True
+        return False
+
+    current.update(status=CrawlJob.FAILED, error=error, finished_at=now, lease_expires_at=None, updated_at=now)
+    logger.error(f"Crawl job {job.pk} failed after {attempts} attempts: {error}")
+    return False
+
+
+def release(job, worker):
+    """Return an interrupted job to the queue without counting the attempt"""
+    now = timezone.now()
+    return bool(CrawlJob.objects.filter(pk=job.pk, worker=worker, status=CrawlJob.RUNNING).update(
+        status=CrawlJob.QUEUED, worker='', lease_expires_at=None, available_at=now,
+        attempts=F('attempts') - 1, updated_at=now,
+    ))
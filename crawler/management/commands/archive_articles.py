@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from newsapp.archive import DEFAULT_BATCH_SIZE, archivable, archive_batch, retention_cutoff, retention_days
+from newsapp.models import Article, NewsArticle
+from newsapp.page_cache import bump_ingest_generation
+import time
+
+TABLES = {'articles': Article, 'news': NewsArticle}
+
+
+class Command(BaseCommand):
+    help = 'Move articles older than the retention window into the compressed archive, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help='Tables to archive: articles and/or news (default: both)')
+        parser.add_argument('--older-than', type=int,
+                            help='Archive rows older than this many days (default: ARTICLE_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int,
+                            help=f'Rows moved per transaction (default: ARCHIVE_BATCH_SIZE or {DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--max-batches', type=int,
+                            help='Stop after this many batches; the next run carries on (default: no limit)')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds between batches, so crawls can write (default: 0.05)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived')
+
+    def handle(self, *args, **options):
+        unknown = set(options['tables']) - set(TABLES)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))} (choose from articles, news)")
+        days = options['older_than'] if options['older_than'] is not None else retention_days()
+        if days is None:
+            self.stdout.write('ARTICLE_RETENTION_DAYS is None: nothing is archived')
+            return
+        if days < 0:
+            raise CommandError('--older-than must not be negative')
+        batch_size = options['batch_size'] or getattr(settings, 'ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+        cutoff = retention_cutoff(days)
+        self.stdout.write(f'Archiving rows older than {days} days (before {cutoff:%Y-%m-%d %H:%M})')
+
+        archived_any = False
+        for table in options['tables'] or sorted(TABLES):
+            model = TABLES[table]
+            if options['dry_run']:
+                count = archivable(model, cutoff).count()
+                self.stdout.write(f'{model.__name__}: {count} rows to archive')
+                continue
+
+            start = time.time()
+            rows = raw_bytes = packed_bytes = batches = 0
+            while options['max_batches'] is None or batches < options['max_batches']:
+                moved, raw, packed = archive_batch(model, cutoff, batch_size)
+                if not moved:
+                    break
+                rows += moved
+                raw_bytes += raw
+                packed_bytes += packed
+                batches += 1
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'{model.__name__}: {rows} rows archived...')
+                # Let waiting writers take the lock between batches
+                time.sleep(options['pause'])
+
+            archived_any = archived_any or rows > 0
+            elapsed = time.time() - start
+            ratio = raw_bytes / packed_bytes if packed_bytes else 0
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: archived {rows} rows in {batches} batches, {elapsed:.1f}s '
+                f'({raw_bytes / 1024:,.0f} KiB of JSON stored as {packed_bytes / 1024:,.0f} KiB, {ratio:.1f}x)'
+            ))
+
+        # Listings and searches changed
+        if archived_any:
+            bump_ingest_generation()
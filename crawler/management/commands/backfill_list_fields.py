@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from newsapp.models import Article, NewsArticle
+import time
+
+# Columns each table needs to compute its list fields, and the fields written
+TABLES = {
+    'articles': (Article, ['title', 'summary', 'source'], ['normalized_title', 'snippet']),
+    'news': (NewsArticle, ['summary'], ['snippet']),
+}
+
+
+class Command(BaseCommand):
+    help = 'Fill the precomputed list page columns (snippet, normalized title) for existing rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help='Tables to backfill: articles and/or news (default: both)')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every row, not only rows without list fields (e.g. after changing '
+                                 'SNIPPET_LENGTH)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows updated per transaction (default: 2000)')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        unknown = set(options['tables']) - set(TABLES)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))} (choose from articles, news)")
+        for table in options['tables'] or sorted(TABLES):
+            model, columns, fields = TABLES[table]
+            queryset = model.objects.only('id', *columns).order_by('id')
+            if not options['all']:
+                # Rows inserted before the columns existed, or by raw inserts
+                queryset = queryset.filter(snippet__isnull=True)
+
+            start = time.time()
+            updated = 0
+            last_id = 0
+            # Keyset batches: each query starts after the last id, so the cost does not grow with progress
+            while True:
+                batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                for row in batch:
+                    row.fill_list_fields()
+                with transaction.atomic():
+                    model.objects.bulk_update(batch, fields)
+                updated += len(batch)
+                last_id = batch[-1].id
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'{model.__name__}: {updated} rows...')
+
+            elapsed = time.time() - start
+            rate = updated / elapsed if elapsed > 0 else 0
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: updated {updated} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)'
+            ))
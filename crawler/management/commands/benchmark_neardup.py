@@ -0,0 +1,144 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+from collections import Counter
+from datetime import timedelta
+from newsapp.models import Article
+from newsapp.search import drop_fts_index
+from crawler import neardup
+import random
+import statistics
+import time
+
+WORDS = (
+    'government minister election court police market shares rupee budget monsoon cricket match team '
+    'captain series final injury coach player league vote party leader protest city state district '
+    'hospital vaccine school exam result railway airport flight weather storm flood heat record '
+    'company profit launch phone price fuel tax bank loan policy report survey study border army '
+    'talks summit deal trade export import growth crisis water power energy solar climate'
+).split()
+PUBLISHERS = ['Times of India', 'The Hindu', 'NDTV', 'Hindustan Times', 'India Today', 'Mint', 'News18']
+CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Benchmark near-duplicate screening cost per item as the article table grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='10000,100000',
+                            help='Comma-separated corpus sizes to measure at (default: 10000,100000)')
+        parser.add_argument('--probes', type=int, default=500, help='Articles screened per corpus size (default: 500)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Articles per screen() call (default: 50)')
+        parser.add_argument('--recent', type=int, default=20000,
+                            help='Rows inside the candidate window, i.e. a week of ingest (default: 20000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers')
+
+        self.rng = random.Random(options['seed'])
+        self.stdout.write('Creating a throwaway test database...')
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # Search triggers would only slow down building the corpus
+            drop_fts_index(Article)
+            results = self.run(sizes, options['probes'], max(1, options['batch_size']), options['recent'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.report(results)
+
+    def headline(self, length=10):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(length)).capitalize()
+
+    def random_hash(self):
+        return f'{self.rng.getrandbits(256):064x}'
+
+    def run(self, sizes, probes, batch_size, recent):
+        # Stories that probes will re-publish; stored with real signatures
+        seeds = []
+        for _ in range(200):
+            article = Article(title=f'{self.headline()} - {self.rng.choice(PUBLISHERS)}', summary='',
+                              url='https://example.com/', source='Seed', content_hash=self.random_hash())
+            neardup.assign_signature(article)
+            seeds.append(article)
+        Article.objects.bulk_create(seeds)
+        stored = len(seeds)
+
+        results = []
+        for size in sizes:
+            # Grow the corpus with random signatures; only band distribution matters here
+            while stored < size:
+                chunk = []
+                for _ in range(min(CHUNK_SIZE, size - stored)):
+                    signature = self.rng.getrandbits(neardup.SIGNATURE_BITS)
+                    band_values = neardup.bands(signature)
+                    chunk.append(Article(
+                        title='Filler', url='https://example.com/', source='Filler',
+                        content_hash=self.random_hash(), simhash=neardup.to_signed(signature),
+                        band0=band_values[0], band1=band_values[1], band2=band_values[2], band3=band_values[3],
+                    ))
+                Article.objects.bulk_create(chunk)
+                stored += len(chunk)
+                self.stdout.write(f'\r   {stored} rows', ending='')
+                self.stdout.flush()
+            self.stdout.write('')
+
+            # Age everything but the newest rows out of the candidate window, as
+            # if the corpus had been ingested at a steady rate; seeds stay recent
+            newest = Article.objects.order_by('-id').values_list('id', flat=True)[recent:recent + 1]
+            if newest:
+                Article.objects.filter(id__lte=newest[0]).exclude(source='Seed').update(
+                    created_at=timezone.now() - timedelta(days=30))
+
+            result = self.measure(seeds, probes, batch_size, window_days=None)
+            worst = self.measure(seeds, probes, batch_size, window_days=0)
+            result.update(size=size, us_per_item_no_window=worst['us_per_item_median'])
+            results.append(result)
+        return results
+
+    def probe(self, seeds):
+        """Half re-published copies of stored stories, half new stories"""
+        if self.rng.random() < 0.5:
+            seed = self.rng.choice(seeds)
+            title = seed.title.rsplit(' - ', 1)[0]
+            if self.rng.random() < 0.5:
+                title = title.upper()
+            title = f'{title} - {self.rng.choice(PUBLISHERS)}'
+        else:
+            title = self.headline()
+        return Article(title=title, summary='', url='https://example.com/', source='Probe',
+                       content_hash=self.random_hash())
+
+    def measure(self, seeds, probes, batch_size, window_days):
+        counters = Counter()
+        timings = []
+        remaining = probes
+        while remaining > 0:
+            batch = [self.probe(seeds) for _ in range(min(batch_size, remaining))]
+            remaining -= len(batch)
+            start = time.perf_counter()
+            neardup.screen(batch, counters, window_days=window_days)
+            timings.append((time.perf_counter() - start) / len(batch))
+
+        return {
+            'us_per_item_mean': statistics.mean(timings) * 1e6,
+            'us_per_item_median': statistics.median(timings) * 1e6,
+            'checked': counters['checked'],
+            'matches': counters['stored_matches'] + counters['batch_matches'],
+        }
+
+    def report(self, results):
+        self.stdout.write(self.style.SUCCESS('\nNear-duplicate screening cost (median per item)'))
+        self.stdout.write(f"   {'rows':>10} {'windowed us':>12} {'no window us':>13} {'matches':>10}")
+        for result in results:
+            self.stdout.write(f"   {result['size']:>10} {result['us_per_item_median']:>12.1f} "
+                              f"{result['us_per_item_no_window']:>13.1f} "
+                              f"{result['matches']:>5}/{result['checked']}")
+        if len(results) > 1:
+            growth = results[-1]['us_per_item_median'] / results[0]['us_per_item_median']
+            self.stdout.write(f"   {results[-1]['size'] / results[0]['size']:.0f}x rows -> "
+                              f"{growth:.2f}x cost per item")
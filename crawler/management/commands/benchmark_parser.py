@@ -0,0 +1,175 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from scrapy.http import HtmlResponse
+from crawler.spiders.google_news_spider import GoogleNewsSpider
+from crawler.items import GoogleNewsItem
+import glob
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+DEFAULT_URL = 'https://news.google.com/topstories?hl=en-IN&gl=IN&ceid=IN:en'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark GoogleNewsSpider.parse offline against captured HTML fixtures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', nargs='*',
+                            help='HTML files or glob patterns (default: google_news_sample.html)')
+        parser.add_argument('--url', type=str, default=DEFAULT_URL,
+                            help='URL the fixtures are served as, used to resolve relative links')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed parse passes per fixture (default: 20)')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed passes before measuring (default: 2)')
+        parser.add_argument('--save-baseline', type=str, help='Write results to this JSON file')
+        parser.add_argument('--baseline', type=str, help='Compare results against this JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.10,
+                            help='Allowed throughput drop against the baseline (default: 0.10 = 10%%)')
+        parser.add_argument('--with-logging', action='store_true',
+                            help='Keep spider logging enabled while timing (off by default)')
+
+    def handle(self, *args, **options):
+        paths = self.resolve_fixtures(options['fixtures'])
+        iterations = max(1, options['iterations'])
+
+        if not options['with_logging']:
+            logging.disable(logging.INFO)
+
+        try:
+            results = {
+                'python': platform.python_version(),
+                'iterations': iterations,
+                'fixtures': {},
+            }
+            for path in paths:
+                with open(path, 'rb') as f:
+                    body = f.read()
+                name = os.path.basename(path)
+                self.stdout.write(f'Benchmarking {name} ({len(body) / 1024:.0f} KB)...')
+                results['fixtures'][name] = self.benchmark_fixture(body, options['url'], iterations, options['warmup'])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.report(results)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['save_baseline']}"))
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def resolve_fixtures(self, patterns):
+        if not patterns:
+            patterns = [str(settings.BASE_DIR / 'google_news_sample.html')]
+
+        paths = []
+        for pattern in patterns:
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise CommandError(f'No fixture matches {pattern}')
+            paths.extend(matches)
+        return paths
+
+    def make_response(self, body, url):
+        return HtmlResponse(url=url, body=body, encoding='utf-8')
+
+    def benchmark_fixture(self, body, url, iterations, warmup):
+        spider = GoogleNewsSpider()
+
+        for _ in range(warmup):
+            list(spider.parse(self.make_response(body, url)))
+
+        # Whole-page parse: document parsing, extraction and item creation
+        timings = []
+        items = requests = 0
+        for _ in range(iterations):
+            response = self.make_response(body, url)
+            start = time.perf_counter()
+            output = list(spider.parse(response))
+            timings.append(time.perf_counter() - start)
+            items = sum(1 for obj in output if isinstance(obj, GoogleNewsItem))
+            requests = len(output) - items
+
+        # Per-field extraction time, summed over every article on the page
+        response = self.make_response(body, url)
+        articles = spider.extraction.articles(response.selector.root)
+        field_timings = {field: [] for field in spider.FIELD_SELECTORS}
+        for _ in range(iterations):
+            for field in spider.FIELD_SELECTORS:
+                start = time.perf_counter()
+                for article in articles:
+                    spider.extract_field(article, field)
+                field_timings[field].append(time.perf_counter() - start)
+
+        # Peak memory of one parse pass, measured separately since tracing slows it down
+        tracemalloc.start()
+        list(spider.parse(self.make_response(body, url)))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        mean = statistics.mean(timings)
+        return {
+            'bytes': len(body),
+            'articles_found': len(articles),
+            'items': items,
+            'requests': requests,
+            'parse_ms_mean': mean * 1000,
+            'parse_ms_median': statistics.median(timings) * 1000,
+            'parse_ms_min': min(timings) * 1000,
+            'articles_per_sec': items / mean if mean else 0.0,
+            'field_ms': {field: statistics.mean(values) * 1000 for field, values in field_timings.items()},
+            'peak_memory_kb': peak / 1024,
+            'selector_hits': spider.extraction.hit_rates(),
+        }
+
+    def report(self, results):
+        for name, result in results['fixtures'].items():
+            self.stdout.write(self.style.SUCCESS(f'\n{name}'))
+            self.stdout.write(f"   Articles found: {result['articles_found']}, items: {result['items']}, "
+                              f"follow-up requests: {result['requests']}")
+            self.stdout.write(f"   Parse time: {result['parse_ms_mean']:.2f} ms mean, "
+                              f"{result['parse_ms_median']:.2f} ms median, {result['parse_ms_min']:.2f} ms min")
+            self.stdout.write(f"   Throughput: {result['articles_per_sec']:.0f} articles/sec")
+            self.stdout.write(f"   Peak memory: {result['peak_memory_kb']:.0f} KB")
+            self.stdout.write('   Per-field extraction (all articles):')
+            for field, ms in result['field_ms'].items():
+                self.stdout.write(f'      {field:<15} {ms:8.3f} ms')
+            self.stdout.write('   Selector hits (cascade order, all passes):')
+            for field, rates in result['selector_hits'].items():
+                hits = ', '.join(f"{selector or 'miss'}={count}" for selector, count in rates)
+                self.stdout.write(f'      {field:<15} {hits}')
+
+    def compare(self, results, baseline_path, tolerance):
+        try:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read baseline {baseline_path}: {str(e)}')
+
+        regressions = []
+        self.stdout.write(f'\nComparison against {baseline_path}:')
+        for name, result in results['fixtures'].items():
+            previous = baseline.get('fixtures', {}).get(name)
+            if not previous:
+                self.stdout.write(f'   {name}: not in baseline, skipped')
+                continue
+
+            change = (result['articles_per_sec'] - previous['articles_per_sec']) / previous['articles_per_sec'] \
+                if previous['articles_per_sec'] else 0.0
+            self.stdout.write(f"   {name}: {previous['articles_per_sec']:.0f} -> "
+                              f"{result['articles_per_sec']:.0f} articles/sec ({change:+.1%})")
+
+            if result['items'] != previous['items']:
+                regressions.append(f"{name}: item count changed from {previous['items']} to {result['items']}")
+            if change < -tolerance:
+                regressions.append(f'{name}: throughput dropped {-change:.1%} (tolerance {tolerance:.0%})')
+
+        if regressions:
+            raise CommandError('Parser regression detected:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,266 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from newsapp import views
+from newsapp.models import Article
+from newsapp.query_budget import QueryRecorder
+from crawler.freshness import mark_crawled
+from crawler.management.commands.generate_corpus import KEYWORDS
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+DEFAULT_SIZES = '10000,100000,1000000'
+# Popular crawl keywords, as users search for them
+SEARCH_KEYWORDS = [keyword for keyword in KEYWORDS if keyword][:8]
+# Source-crawled news rows per Google News article, for the legacy views
+NEWS_RATIO = 0.2
+# The freshness window must outlast seeding and the run, so no view starts a crawl
+FRESHNESS_TTL = 7 * 86400
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Measure view latency, queries per request and throughput at several table sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default=DEFAULT_SIZES,
+                            help=f'Comma-separated Article counts to benchmark at (default: {DEFAULT_SIZES})')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per view (default: 50)')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per view first (default: 5)')
+        parser.add_argument('--views', type=str,
+                            help='Comma-separated views to run (default: all): ' + ', '.join(self.view_names()))
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Keep the page cache on (default: off, so every request renders)')
+        parser.add_argument('--url', type=str,
+                            help='Instead of the test client, load a running server (e.g. gunicorn) at this URL')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Parallel HTTP clients with --url (default: 8)')
+        parser.add_argument('--output', '-o', type=str, help='Save the results as JSON')
+        parser.add_argument('--compare', type=str, help='Results JSON of an earlier run to compare against')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the corpus and the requests')
+
+    def view_names(self):
+        return ['home', 'search', 'detail', 'dashboard', 'legacy_search']
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0:
+            raise CommandError('--requests must be positive')
+        names = self.view_names()
+        if options['views']:
+            names = [name.strip() for name in options['views'].split(',') if name.strip()]
+            unknown = set(names) - set(self.view_names())
+            if unknown:
+                raise CommandError(f"Unknown views: {', '.join(sorted(unknown))}")
+        baseline = self.load_results(options['compare']) if options['compare'] else None
+
+        if options['url']:
+            results = self.run_http(options, names)
+        else:
+            results = self.run_local(options, names)
+
+        self.report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({
+                    'revision': git_revision(),
+                    'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'mode': 'http' if options['url'] else 'client',
+                    'page_cache': options['page_cache'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(f"Saved results to {options['output']}")
+
+    def load_results(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return {(r['size'], r['view']): r for r in json.load(f)['results']}
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Could not read {path}: {str(e)}')
+
+    # Test client runs, on a throwaway database seeded with generate_corpus
+
+    def run_local(self, options, names):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',') if size.strip()})
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        if not sizes or sizes[0] <= 0:
+            raise CommandError('--sizes must be positive')
+
+        # A file database, so a 1M row corpus does not have to fit in memory
+        settings_dict = connection.settings_dict
+        workdir = tempfile.mkdtemp(prefix='newsfusion-bench-')
+        settings_dict['TEST'] = {**settings_dict.get('TEST', {}), 'NAME': os.path.join(workdir, 'bench.sqlite3')}
+        self.stdout.write(f'Creating a throwaway database in {workdir}...')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        results = []
+        try:
+            # A cache of its own, so the deployment's cached pages and freshness markers are left alone
+            cache_settings = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                          'LOCATION': os.path.join(workdir, 'cache')}}
+            with override_settings(PAGE_CACHE_ENABLED=options['page_cache'], CRAWL_FRESHNESS_TTL=FRESHNESS_TTL,
+                                   CACHES=cache_settings):
+                user = User.objects.create_user('benchmark', password='benchmark')
+                seeded = 0
+                for index, size in enumerate(sizes):
+                    # Grow the corpus from the previous size; each step gets its own seed
+                    self.stdout.write(f'Seeding {size} articles...')
+                    with open(os.devnull, 'w') as devnull:
+                        call_command('generate_corpus', articles=size - seeded,
+                                     news=int((size - seeded) * NEWS_RATIO), seed=options['seed'] + index,
+                                     stdout=devnull)
+                    seeded = size
+                    for keyword in [None] + SEARCH_KEYWORDS:
+                        mark_crawled(keyword)
+                    for name in names:
+                        results.append(self.measure_local(name, size, user, options))
+        finally:
+            connection.close()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+        return results
+
+    def local_request(self, name, rng, ids, client, factory, user):
+        """A function making one request to a view"""
+        if name == 'home':
+            return lambda: client.get(reverse('index'))
+        if name == 'search':
+            return lambda: client.get(reverse('search'), {'q': rng.choice(SEARCH_KEYWORDS)})
+        if name == 'detail':
+            return lambda: client.get(reverse('article_detail', args=[rng.randint(*ids)]))
+
+        # The legacy views have no URL any more, so they are called directly
+        def legacy():
+            if name == 'dashboard':
+                request = factory.get('/dashboard/')
+                request.user = user
+                return views.dashboard(request)
+            request = factory.get('/legacy-search/', {'q': rng.choice(SEARCH_KEYWORDS)})
+            request.user = user
+            return views.search(request)
+        return legacy
+
+    def measure_local(self, name, size, user, options):
+        rng = random.Random(options['seed'])
+        bounds = Article.objects.aggregate(low=Min('id'), high=Max('id'))
+        make_request = self.local_request(name, rng, (bounds['low'], bounds['high']), Client(), RequestFactory(), user)
+
+        for _ in range(options['warmup']):
+            make_request()
+        latencies, queries, repeats = [], [], []
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            with QueryRecorder().record() as recorder:
+                request_started = time.perf_counter()
+                response = make_request()
+                latencies.append(time.perf_counter() - request_started)
+            if response.status_code != 200:
+                raise CommandError(f'{name} answered {response.status_code} at {size} articles')
+            queries.append(recorder.count)
+            # Most runs of one statement: the length of an N+1 loop
+            repeats.append(max(recorder.fingerprints.values(), default=0))
+        result = self.summary(name, size, latencies, time.perf_counter() - started)
+        result['queries'] = max(queries)
+        result['max_repeats'] = max(repeats)
+        self.stdout.write(f"  {name}: p50 {result['p50_ms']:.1f} ms, {result['queries']} queries")
+        return result
+
+    # HTTP runs against a running server and its database
+
+    def run_http(self, options, names):
+        legacy = {'dashboard', 'legacy_search'} & set(names)
+        if legacy:
+            raise CommandError(f"{', '.join(sorted(legacy))} have no URL; leave them out with --views")
+        base = options['url'].rstrip('/')
+        rng = random.Random(options['seed'])
+        bounds = Article.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None and 'detail' in names:
+            raise CommandError('No articles in the database to request details for')
+        size = Article.objects.count()
+
+        results = []
+        for name in names:
+            urls = []
+            for _ in range(options['warmup'] + options['requests']):
+                if name == 'home':
+                    urls.append(f'{base}/')
+                elif name == 'search':
+                    urls.append(f"{base}/search/?{urlencode({'q': rng.choice(SEARCH_KEYWORDS)})}")
+                else:
+                    urls.append(f"{base}/article/{rng.randint(bounds['low'], bounds['high'])}/")
+            for url in urls[:options['warmup']]:
+                self.fetch(url)
+
+            with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as executor:
+                started = time.perf_counter()
+                latencies = list(executor.map(self.fetch, urls[options['warmup']:]))
+                elapsed = time.perf_counter() - started
+            result = self.summary(name, size, latencies, elapsed)
+            result['queries'] = result['max_repeats'] = None
+            results.append(result)
+        return results
+
+    def fetch(self, url):
+        started = time.perf_counter()
+        try:
+            with urlopen(url, timeout=60) as response:
+                response.read()
+        except (URLError, OSError) as e:
+            raise CommandError(f'Request to {url} failed: {str(e)}')
+        return time.perf_counter() - started
+
+    def summary(self, name, size, latencies, elapsed):
+        latencies = sorted(latencies)
+        return {
+            'view': name,
+            'size': size,
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def report(self, results, baseline):
+        header = f"{'articles':>9} {'view':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>7} {'repeats':>7} {'req/s':>8}"
+        if baseline:
+            header += f" {'p95 change':>11}"
+        self.stdout.write(header)
+        for result in results:
+            queries, repeats = ('-' if result.get(key) is None else result[key] for key in ('queries', 'max_repeats'))
+            line = (f"{result['size']:>9} {result['view']:<14} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                    f"{result['p99_ms']:>8.1f} {queries:>7} {repeats:>7} {result['requests_per_second'] or 0:>8.1f}")
+            if baseline:
+                before = baseline.get((result['size'], result['view']))
+                if before and before['p95_ms']:
+                    line += f" {(result['p95_ms'] - before['p95_ms']) / before['p95_ms']:>+11.0%}"
+                else:
+                    line += f" {'-':>11}"
+            self.stdout.write(line)
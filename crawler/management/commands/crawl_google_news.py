@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from crawler.google_news_crawler import GoogleNewsCrawlerThread
+from crawler.google_news_crawler import get_crawl_service
 from newsapp.models import Article
 import time
 import logging
@@ -32,25 +32,26 @@ class Command(BaseCommand):
         self.stdout.write(f'Initial article count: {initial_count}')
         
         try:
-            # Start the crawler thread
-            crawler_thread = GoogleNewsCrawlerThread(keyword=keyword)
-            crawler_thread.start()
+            # Queue the crawl on the crawl service
+            job = get_crawl_service().submit(keyword)
             
             if wait:
                 # Wait for the crawler thread to finish or timeout
                 self.stdout.write('Waiting for crawler to finish...')
                 wait_time = 0
-                while crawler_thread.is_alive() and wait_time < max_wait:
+                while not job.finished and wait_time < max_wait:
                     if wait_time % 10 == 0:  # Print status every 10 seconds
                         self.stdout.write(f'Crawler running for {wait_time} seconds...')
                     time.sleep(1)
                     wait_time += 1
                 
                 # Check if crawler is still running
-                if crawler_thread.is_alive():
+                if not job.finished:
                     self.stdout.write(self.style.WARNING(
                         f'Crawler still running after {max_wait} seconds. Continuing in background.'
                     ))
+                elif job.error:
+                    self.stdout.write(self.style.ERROR(f'Crawler failed: {job.error}'))
                 else:
                     self.stdout.write(self.style.SUCCESS('Crawler completed successfully!'))
             else:
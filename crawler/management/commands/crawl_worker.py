@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connections
+from crawler.worker import CrawlWorker, run_worker_process, DEFAULT_CONCURRENCY, DEFAULT_POLL_INTERVAL
+from crawler.job_queue import worker_name
+import multiprocessing
+import signal
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued crawl jobs (CRAWL_BACKEND = "queue") in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=getattr(settings, 'CRAWL_WORKER_PROCESSES', None),
+                            help='Worker processes, each with its own reactor (default: CPU count)')
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'CRAWL_WORKER_CONCURRENCY', DEFAULT_CONCURRENCY),
+                            help='Crawls running at once per process')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'CRAWL_WORKER_POLL_INTERVAL', DEFAULT_POLL_INTERVAL),
+                            help='Seconds between queue polls')
+        parser.add_argument('--lease-timeout', type=int, help='Lease length in seconds (default: CRAWL_QUEUE_LEASE_TIMEOUT)')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--max-jobs', type=int, help='Exit each process after this many jobs')
+
+    def handle(self, *args, **options):
+        processes = options['processes'] or multiprocessing.cpu_count()
+        worker_options = {
+            'concurrency': options['concurrency'],
+            'poll_interval': options['poll_interval'],
+            'lease_timeout': options['lease_timeout'],
+            'burst': options['burst'],
+            'max_jobs': options['max_jobs'],
+        }
+
+        if processes == 1:
+            self.stdout.write(f'Starting crawl worker {worker_name()}')
+            CrawlWorker(worker_name(), **worker_options).run()
+            return
+
+        # Spawned children start with a fresh interpreter, reactor and database connection
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        children = [
+            context.Process(target=run_worker_process, args=(index, worker_options), name=f'crawl-worker-{index}')
+            for index in range(processes)
+        ]
+        for child in children:
+            child.start()
+        self.stdout.write(f'Started {processes} crawl worker processes on {worker_name()}')
+
+        def forward(signum, frame):
+            # Children close their spiders and requeue unfinished jobs on SIGTERM
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            # Ctrl-C reaches the children directly through the process group
+            for child in children:
+                child.join()
+
+        failed = [child.name for child in children if child.exitcode not in (0, -signal.SIGTERM)]
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Worker processes exited abnormally: {', '.join(failed)}"))
+        self.stdout.write(self.style.SUCCESS('All crawl workers stopped'))
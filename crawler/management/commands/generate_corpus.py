@@ -0,0 +1,255 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from contextlib import contextmanager
+from collections import Counter
+from datetime import timedelta
+from itertools import accumulate
+from newsapp.models import Article, ArticleTerm, NewsArticle, NewsSource
+from newsapp import postings
+from newsapp.page_cache import bump_ingest_generation
+from newsapp.search import create_fts_index, drop_fts_index, fts_available
+from crawler import neardup
+from crawler.crawler_api import KEYWORD_TEMPLATES, SAMPLE_NEWS
+import hashlib
+import random
+import re
+import time
+
+# Generated rows are recognised (and removed by --clear) by their URL
+SYNTHETIC_URL = 'https://synthetic.example/'
+PUBLISHERS = [
+    'Times of India', 'The Hindu', 'NDTV', 'Hindustan Times', 'India Today', 'Mint', 'News18',
+    'The Indian Express', 'Deccan Herald', 'Business Standard', 'Scroll', 'The Print', 'Reuters', 'BBC',
+]
+# Crawl keywords, most popular first; None is trending news
+KEYWORDS = [None] + list(KEYWORD_TEMPLATES) + [
+    'election', 'monsoon', 'ipl', 'stock market', 'budget', 'isro', 'inflation', 'startup',
+    'bollywood', 'climate', 'railways', 'supreme court', 'vaccine', 'space', 'education',
+]
+PUBLISHED_TIMES = ['Recent', '1 hour ago', '3 hours ago', 'Yesterday', '2 days ago']
+DELETE_CHUNK = 10000
+
+
+def zipf_cum_weights(count, exponent=1.0):
+    """Cumulative weights for rank-frequency sampling, as in natural text"""
+    return list(accumulate(1.0 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def build_vocabulary():
+    """Words of the demo crawler's templates, most frequent first"""
+    texts = [news[field] for news in SAMPLE_NEWS for field in ('headline', 'summary')]
+    texts += [news[field] for templates in KEYWORD_TEMPLATES.values() for news in templates
+              for field in ('headline', 'summary')]
+    counts = Counter(word for text in texts for word in re.findall(r'[a-z]{3,}', text.lower()))
+    return [word for word, _ in counts.most_common()]
+
+
+@contextmanager
+def explicit_timestamp(model, field_name):
+    """Let bulk_create keep the timestamps we set on an auto_now_add field"""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic Article / NewsArticle corpus for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=0, help='Google News articles to generate')
+        parser.add_argument('--news', type=int, default=0, help='Source-crawled news articles to generate')
+        parser.add_argument('--sources', type=int, default=20,
+                            help='Inactive news sources to spread --news over (default: 20)')
+        parser.add_argument('--days', type=int, default=90, help='Spread timestamps over this many days (default: 90)')
+        parser.add_argument('--near-duplicates', type=float, default=0.15,
+                            help='Fraction of articles that are other outlets\' copies of a story (default: 0.15)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert (default: 5000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same corpus')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated rows first')
+
+    def handle(self, *args, **options):
+        if not (options['articles'] or options['news'] or options['clear']):
+            raise CommandError('Nothing to do: pass --articles, --news and/or --clear')
+        if not 0 <= options['near_duplicates'] < 1:
+            raise CommandError('--near-duplicates must be between 0 and 1')
+
+        self.rng = random.Random(options['seed'])
+        self.vocabulary = build_vocabulary()
+        self.word_weights = zipf_cum_weights(len(self.vocabulary))
+        self.keyword_weights = zipf_cum_weights(len(KEYWORDS), exponent=0.8)
+        self.publisher_weights = zipf_cum_weights(len(PUBLISHERS), exponent=0.6)
+        self.now = timezone.now()
+        self.span = max(1, options['days']) * 86400
+        self.serial = 0
+        batch_size = max(1, options['batch_size'])
+        self.stdout.write(f"Database: {connection.settings_dict['NAME']}")
+
+        if options['clear']:
+            self.clear()
+
+        for model, count in ((Article, options['articles']), (NewsArticle, options['news'])):
+            if count <= 0:
+                continue
+            # Maintaining the search index row by row is slower than one rebuild
+            indexed = fts_available(model)
+            if indexed:
+                drop_fts_index(model)
+            start = time.time()
+            try:
+                if model is Article:
+                    self.generate_articles(count, batch_size, options['near_duplicates'])
+                else:
+                    self.generate_news(count, batch_size, options['sources'])
+            except IntegrityError:
+                raise CommandError('Rows from this seed already exist: pass --clear or another --seed')
+            finally:
+                load_time = time.time() - start
+                if indexed:
+                    self.stdout.write(f'Rebuilding the {model.__name__} search index...')
+                    create_fts_index(model)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: {count} rows in {load_time:.1f}s ({count / load_time:,.0f} rows/s), '
+                f'{time.time() - start - load_time:.1f}s to index'
+            ))
+
+        bump_ingest_generation()
+
+    def clear(self):
+        for model in (Article, NewsArticle):
+            queryset = model.objects.filter(url__startswith=SYNTHETIC_URL)
+            batches = [queryset]
+            if model is Article:
+                # Postings first: chunked deletes of their articles would each cascade to them
+                ArticleTerm.objects.filter(article__url__startswith=SYNTHETIC_URL).delete()
+                # Detach real copies from synthetic stories before they go
+                Article.objects.filter(duplicate_of__url__startswith=SYNTHETIC_URL).exclude(
+                    url__startswith=SYNTHETIC_URL).update(duplicate_of=None)
+                # Copies go before their stories, so no chunk leaves a dangling duplicate_of
+                batches = [queryset.filter(duplicate_of__isnull=False), queryset]
+            deleted = 0
+            for batch in batches:
+                while True:
+                    ids = list(batch.order_by().values_list('id', flat=True)[:DELETE_CHUNK])
+                    if not ids:
+                        break
+                    model.objects.filter(id__in=ids).delete()
+                    deleted += len(ids)
+            self.stdout.write(f'Deleted {deleted} generated {model.__name__} rows')
+        NewsSource.objects.filter(url__startswith=SYNTHETIC_URL).delete()
+
+    def sentences(self, count, low, high):
+        """``count`` random word sequences, drawn in one call"""
+        lengths = [self.rng.randint(low, high) for _ in range(count)]
+        words = self.rng.choices(self.vocabulary, cum_weights=self.word_weights, k=sum(lengths))
+        texts, position = [], 0
+        for length in lengths:
+            texts.append(' '.join(words[position:position + length]))
+            position += length
+        return texts
+
+    def timestamps(self, count):
+        """Creation times spread over the window, denser towards now"""
+        return [self.now - timedelta(seconds=self.span * self.rng.random() ** 2) for _ in range(count)]
+
+    def next_url(self, kind):
+        self.serial += 1
+        return f'{SYNTHETIC_URL}{kind}/{self.serial}'
+
+    def generate_articles(self, count, batch_size, duplicate_rate):
+        written = 0
+        with explicit_timestamp(Article, 'created_at'):
+            while written < count:
+                size = min(batch_size, count - written)
+                copies = int(size * duplicate_rate)
+                canonicals = self.article_batch(size - copies)
+                with transaction.atomic():
+                    # Returns primary keys, so copies can point at their story
+                    Article.objects.bulk_create(canonicals)
+                    copies_batch = Article.objects.bulk_create(self.copies_of(canonicals, copies))
+                    if postings.enabled():
+                        postings.index_articles(canonicals + copies_batch)
+                written += size
+                self.progress(written, count)
+        self.stdout.write('')
+
+    def article_batch(self, size):
+        titles = self.sentences(size, 6, 12)
+        summaries = self.sentences(size, 15, 35)
+        keywords = self.rng.choices(KEYWORDS, cum_weights=self.keyword_weights, k=size)
+        publishers = self.rng.choices(PUBLISHERS, cum_weights=self.publisher_weights, k=size)
+        created = self.timestamps(size)
+        articles = []
+        for title, summary, keyword, publisher, created_at in zip(titles, summaries, keywords, publishers, created):
+            if keyword and self.rng.random() < 0.8:
+                title = f'{keyword} {title}'
+            title = f'{title.capitalize()} - {publisher}'
+            url = self.next_url('article')
+            article = Article(
+                title=title[:255], summary=summary, url=url, source=publisher, keyword=keyword,
+                published_time=self.rng.choice(PUBLISHED_TIMES), created_at=created_at,
+                content_hash=hashlib.sha256((title + url).encode('utf-8')).hexdigest(),
+            )
+            article.fill_list_fields()
+            neardup.assign_signature(article)
+            articles.append(article)
+        return articles
+
+    def copies_of(self, canonicals, count):
+        """Other outlets' versions of stories: another suffix, an edited summary, a bit later"""
+        copies = []
+        for canonical in self.rng.choices(canonicals, k=count) if canonicals else []:
+            publisher = self.rng.choice(PUBLISHERS)
+            title = f"{canonical.title.rsplit(' - ', 1)[0]} - {publisher}"
+            summary = canonical.summary
+            if self.rng.random() < 0.5:
+                summary = f'{summary} {self.sentences(1, 1, 3)[0]}'
+            url = self.next_url('article')
+            copy = Article(
+                title=title[:255], summary=summary, url=url, source=publisher, keyword=canonical.keyword,
+                published_time=self.rng.choice(PUBLISHED_TIMES), duplicate_of_id=canonical.pk,
+                created_at=canonical.created_at + min(timedelta(minutes=self.rng.randint(5, 600)),
+                                                      (self.now - canonical.created_at) * self.rng.random()),
+                content_hash=hashlib.sha256((title + url).encode('utf-8')).hexdigest(),
+            )
+            copy.fill_list_fields()
+            neardup.assign_signature(copy)
+            copies.append(copy)
+        return copies
+
+    def generate_news(self, count, batch_size, source_count):
+        sources = list(NewsSource.objects.filter(url__startswith=SYNTHETIC_URL).order_by('id')[:source_count])
+        for index in range(len(sources), max(1, source_count)):
+            sources.append(NewsSource.objects.create(
+                name=f'Synthetic source {index + 1}', url=f'{SYNTHETIC_URL}source/{index + 1}/', is_active=False,
+            ))
+        source_weights = zipf_cum_weights(len(sources), exponent=0.6)
+
+        written = 0
+        with explicit_timestamp(NewsArticle, 'published_date'):
+            while written < count:
+                size = min(batch_size, count - written)
+                headlines = self.sentences(size, 6, 12)
+                summaries = self.sentences(size, 15, 35)
+                chosen = self.rng.choices(sources, cum_weights=source_weights, k=size)
+                batch = []
+                for headline, summary, source, published in zip(headlines, summaries, chosen, self.timestamps(size)):
+                    headline = headline.capitalize()
+                    article = NewsArticle(
+                        source=source, headline=headline[:255], summary=summary, url=self.next_url('news'),
+                        published_date=published,
+                        content_hash=hashlib.sha256((headline + summary + str(self.serial)).encode('utf-8')).hexdigest(),
+                    )
+                    article.fill_list_fields()
+                    batch.append(article)
+                NewsArticle.objects.bulk_create(batch)
+                written += size
+                self.progress(written, count)
+        self.stdout.write('')
+
+    def progress(self, written, count):
+        self.stdout.write(f'\r   {written}/{count} rows', ending='')
+        self.stdout.flush()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from newsapp import postings
+from newsapp.models import Article, ArticleTerm, NewsArticle
+from newsapp.search import fts_available, fts_supported, create_fts_index, rebuild_fts_index
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Article postings index and the full-text search indexes for Article and NewsArticle'
+
+    def handle(self, *args, **options):
+        if postings.enabled():
+            start = time.time()
+            written = postings.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt postings for Article: {written} postings for {Article.objects.count()} rows '
+                f'in {time.time() - start:.2f}s'
+            ))
+        elif ArticleTerm.objects.exists():
+            self.stdout.write('SEARCH_POSTINGS_ENABLED is off: postings left as they are')
+
+        if not fts_supported():
+            self.stdout.write(self.style.WARNING(
+                'This database does not support SQLite FTS5; other searches use table scans instead.'
+            ))
+            return
+
+        for model in (Article, NewsArticle):
+            start = time.time()
+            if fts_available(model):
+                rebuild_fts_index(model)
+                action = 'Rebuilt'
+            else:
+                create_fts_index(model)
+                action = 'Created'
+            rows = model.objects.count()
+            self.stdout.write(self.style.SUCCESS(
+                f'{action} index for {model.__name__}: {rows} rows in {time.time() - start:.2f}s'
+            ))
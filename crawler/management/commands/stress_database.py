@@ -0,0 +1,180 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+from newsapp import postings
+from newsapp.models import Article
+from newsapp.search import matching
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+WORDS = (
+    'government minister election court police market shares rupee budget monsoon cricket match team '
+    'captain series final injury coach player league vote party leader protest city state district '
+    'hospital vaccine school exam result railway airport flight weather storm flood heat record'
+).split()
+SEED_CHUNK = 5000
+
+
+class Command(BaseCommand):
+    help = 'Run parallel ingest and read load against a throwaway SQLite database and check for lock errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=2, help='Threads inserting article batches (default: 2)')
+        parser.add_argument('--readers', type=int, default=4, help='Threads running listing and search queries (default: 4)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load (default: 10)')
+        parser.add_argument('--rows', type=int, default=20000, help='Articles in the table before the load (default: 20000)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Articles per write transaction (default: 50)')
+        parser.add_argument('--max-read-ms', type=float, default=250.0,
+                            help='Fail if the 99th percentile read takes longer (default: 250)')
+        parser.add_argument('--plain', action='store_true',
+                            help='Drop the concurrent-mode OPTIONS, to compare with plain SQLite')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('stress_database only applies to SQLite databases')
+
+        settings_dict = connection.settings_dict
+        saved_options = settings_dict.get('OPTIONS', {})
+        if options['plain']:
+            settings_dict['OPTIONS'] = {}
+        mode = 'plain' if options['plain'] or not settings_dict.get('OPTIONS') else 'concurrent'
+
+        # Threads need a file database: each opens its own connection to it
+        workdir = tempfile.mkdtemp(prefix='newsfusion-stress-')
+        settings_dict['TEST'] = {**settings_dict.get('TEST', {}), 'NAME': os.path.join(workdir, 'stress.sqlite3')}
+        self.stdout.write(f'Creating a throwaway database in {workdir} ({mode} mode)...')
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.seed(options['rows'])
+            results = self.run_load(options)
+        finally:
+            connection.close()
+            teardown_databases(old_config, verbosity=0)
+            settings_dict['OPTIONS'] = saved_options
+            try:
+                os.rmdir(workdir)
+            except OSError:
+                pass
+
+        self.report(results, options)
+
+    def headline(self, rng):
+        return ' '.join(rng.choice(WORDS) for _ in range(8)).capitalize()
+
+    def new_articles(self, rng, count):
+        return [
+            Article(title=self.headline(rng), summary=self.headline(rng), url=f'https://example.com/{rng.getrandbits(64):x}',
+                    source='Stress', keyword=rng.choice(WORDS), content_hash=f'{rng.getrandbits(256):064x}')
+            for _ in range(count)
+        ]
+
+    def seed(self, rows):
+        rng = random.Random(0)
+        for start in range(0, rows, SEED_CHUNK):
+            batch = Article.objects.bulk_create(self.new_articles(rng, min(SEED_CHUNK, rows - start)))
+            if postings.enabled():
+                postings.index_articles(batch)
+
+    def run_load(self, options):
+        stop = threading.Event()
+        lock = threading.Lock()
+        results = {'reads': [], 'writes': 0, 'rows': 0, 'lock_errors': 0, 'errors': []}
+
+        def record_error(e):
+            with lock:
+                if 'locked' in str(e):
+                    results['lock_errors'] += 1
+                else:
+                    results['errors'].append(str(e))
+
+        def writer(index):
+            rng = random.Random(1000 + index)
+            try:
+                while not stop.is_set():
+                    batch = self.new_articles(rng, options['batch_size'])
+                    try:
+                        # The pipelines' flush: dedup lookup, insert, postings, one transaction
+                        with transaction.atomic():
+                            hashes = [obj.content_hash for obj in batch]
+                            set(Article.objects.filter(content_hash__in=hashes).values_list('content_hash', flat=True))
+                            Article.objects.bulk_create(batch, ignore_conflicts=True)
+                            stored = list(Article.objects.filter(content_hash__in=hashes)
+                                          .only('id', 'title', 'summary', 'keyword', 'created_at'))
+                            if postings.enabled():
+                                postings.index_articles(stored)
+                            inserted = len(stored)
+                        with lock:
+                            results['writes'] += 1
+                            results['rows'] += inserted
+                    except OperationalError as e:
+                        record_error(e)
+            finally:
+                connection.close()
+
+        def reader(index):
+            rng = random.Random(2000 + index)
+            latencies = []
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        if rng.random() < 0.7:
+                            # Home page listing
+                            list(Article.objects.filter(duplicate_of__isnull=True).order_by('-created_at', '-id')[:20])
+                        else:
+                            # Search page
+                            list(matching(Article, rng.choice(WORDS), Article.objects.all()).order_by('-created_at')[:20])
+                        latencies.append(time.perf_counter() - start)
+                    except OperationalError as e:
+                        record_error(e)
+            finally:
+                connection.close()
+                with lock:
+                    results['reads'].extend(latencies)
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        results['elapsed'] = time.perf_counter() - started
+        return results
+
+    def report(self, results, options):
+        reads = sorted(results['reads'])
+        elapsed = results['elapsed']
+        self.stdout.write(f"Writes: {results['writes']} transactions, {results['rows']} rows "
+                          f"({results['rows'] / elapsed:,.0f} rows/s)")
+        if reads:
+            p99 = reads[min(len(reads) - 1, int(len(reads) * 0.99))] * 1000
+            self.stdout.write(
+                f'Reads: {len(reads)} ({len(reads) / elapsed:,.0f}/s), '
+                f'median {statistics.median(reads) * 1000:.1f} ms, '
+                f'p95 {reads[min(len(reads) - 1, int(len(reads) * 0.95))] * 1000:.1f} ms, '
+                f'p99 {p99:.1f} ms, max {reads[-1] * 1000:.1f} ms'
+            )
+        else:
+            p99 = None
+            self.stdout.write('Reads: none completed')
+        self.stdout.write(f"Lock errors: {results['lock_errors']}, other errors: {len(results['errors'])}")
+        for error in results['errors'][:5]:
+            self.stdout.write(f'  {error}')
+
+        failures = []
+        if results['lock_errors']:
+            failures.append(f"{results['lock_errors']} 'database is locked' errors")
+        if results['errors']:
+            failures.append(f"{len(results['errors'])} database errors")
+        if p99 is None or p99 > options['max_read_ms']:
+            failures.append(f"p99 read latency above {options['max_read_ms']:.0f} ms")
+        if failures:
+            raise CommandError('Stress test failed: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('No lock errors and read latency within bounds'))
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from crawler.google_news_crawler import GoogleNewsCrawlerThread
+from crawler.google_news_crawler import get_crawl_service
 import time
 import logging
 
@@ -22,18 +22,17 @@ class Command(BaseCommand):
             self.stdout.write('Testing Google News crawler for trending news')
         
         try:
-            # Start the crawler thread
-            crawler_thread = GoogleNewsCrawlerThread(keyword=keyword)
-            crawler_thread.start()
+            # Queue the crawl on the crawl service
+            job = get_crawl_service().submit(keyword)
             
             # Wait for the crawler thread to finish or timeout
             wait_time = 0
-            while crawler_thread.is_alive() and wait_time < timeout:
+            while not job.finished and wait_time < timeout:
                 self.stdout.write(f'Crawler running ({wait_time}s)...')
                 time.sleep(1)
                 wait_time += 1
             
-            if crawler_thread.is_alive():
+            if not job.finished:
                 self.stdout.write(self.style.WARNING(f'Crawler still running after {timeout} seconds. This is normal if it\'s fetching a lot of data.'))
                 self.stdout.write('The crawler will continue running in the background.')
             else:
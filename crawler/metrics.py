@@ -0,0 +1,178 @@
+"""
+Per-stage ingest timings, aggregated across crawls
+
+While a spider runs, each stage (fetch, parse, dedup, near-duplicate
+screening, database writes, search postings) adds its timings to the crawl
+stats as a histogram: ``timing/<stage>/count``, ``timing/<stage>/sum`` and
+one ``timing/<stage>/bucket/<le>`` counter per bucket. When the spider closes
+the IngestMetrics extension adds the run's histograms and counters to the
+IngestMetric table, so runs in every process and crawl worker add up.
+``/crawler/metrics/`` renders the totals in the Prometheus text format.
+
+With INGEST_METRICS_ENABLED = False the extension is not loaded and
+``timed()`` returns a shared no-op context manager.
+"""
+import bisect
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from django.conf import settings
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKET_LABELS = tuple(f'{bound:g}' for bound in BUCKETS) + ('+Inf',)
+
+STAT_PREFIX = 'timing'
+METRIC_PREFIX = 'newsfusion_ingest'
+
+# Counter metrics and the crawl stat each run adds to them
+RUN_COUNTERS = [
+    ('pages_fetched_total', 'response_received_count', 'Responses downloaded'),
+    ('response_bytes_total', 'downloader/response_bytes', 'Bytes downloaded'),
+    ('pages_skipped_total', 'incremental/pages_skipped', 'Unchanged pages not parsed'),
+    ('items_scraped_total', 'item_scraped_count', 'Items scraped'),
+    ('articles_stored_total', 'new_articles_count', 'New rows written'),
+    ('errors_total', 'log_count/ERROR', 'Errors logged'),
+]
+
+NULL_TIMER = nullcontext()
+
+
+def is_enabled(crawler_settings=None):
+    """Scrapy setting INGEST_METRICS_ENABLED if given, then the Django setting"""
+    default = getattr(settings, 'INGEST_METRICS_ENABLED', True)
+    if crawler_settings is None:
+        return default
+    return crawler_settings.getbool('INGEST_METRICS_ENABLED', default)
+
+
+def timing_stats(crawler):
+    """The crawler's stats collector if metrics are enabled, else None"""
+    if crawler is None or getattr(crawler, 'stats', None) is None:
+        return None
+    return crawler.stats if is_enabled(crawler.settings) else None
+
+
+def observe(stats, stage, seconds):
+    """Add one timing to a stage's histogram in the crawl stats"""
+    label = BUCKET_LABELS[bisect.bisect_left(BUCKETS, seconds)]
+    stats.inc_value(f'{STAT_PREFIX}/{stage}/count')
+    stats.inc_value(f'{STAT_PREFIX}/{stage}/sum', seconds, start=0.0)
+    stats.inc_value(f'{STAT_PREFIX}/{stage}/bucket/{label}')
+
+
+class Timer:
+    __slots__ = ('stats', 'stage', 'started')
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stats, self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def timed(stats, stage):
+    """
+    Context manager timing a block into ``stage``; a no-op when ``stats`` is None
+
+    Example:
+        with metrics.timed(self.timing, 'dedup'):
+            existing = dedup.existing_hashes(...)
+    """
+    if stats is None:
+        return NULL_TIMER
+    return Timer(stats, stage)
+
+
+def run_totals(stats, elapsed):
+    """
+    Metric deltas and gauges for one finished crawl
+
+    Returns:
+        tuple: ({(name, stage, le): delta}, {(name, stage, le): value})
+    """
+    deltas = Counter()
+    for key, value in stats.get_stats().items():
+        parts = key.split('/')
+        if parts[0] != STAT_PREFIX or len(parts) < 3:
+            continue
+        stage, kind = parts[1], parts[2]
+        if kind == 'bucket' and len(parts) == 4:
+            deltas[('stage_seconds_bucket', stage, parts[3])] += value
+        elif kind in ('sum', 'count'):
+            deltas[(f'stage_seconds_{kind}', stage, '')] += value
+
+    for name, stat, _ in RUN_COUNTERS:
+        deltas[(name, '', '')] += stats.get_value(stat, 0) or 0
+    deltas[('crawls_total', '', '')] += 1
+    deltas[('crawl_seconds_total', '', '')] += elapsed
+
+    items = stats.get_value('item_scraped_count', 0) or 0
+    gauges = {('last_crawl_items_per_second', '', ''): items / elapsed if elapsed > 0 else 0.0}
+    return deltas, gauges
+
+
+def record_run(stats, elapsed):
+    """Add a finished crawl's metrics to the IngestMetric totals"""
+    from django.db import transaction
+    from django.db.models import F
+    from .models import IngestMetric
+
+    deltas, gauges = run_totals(stats, elapsed)
+    with transaction.atomic():
+        # Create missing rows, then increment: concurrent runs never overwrite each other
+        IngestMetric.objects.bulk_create(
+            [IngestMetric(name=name, stage=stage, le=le) for name, stage, le in list(deltas) + list(gauges)],
+            ignore_conflicts=True,
+        )
+        for (name, stage, le), delta in deltas.items():
+            if delta:
+                IngestMetric.objects.filter(name=name, stage=stage, le=le).update(value=F('value') + delta)
+        for (name, stage, le), value in gauges.items():
+            IngestMetric.objects.filter(name=name, stage=stage, le=le).update(value=value)
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus():
+    """All stored metrics in the Prometheus text exposition format"""
+    from .models import IngestMetric
+
+    values = {(m.name, m.stage, m.le): m.value for m in IngestMetric.objects.all()}
+    lines = []
+
+    stages = sorted({stage for name, stage, _ in values if name == 'stage_seconds_count'})
+    if stages:
+        metric = f'{METRIC_PREFIX}_stage_seconds'
+        lines.append(f'# HELP {metric} Time spent per ingest stage (fetch, parse, dedup, neardup, db_write, postings)')
+        lines.append(f'# TYPE {metric} histogram')
+        for stage in stages:
+            cumulative = 0
+            for label in BUCKET_LABELS:
+                cumulative += values.get(('stage_seconds_bucket', stage, label), 0)
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{label}"}} {format_value(cumulative)}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {format_value(values.get(("stage_seconds_sum", stage, ""), 0))}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {format_value(values.get(("stage_seconds_count", stage, ""), 0))}')
+
+    counters = [('crawls_total', 'Crawls finished'), ('crawl_seconds_total', 'Seconds spent crawling')]
+    counters += [(name, description) for name, _, description in RUN_COUNTERS]
+    for name, description in counters:
+        metric = f'{METRIC_PREFIX}_{name}'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {format_value(values.get((name, "", ""), 0))}')
+
+    metric = f'{METRIC_PREFIX}_last_crawl_items_per_second'
+    lines.append(f'# HELP {metric} Items scraped per second in the most recent crawl')
+    lines.append(f'# TYPE {metric} gauge')
+    lines.append(f'{metric} {format_value(values.get(("last_crawl_items_per_second", "", ""), 0))}')
+    return '\n'.join(lines) + '\n'
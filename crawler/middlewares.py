@@ -0,0 +1,170 @@
+"""
+Scrapy downloader middlewares for the NewsFusion crawlers
+"""
+import django
+import os
+import sys
+import hashlib
+import logging
+from django.conf import settings as django_settings
+from django.db import DatabaseError
+from django.utils import timezone
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+logger = logging.getLogger(__name__)
+
+# Add the project directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'newsfusion.settings')
+django.setup()
+
+from .models import PageValidator
+
+
+def incremental_enabled(spider):
+    """A spider's ``incremental`` argument, e.g. ``-a incremental=0`` for a full crawl"""
+    value = getattr(spider, 'incremental', True)
+    if isinstance(value, str):
+        return value.strip().lower() not in ('0', 'false', 'no', 'off')
+    return bool(value)
+
+
+class ConditionalRequestMiddleware:
+    """
+    Incremental crawling with conditional requests
+
+    Requests for a spider's start URLs (or with ``meta['incremental']``)
+    carry If-None-Match / If-Modified-Since from the page's PageValidator
+    row. When the server answers 304, or answers 200 with an unchanged
+    fingerprint, the response is dropped before the spider parses it, so
+    neither the page nor the pages it links to are processed again.
+
+    The fingerprint is the sha256 of the body, or the spider's
+    ``page_fingerprint(response)`` for pages whose markup changes on every
+    fetch. Validators are saved when the spider finishes, except for pages
+    whose callback raised, so a page that failed to parse is parsed again
+    on the next crawl. None are saved when a pipeline failed to write
+    items, since their pages would otherwise be skipped as unchanged.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.pending = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # Scrapy settings win, then the Django settings
+        if not crawler.settings.getbool('INCREMENTAL_CRAWL_ENABLED',
+                                        getattr(django_settings, 'INCREMENTAL_CRAWL_ENABLED', True)):
+            raise NotConfigured
+        middleware = cls(crawler.stats)
+        crawler.signals.connect(middleware.spider_error, signal=signals.spider_error)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def tracked(self, request, spider):
+        if not incremental_enabled(spider):
+            return False
+        if 'incremental' in request.meta:
+            return bool(request.meta['incremental'])
+        return request.url in getattr(spider, 'start_urls', ())
+
+    def process_request(self, request, spider):
+        if not self.tracked(request, spider):
+            return None
+
+        url_hash = PageValidator.hash_url(request.url)
+        try:
+            validator = PageValidator.objects.filter(url_hash=url_hash).first()
+        except DatabaseError as e:
+            logger.error(f"Could not load page validators for {request.url}: {str(e)}")
+            return None
+        if validator is None:
+            validator = PageValidator(url=request.url, url_hash=url_hash)
+        # Redirects and retries copy the meta, so the start URL's row follows the request
+        request.meta['page_validator'] = validator
+
+        if validator.etag:
+            request.headers.setdefault('If-None-Match', validator.etag)
+        if validator.last_modified:
+            request.headers.setdefault('If-Modified-Since', validator.last_modified)
+        if validator.etag or validator.last_modified:
+            self.stats.inc_value('incremental/conditional_requests', spider=spider)
+        return None
+
+    def process_response(self, request, response, spider):
+        validator = request.meta.get('page_validator')
+        if validator is None:
+            return response
+
+        now = timezone.now()
+        if response.status == 304 and validator.pk:
+            validator.checked_at = now
+            validator.unchanged_count += 1
+            self.pending[validator.url_hash] = validator
+            self.skip(spider, 'not_modified', validator.content_length)
+            raise IgnoreRequest(f'Not modified: {request.url}')
+        if response.status != 200:
+            return response
+
+        fingerprint = self.fingerprint(response, spider)
+        validator.etag = response.headers.get('ETag', b'').decode('latin-1')[:255]
+        validator.last_modified = response.headers.get('Last-Modified', b'').decode('latin-1')[:64]
+        validator.checked_at = now
+        self.pending[validator.url_hash] = validator
+
+        if validator.pk and validator.fingerprint == fingerprint:
+            validator.unchanged_count += 1
+            self.skip(spider, 'unchanged', 0)
+            raise IgnoreRequest(f'Unchanged since last crawl: {request.url}')
+
+        validator.fingerprint = fingerprint
+        validator.content_length = len(response.body)
+        validator.changed_at = now
+        validator.unchanged_count = 0
+        self.stats.inc_value('incremental/changed', spider=spider)
+        return response
+
+    def fingerprint(self, response, spider):
+        page_fingerprint = getattr(spider, 'page_fingerprint', None)
+        if page_fingerprint is not None:
+            try:
+                value = page_fingerprint(response)
+                if value:
+                    return value
+            except Exception as e:
+                logger.error(f"Error fingerprinting {response.url}: {str(e)}")
+        return hashlib.sha256(response.body).hexdigest()
+
+    def skip(self, spider, reason, bytes_saved):
+        self.stats.inc_value(f'incremental/{reason}', spider=spider)
+        self.stats.inc_value('incremental/pages_skipped', spider=spider)
+        self.stats.inc_value('incremental/bytes_saved', bytes_saved, spider=spider)
+
+    def spider_error(self, failure, response, spider):
+        """The callback raised: keep the old validators so the page is parsed next time"""
+        validator = response.meta.get('page_validator') if response.request is not None else None
+        if validator is not None:
+            self.pending.pop(validator.url_hash, None)
+
+    def spider_closed(self, spider, reason):
+        from .pipelines import WRITE_ERRORS_STAT
+
+        # An interrupted crawl may not have followed every page: store nothing
+        if reason != 'finished' or not self.pending:
+            return
+        # The pipelines close before this signal, so all writes are done by now
+        if self.stats.get_value(WRITE_ERRORS_STAT, 0):
+            logger.warning('Items failed to save: keeping the old page validators so the pages are crawled again')
+            self.pending = {}
+            return
+        validators = list(self.pending.values())
+        self.pending = {}
+        fields = ['etag', 'last_modified', 'fingerprint', 'content_length',
+                  'checked_at', 'changed_at', 'unchanged_count']
+        try:
+            PageValidator.objects.bulk_update([v for v in validators if v.pk], fields)
+            PageValidator.objects.bulk_create([v for v in validators if not v.pk], ignore_conflicts=True)
+        except DatabaseError as e:
+            logger.error(f"Could not save page validators: {str(e)}")
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='crawljob',
+            name='crawler_cra_status_b1e2f7_idx',
+        ),
+        migrations.AddField(
+            model_name='crawljob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='crawljob',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='crawljob',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='crawljob',
+            name='max_attempts',
+            field=models.PositiveIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='crawljob',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='crawljob',
+            index=models.Index(fields=['status', 'available_at'], name='crawler_cra_status_a7da9f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crawljob',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='crawler_cra_status_e58319_idx'),
+        ),
+    ]
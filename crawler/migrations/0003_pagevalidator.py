@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0002_crawljob_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageValidator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=2000)),
+                ('url_hash', models.CharField(max_length=64, unique=True)),
+                ('etag', models.CharField(blank=True, default='', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('fingerprint', models.CharField(blank=True, default='', max_length=64)),
+                ('content_length', models.PositiveIntegerField(default=0)),
+                ('checked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('unchanged_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
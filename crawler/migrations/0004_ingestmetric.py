@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0003_pagevalidator'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('stage', models.CharField(blank=True, default='', max_length=50)),
+                ('le', models.CharField(blank=True, default='', max_length=20)),
+                ('value', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'stage', 'le'), name='unique_ingest_metric')],
+            },
+        ),
+    ]
@@ -1,3 +1,159 @@
+import hashlib
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
+
+class CrawlJob(models.Model):
+    """
+    Progress and outcome of one Google News crawl, shared by every worker
+
+    Rows are created when a crawl is queued and updated by the
+    CrawlJobProgress extension at most every CRAWL_JOB_PROGRESS_INTERVAL
+    seconds while the spider runs.
+
+    With CRAWL_BACKEND = 'queue' the table is also the job queue: crawl_worker
+    processes lease queued rows (see crawler/job_queue.py). Rows run by the
+    in-process crawl service carry that process's name in ``worker`` from the
+    start, so workers never lease them, and a lease the service renews: a
+    row whose lease lapsed belongs to a process that died mid-crawl.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    # Normalized keyword ('trending' or 'search:<keyword>'), see normalize_keyword()
+    key = models.CharField(max_length=120)
+    keyword = models.CharField(max_length=100, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    requests = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    pages_fetched = models.PositiveIntegerField(default=0)
+    items_scraped = models.PositiveIntegerField(default=0)
+    new_rows = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    duration = models.FloatField(blank=True, null=True)  # Seconds
+    # Queue: leasing worker, lease expiry (visibility timeout) and retries
+    worker = models.CharField(max_length=200, blank=True, default='')
+    available_at = models.DateTimeField(default=timezone.now)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Latest job for a keyword
+            models.Index(fields=['key', 'created_at']),
+            # Next queued job, and running jobs whose lease has expired; the
+            # first also serves status-only lookups
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.key} ({self.status})'
+
+    @property
+    def finished(self):
+        return self.status in (self.COMPLETED, self.FAILED)
+
+    @property
+    def abandoned(self):
+        """Queued or running, but its owner stopped renewing the lease"""
+        return (not self.finished and self.lease_expires_at is not None
+                and self.lease_expires_at < timezone.now())
+
+    @property
+    def in_progress(self):
+        return not self.finished and not self.abandoned
+
+    @classmethod
+    def latest_for(cls, key):
+        """Most recent job for a normalized keyword, or None"""
+        return cls.objects.filter(key=key).order_by('-created_at').first()
+
+    def as_dict(self, detail=True):
+        """Fields for status responses; ``detail`` adds the worker and error text"""
+        fields = {
+            'id': self.id,
+            'key': self.key,
+            'keyword': self.keyword,
+            'status': self.status,
+            'requests': self.requests,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'updated_at': self.updated_at,
+            'pages_fetched': self.pages_fetched,
+            'items_scraped': self.items_scraped,
+            'new_rows': self.new_rows,
+            'error_count': self.error_count,
+            'duration': self.duration,
+            'attempts': self.attempts,
+        }
+        if detail:
+            fields.update(error=self.error, worker=self.worker)
+        return fields
+
+
+class PageValidator(models.Model):
+    """
+    Cache validators of a crawled start page, for incremental crawls
+
+    The ConditionalRequestMiddleware sends the stored ETag and Last-Modified
+    with the next request for the page. A 304, or a 200 whose fingerprint
+    matches the stored one, means nothing changed and the page is not parsed.
+    """
+    url = models.URLField(max_length=2000)
+    url_hash = models.CharField(max_length=64, unique=True)
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    # sha256 of the page body, or of what the spider's page_fingerprint() picks out
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    content_length = models.PositiveIntegerField(default=0)  # Bytes of the last full body
+    checked_at = models.DateTimeField(default=timezone.now)
+    changed_at = models.DateTimeField(default=timezone.now)
+    unchanged_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.url
+
+    @staticmethod
+    def hash_url(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+class IngestMetric(models.Model):
+    """
+    One ingest metric total, summed over every finished crawl
+
+    Histogram buckets, sums and counts are stored per stage (``le`` is the
+    bucket bound), counters and gauges with an empty stage. Written by
+    crawler/metrics.py and rendered at /crawler/metrics/.
+    """
+    name = models.CharField(max_length=100)
+    stage = models.CharField(max_length=50, blank=True, default='')
+    le = models.CharField(max_length=20, blank=True, default='')
+    value = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'stage', 'le'], name='unique_ingest_metric'),
+        ]
+
+    def __str__(self):
+        return f'{self.name}{{stage={self.stage},le={self.le}}} {self.value}'
@@ -0,0 +1,290 @@
+"""
+Near-duplicate story detection at ingest
+
+``content_hash`` only catches exact repeats of title + url. The same wire
+story republished by several outlets, or the same link with a tracking
+parameter, gets a different hash and floods the feeds with copies.
+
+Each new Article gets a 64-bit SimHash of its normalized title and summary.
+Texts that share most of their words get signatures a few bits apart. The
+signature is split into four 16-bit bands, stored as indexed columns. Two
+signatures within 3 bits of each other must agree exactly on at least one
+band, so candidates are found with indexed equality lookups on the bands
+instead of a scan. Only those candidates are compared bit by bit.
+
+A near-duplicate is stored with ``duplicate_of`` pointing at the first
+copy and left out of the listings (NEAR_DUPLICATE_ACTION = 'mark'), or not
+stored at all ('drop'). Only articles from the last
+NEAR_DUPLICATE_WINDOW_DAYS are candidates. That keeps the buckets, and the
+per-item cost, bounded by recent volume rather than by table size.
+"""
+import hashlib
+import logging
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from newsapp.models import Article
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_BITS = 64
+BANDS = 4
+BAND_BITS = SIGNATURE_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+ACTION_MARK = 'mark'
+ACTION_DROP = 'drop'
+
+# Distances above BANDS - 1 are no longer guaranteed to share a band
+DEFAULT_MAX_DISTANCE = 3
+DEFAULT_WINDOW_DAYS = 7
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# SimHash sums feature weights per signature bit. Each bit of a feature hash
+# is widened to its own 32-bit field of one integer, so a single big-integer
+# multiply-add updates all 64 per-bit sums at once.
+_FIELD_BITS = 32
+_FIELD_MASK = (1 << _FIELD_BITS) - 1
+_BYTE_FIELDS = [sum(1 << (bit * _FIELD_BITS) for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+# Google News titles end with " - Publisher"
+_PUBLISHER_SUFFIX_RE = re.compile(r'\s+[-–—]\s+[^-–—|]{1,60}$')
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were will with'.split()
+)
+
+
+def normalize_text(title, summary=''):
+    """Lowercase word tokens of title and summary, without accents, stopwords or publisher suffix"""
+    title = _PUBLISHER_SUFFIX_RE.sub('', title or '')
+    text = unicodedata.normalize('NFKD', f'{title} {summary or ""}'.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+@lru_cache(maxsize=65536)
+def _feature_fields(feature):
+    """The feature's hash with every bit widened to a 32-bit field"""
+    value = _feature_hash(feature)
+    fields = 0
+    for byte in range(SIGNATURE_BITS // 8):
+        fields |= _BYTE_FIELDS[value >> (byte * 8) & 0xFF] << (byte * 8 * _FIELD_BITS)
+    return fields
+
+
+def simhash(title, summary=''):
+    """
+    64-bit SimHash over the words and word pairs of a story
+
+    Returns:
+        int or None: Unsigned signature, or None if the text has no words
+    """
+    tokens = normalize_text(title, summary)
+    if not tokens:
+        return None
+
+    features = Counter(tokens)
+    features.update(f'{first} {second}' for first, second in zip(tokens, tokens[1:]))
+
+    # Per bit: total weight of the features with that bit set
+    set_weights = 0
+    total = 0
+    for feature, weight in features.items():
+        set_weights += _feature_fields(feature) * weight
+        total += weight
+
+    # A bit is set when its features outweigh the others
+    signature = 0
+    for bit in range(SIGNATURE_BITS):
+        if 2 * (set_weights >> (bit * _FIELD_BITS) & _FIELD_MASK) > total:
+            signature |= 1 << bit
+    return signature
+
+
+def to_signed(signature):
+    """Map an unsigned 64-bit signature onto the signed range of a BigIntegerField"""
+    return signature - (1 << SIGNATURE_BITS) if signature >= 1 << (SIGNATURE_BITS - 1) else signature
+
+
+def to_unsigned(value):
+    return value + (1 << SIGNATURE_BITS) if value < 0 else value
+
+
+def bands(signature):
+    """Split an unsigned signature into BANDS integers of BAND_BITS each"""
+    return tuple((signature >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS))
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def assign_signature(article):
+    """Set the simhash and band columns of an unsaved Article"""
+    signature = simhash(article.title, article.summary)
+    if signature is None:
+        article.simhash = None
+        for band in range(BANDS):
+            setattr(article, f'band{band}', None)
+        return None
+
+    article.simhash = to_signed(signature)
+    for band, value in enumerate(bands(signature)):
+        setattr(article, f'band{band}', value)
+    return signature
+
+
+class BandIndex:
+    """In-memory LSH buckets: (band number, band value) -> [(signature, value)]"""
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.buckets = defaultdict(list)
+
+    def add(self, signature, value):
+        for band, band_value in enumerate(bands(signature)):
+            self.buckets[(band, band_value)].append((signature, value))
+
+    def find(self, signature):
+        """Return the value stored with the nearest signature within max_distance, or None"""
+        best = None
+        for band, band_value in enumerate(bands(signature)):
+            for candidate, value in self.buckets.get((band, band_value), ()):
+                distance = hamming_distance(signature, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, value)
+        return best[1] if best else None
+
+
+def get_action():
+    return getattr(settings, 'NEAR_DUPLICATE_ACTION', ACTION_MARK)
+
+
+def enabled():
+    return getattr(settings, 'NEAR_DUPLICATE_ENABLED', True)
+
+
+def candidate_rows(signatures, window_days=None):
+    """
+    One indexed query for every stored article sharing a band with any of
+    the signatures. Returns (signature, canonical id) pairs.
+    """
+    condition = Q()
+    for band in range(BANDS):
+        values = {bands(signature)[band] for signature in signatures}
+        condition |= Q(**{f'band{band}__in': values})
+
+    queryset = Article.objects.filter(condition)
+    if window_days is None:
+        window_days = getattr(settings, 'NEAR_DUPLICATE_WINDOW_DAYS', DEFAULT_WINDOW_DAYS)
+    if window_days:
+        queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(days=window_days))
+
+    # Point copies at the story's first article, not at another copy
+    return [(to_unsigned(value), duplicate_of_id or pk)
+            for pk, value, duplicate_of_id in queryset.values_list('id', 'simhash', 'duplicate_of_id')]
+
+
+def screen(articles, counters=None, window_days=None):
+    """
+    Check a batch of unsaved Articles for near-duplicates
+
+    Articles matching a stored article get ``duplicate_of_id`` set. Articles
+    matching an earlier article of the same batch cannot reference it until
+    it has been saved, so they are returned separately.
+
+    Args:
+        articles (list): Unsaved Article instances
+        counters (Counter, optional): Incremented 'checked', 'stored_matches',
+            'batch_matches' and 'dropped'
+        window_days (int, optional): Override NEAR_DUPLICATE_WINDOW_DAYS
+
+    Returns:
+        tuple: (articles to insert now, [(article, canonical article)] to
+        insert after their canonical article); near-duplicates are left out
+        of both when NEAR_DUPLICATE_ACTION is 'drop'
+    """
+    if not articles or not enabled():
+        return list(articles), []
+
+    counters = counters if counters is not None else Counter()
+    max_distance = getattr(settings, 'NEAR_DUPLICATE_MAX_DISTANCE', DEFAULT_MAX_DISTANCE)
+    drop = get_action() == ACTION_DROP
+
+    signatures = {}
+    for article in articles:
+        signature = assign_signature(article)
+        if signature is not None:
+            signatures[id(article)] = signature
+
+    stored = BandIndex(max_distance)
+    if signatures:
+        for signature, canonical_id in candidate_rows(set(signatures.values()), window_days):
+            stored.add(signature, canonical_id)
+
+    batch = BandIndex(max_distance)
+    keep, deferred = [], []
+    for article in articles:
+        signature = signatures.get(id(article))
+        if signature is None:
+            keep.append(article)
+            continue
+        counters['checked'] += 1
+
+        canonical_id = stored.find(signature)
+        if canonical_id is not None:
+            counters['stored_matches'] += 1
+            if drop:
+                counters['dropped'] += 1
+                continue
+            article.duplicate_of_id = canonical_id
+            keep.append(article)
+            continue
+
+        canonical = batch.find(signature)
+        if canonical is not None:
+            counters['batch_matches'] += 1
+            if drop:
+                counters['dropped'] += 1
+                continue
+            deferred.append((article, canonical))
+            continue
+
+        batch.add(signature, article)
+        keep.append(article)
+
+    return keep, deferred
+
+
+def link_deferred(deferred):
+    """
+    Point deferred copies at their canonical articles once those are saved
+
+    Returns:
+        list: The copies, ready to insert
+    """
+    hashes = {canonical.content_hash for _, canonical in deferred}
+    ids = dict(Article.objects.filter(content_hash__in=hashes).values_list('content_hash', 'id'))
+    copies = []
+    for article, canonical in deferred:
+        article.duplicate_of_id = ids.get(canonical.content_hash)
+        copies.append(article)
+    return copies
+
+
+def report_stats(stats, counters, prefix='near_duplicates'):
+    """Copy near-duplicate counters into Scrapy crawl stats"""
+    for key in ('checked', 'stored_matches', 'batch_matches', 'dropped'):
+        stats.set_value(f'{prefix}/{key}', counters[key])
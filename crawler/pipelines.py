@@ -5,8 +5,15 @@ import hashlib
 import django
 import os
 import sys
+import time
 import logging
-from django.db import transaction
+from collections import Counter
+from django.conf import settings as django_settings
+from django.db import connections, transaction
+from django.db.models import Max
+from twisted.internet.defer import DeferredSemaphore, maybeDeferred
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -17,54 +24,321 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'newsfusion.settings')
 django.setup()
 
 from newsapp.models import NewsArticle, NewsSource, Article
+from newsapp import postings
+from newsapp.page_cache import bump_on_commit
+from . import dedup, metrics, neardup
 
-class NewsfusionPipeline:
+# Defaults for the buffered insert mode, overridable with the
+# PIPELINE_BATCH_SIZE and PIPELINE_BATCH_INTERVAL settings
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_BATCH_INTERVAL = 5.0
+# Writes queued or running on the writer thread before items are held back
+# (PIPELINE_WRITE_QUEUE_SIZE)
+DEFAULT_WRITE_QUEUE_SIZE = 4
+# Crawl stat counting failed writes; incremental crawls keep their old page
+# validators when it is set, so the pages are fetched and written again
+WRITE_ERRORS_STAT = 'pipeline/write_errors'
+
+
+def take_write_lock(model):
+    """
+    Make the current SQLite transaction take the write lock now
+
+    With SQLITE_CONCURRENT_MODE transactions begin IMMEDIATE and already hold
+    it. Otherwise they begin DEFERRED and only lock at their first write, so
+    an UPDATE matching no rows stands in for one.
+    """
+    connection = transaction.get_connection()
+    if connection.vendor != 'sqlite' or connection.settings_dict['OPTIONS'].get('transaction_mode') == 'IMMEDIATE':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {connection.ops.quote_name(model._meta.db_table)} SET id = id WHERE 0')
+
+
+class BatchInsertMixin:
+    """
+    Buffers model instances and writes them with one bulk_create per batch.
+
+    A batch is flushed when it holds ``batch_size`` items, when its oldest
+    item has waited ``batch_interval`` seconds, or when the spider closes.
+    A batch size of 1 or less keeps the per-item insert path.
+
+    All database work runs on one writer thread per pipeline, in order, so
+    a slow SQLite write never blocks the reactor and the downloads in
+    flight. At most PIPELINE_WRITE_QUEUE_SIZE writes are queued or running.
+    When the queue is full, process_item returns a Deferred that fires once
+    its write is done; Scrapy counts the held items against the scraper's
+    backlog and stops starting downloads until they clear.
+    PIPELINE_ASYNC_WRITES = False writes on the reactor thread instead.
+    """
+    model = None
+    # Screen new rows for near-duplicate stories (Article only)
+    near_duplicates = False
+    # Write inverted index postings for new rows (Article only)
+    index_terms = False
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, batch_interval=DEFAULT_BATCH_INTERVAL,
+                 async_writes=True, queue_size=DEFAULT_WRITE_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.async_writes = async_writes
+        self.queue_size = max(1, queue_size)
+        self.writer = None
+        self.write_slots = None
+        self.buffer = []
+        self.buffer_started = None
+        self.new_articles_count = 0
+        self.dedup_counters = Counter()
+        self.neardup_counters = Counter()
+        # Crawl stats to record stage timings in, None when metrics are off
+        self.timing = None
+        self.stats = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # Scrapy settings win, then the Django settings
+        settings = crawler.settings
+
+        def setting(name, default):
+            return getattr(django_settings, name, default)
+
+        pipeline = cls(
+            batch_size=settings.getint('PIPELINE_BATCH_SIZE', setting('PIPELINE_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+            batch_interval=settings.getfloat('PIPELINE_BATCH_INTERVAL',
+                                             setting('PIPELINE_BATCH_INTERVAL', DEFAULT_BATCH_INTERVAL)),
+            async_writes=settings.getbool('PIPELINE_ASYNC_WRITES', setting('PIPELINE_ASYNC_WRITES', True)),
+            queue_size=settings.getint('PIPELINE_WRITE_QUEUE_SIZE',
+                                       setting('PIPELINE_WRITE_QUEUE_SIZE', DEFAULT_WRITE_QUEUE_SIZE)),
+        )
+        pipeline.timing = metrics.timing_stats(crawler)
+        pipeline.stats = crawler.stats
+        return pipeline
+
+    @property
+    def batching(self):
+        return self.batch_size > 1
+
+    def buffer_instance(self, instance, spider, item=None):
+        """
+        Add an unsaved instance to the buffer, submitting it when full or old
+
+        Returns:
+            The item, or a Deferred firing with it if the write queue is full
+        """
+        if not self.buffer:
+            self.buffer_started = time.monotonic()
+        self.buffer.append(instance)
+
+        if len(self.buffer) >= self.batch_size or \
+                time.monotonic() - self.buffer_started >= self.batch_interval:
+            batch, self.buffer = self.buffer, []
+            return self.enqueue_write(item, self.write_batch, batch, spider)
+        return item
+
+    def open_spider(self, spider):
+        if self.async_writes:
+            self.writer = ThreadPool(minthreads=1, maxthreads=1, name=f'{type(self).__name__}-writer')
+            self.writer.start()
+            self.write_slots = DeferredSemaphore(self.queue_size)
+        return self.submit(dedup.refresh_filter, self.model)
+
+    def submit(self, func, *args):
+        """
+        Run database work on the writer thread, after the work submitted before it
+
+        Returns:
+            Deferred: Fires with the result of ``func``
+        """
+        if self.writer is None:
+            return maybeDeferred(func, *args)
+        from twisted.internet import reactor
+        return self.write_slots.run(deferToThreadPool, reactor, self.writer, func, *args)
+
+    def enqueue_write(self, item, func, *args):
+        """Submit a write, holding the item back until it is done if the queue is full"""
+        full = self.write_slots is not None and self.write_slots.tokens == 0
+        d = self.submit(func, *args)
+        d.addErrback(self.write_failed)
+        if full:
+            return d.addCallback(lambda _: item)
+        return item
+
+    def write_failed(self, failure):
+        logger.error(f"Error writing articles: {failure.getErrorMessage()}")
+        self.count_write_error()
+
+    def count_write_error(self):
+        if self.stats is not None:
+            self.stats.inc_value(WRITE_ERRORS_STAT)
+
+    def close_spider(self, spider):
+        """Write the buffered instances after the queued writes, then report"""
+        batch, self.buffer = self.buffer, []
+        d = self.submit(self.finish_writes, batch, spider)
+        d.addErrback(self.write_failed)
+        d.addBoth(self.stop_writer)
+        return d
+
+    def finish_writes(self, batch, spider):
+        self.write_batch(batch, spider)
+        self.report_stats(spider)
+        if self.writer is not None:
+            # The writer thread's own connection
+            connections.close_all()
+
+    def stop_writer(self, result):
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+        return result
+
+    def write_batch(self, batch, spider):
+        """
+        Write a batch of instances in a single transaction:
+        - One query for hashes the dedup filter cannot rule out
+        - One query for near-duplicate candidates, if enabled for the model
+        - One read of the highest id under the write lock, then one bulk_create
+          for the rest, ignoring unique conflicts on content_hash, and a second
+          one for copies of stories first seen in this batch
+        - One lookup of the rows above that id, so rows a concurrent crawl wrote
+          after the dedup check are not reported (or indexed) as ours
+        - One executemany of their search postings, if enabled for the model
+        """
+        if not batch:
+            return 0
+
+        hashes = {obj.content_hash for obj in batch}
+
+        try:
+            with transaction.atomic():
+                with metrics.timed(self.timing, 'dedup'):
+                    existing = dedup.existing_hashes(self.model, hashes, self.dedup_counters)
+                new_objects = [obj for obj in batch if obj.content_hash not in existing]
+                deferred = []
+                if new_objects and self.near_duplicates:
+                    with metrics.timed(self.timing, 'neardup'):
+                        new_objects, deferred = neardup.screen(new_objects, self.neardup_counters)
+                if not new_objects:
+                    return 0
+
+                with metrics.timed(self.timing, 'db_write'):
+                    # Ids only grow (AUTOINCREMENT), and the transaction holds the write
+                    # lock from here on, so rows above this id are the ones we insert
+                    take_write_lock(self.model)
+                    last_id = self.model.objects.aggregate(last=Max('id'))['last'] or 0
+                    self.model.objects.bulk_create(new_objects, ignore_conflicts=True)
+                    if deferred:
+                        copies = neardup.link_deferred(deferred)
+                        self.model.objects.bulk_create(copies, ignore_conflicts=True)
+                        new_objects.extend(copies)
+                    new_hashes = {obj.content_hash for obj in new_objects}
+                    stored_ids = dict(self.model.objects.filter(content_hash__in=new_hashes, id__gt=last_id)
+                                      .values_list('content_hash', 'id'))
+                    inserted = len(stored_ids)
+                if self.index_terms and postings.enabled():
+                    # bulk_create with ignore_conflicts does not set primary keys;
+                    # rows another crawl stored were indexed by that crawl
+                    ours = [obj for obj in new_objects if obj.content_hash in stored_ids]
+                    for obj in ours:
+                        obj.pk = stored_ids[obj.content_hash]
+                    with metrics.timed(self.timing, 'postings'):
+                        postings.index_articles(ours)
+                dedup.record_insert(self.model, *new_hashes)
+                # Invalidate cached listing pages once the batch is committed
+                bump_on_commit()
+        except Exception as e:
+            logger.error(f"Error saving batch of {len(batch)} articles: {str(e)}")
+            self.count_write_error()
+            return 0
+
+        self.count_new(spider, inserted)
+        logger.info(f"Saved batch of {inserted} new articles ({len(batch) - inserted} duplicates)")
+        return inserted
+
+    def count_new(self, spider, count):
+        """Add to the new row count, keeping it current in the crawl stats for progress reports"""
+        self.new_articles_count += count
+        if hasattr(spider, 'crawler') and hasattr(spider.crawler, 'stats'):
+            spider.crawler.stats.set_value('new_articles_count', self.new_articles_count)
+
+    def report_stats(self, spider):
+        dedup.save_filter(self.model)
+        if hasattr(spider, 'crawler') and hasattr(spider.crawler, 'stats'):
+            spider.crawler.stats.set_value('new_articles_count', self.new_articles_count)
+            dedup.report_stats(spider.crawler.stats, self.dedup_counters)
+            if self.near_duplicates:
+                neardup.report_stats(spider.crawler.stats, self.neardup_counters)
+
+
+class NewsfusionPipeline(BatchInsertMixin):
     """
     Pipeline for processing news articles
     """
+    model = NewsArticle
+
     def process_item(self, item, spider):
         """
         Process each news article:
         - Check for duplicates using content hash
-        - Save to database
+        - Save to database, or buffer it when batching is enabled
         """
         # Create hash from headline + summary to check for duplicates
         content = (item['headline'] + item['summary']).encode('utf-8')
         content_hash = hashlib.sha256(content).hexdigest()
         
+        # Get the source
+        source = spider.get_source(item['source_url'])
+        if not source:
+            return item
+
+        article = NewsArticle(
+            source=source,
+            headline=item['headline'],
+            summary=item['summary'],
+            url=item['url'],
+            content_hash=content_hash
+        )
+        article.fill_list_fields()
+
+        if self.batching:
+            return self.buffer_instance(article, spider, item)
+        return self.enqueue_write(item, self.write_article, article, spider)
+
+    def write_article(self, article, spider):
+        """Per-item insert path, run on the writer thread"""
         # Check if article already exists
-        if not NewsArticle.objects.filter(content_hash=content_hash).exists():
-            # Get the source
-            source = spider.get_source(item['source_url'])
-            if source:
-                # Save to database
-                NewsArticle.objects.create(
-                    source=source,
-                    headline=item['headline'],
-                    summary=item['summary'],
-                    url=item['url'],
-                    content_hash=content_hash
-                )
-        
-        return item
+        with metrics.timed(self.timing, 'dedup'):
+            duplicate = dedup.is_duplicate(NewsArticle, article.content_hash, self.dedup_counters)
+        if not duplicate:
+            # Save to database
+            with metrics.timed(self.timing, 'db_write'):
+                article.save()
+            dedup.record_insert(NewsArticle, article.content_hash)
+            bump_on_commit()
+            self.count_new(spider, 1)
 
-class GoogleNewsPipeline:
+class GoogleNewsPipeline(BatchInsertMixin):
     """
     Pipeline for processing Google News articles
     """
-    def __init__(self):
-        self.new_articles_count = 0
+    model = Article
+    near_duplicates = True
+    index_terms = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self.items_seen = set()
     
     def open_spider(self, spider):
         """Called when the spider is opened"""
         logger.info(f"Google News spider started with keyword: {spider.keyword or 'trending'}")
+        return super().open_spider(spider)
     
     def process_item(self, item, spider):
         """
         Process each Google News article:
         - Check for duplicates using content hash
-        - Save to database
+        - Save to database, or buffer it when batching is enabled
         """
         try:
             # Check if item has required fields
@@ -86,35 +360,58 @@ class GoogleNewsPipeline:
                 return item
                 
             self.items_seen.add(content_hash)
-            
+
+            article = Article(
+                title=item['title'],
+                summary=item.get('summary', ''),
+                url=item['url'],
+                source=item.get('source', 'Unknown'),
+                published_time=item.get('published_time', ''),
+                # Stored as normalize_keyword() spells it, so exports can match it exactly
+                keyword=' '.join((item.get('keyword') or '').split()),
+                content_hash=content_hash
+            )
+            article.fill_list_fields()
+
+            if self.batching:
+                return self.buffer_instance(article, spider, item)
+            return self.enqueue_write(item, self.write_article, article, spider)
+        except Exception as e:
+            logger.error(f"Error saving article: {str(e)}")
+                
+        return item
+
+    def write_article(self, article, spider):
+        """Per-item insert path, run on the writer thread"""
+        try:
             # Use a transaction to avoid race conditions
             with transaction.atomic():
                 # Skip if article already exists in database
-                if Article.objects.filter(content_hash=content_hash).exists():
-                    logger.debug(f"Article already exists in database: {item['title']}")
-                    return item
+                with metrics.timed(self.timing, 'dedup'):
+                    duplicate = dedup.is_duplicate(Article, article.content_hash, self.dedup_counters)
+                if duplicate:
+                    logger.debug(f"Article already exists in database: {article.title}")
+                    return
+
+                # Mark (or drop) another outlet's copy of a stored story
+                with metrics.timed(self.timing, 'neardup'):
+                    kept = neardup.screen([article], self.neardup_counters)[0]
+                if not kept:
+                    logger.debug(f"Dropped near-duplicate article: {article.title}")
+                    return
                     
                 # Create new article
-                Article.objects.create(
-                    title=item['title'],
-                    summary=item.get('summary', ''),
-                    url=item['url'],
-                    source=item.get('source', 'Unknown'),
-                    published_time=item.get('published_time', ''),
-                    keyword=item.get('keyword', ''),
-                    content_hash=content_hash
-                )
-                self.new_articles_count += 1
-                logger.info(f"Saved article #{self.new_articles_count}: {item['title']}")
+                # Its search postings are written by the post_save handler
+                with metrics.timed(self.timing, 'db_write'):
+                    article.save()
+                dedup.record_insert(Article, article.content_hash)
+                bump_on_commit()
+                self.count_new(spider, 1)
+                logger.info(f"Saved article #{self.new_articles_count}: {article.title}")
         except Exception as e:
             logger.error(f"Error saving article: {str(e)}")
-                
-        return item
-        
-    def close_spider(self, spider):
-        """
-        Called when spider finishes
-        """
+            self.count_write_error()
+
+    def finish_writes(self, batch, spider):
+        super().finish_writes(batch, spider)
         logger.info(f"Google News spider closed, added {self.new_articles_count} new articles to the database")
-        if hasattr(spider, 'crawler') and hasattr(spider.crawler, 'stats'):
-            spider.crawler.stats.set_value('new_articles_count', self.new_articles_count) 
\ No newline at end of file
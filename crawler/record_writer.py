@@ -0,0 +1,47 @@
+"""
+Thread for the CrawlJob bookkeeping writes made on a reactor
+
+Progress reports, lease renewals and status updates would otherwise run on
+the reactor thread. With SQLITE_CONCURRENT_MODE they wait for the write
+lock behind the pipelines' IMMEDIATE transactions, and every spider on the
+reactor stalls with them. defer_write() runs them on one thread per
+process instead, in the order they were submitted.
+"""
+import threading
+from functools import partial
+
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class _WriterPool(ThreadPool):
+    # The web process's reactor thread is a daemon that never shuts the pool
+    # down, so its thread must not keep the process alive either
+    threadFactory = partial(threading.Thread, daemon=True)
+
+
+def _writer_pool():
+    global _pool
+    from twisted.internet import reactor
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = _WriterPool(minthreads=1, maxthreads=1, name='crawl-job-writer')
+            _pool.start()
+            reactor.addSystemEventTrigger('during', 'shutdown', _pool.stop)
+        return _pool
+
+
+def defer_write(func, *args, **kwargs):
+    """
+    Call ``func(*args, **kwargs)`` on the bookkeeping thread
+
+    Returns:
+        Deferred: Fires on the reactor with the call's result
+    """
+    from twisted.internet import reactor
+
+    return deferToThreadPool(reactor, _writer_pool(), func, *args, **kwargs)
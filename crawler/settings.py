@@ -54,9 +54,14 @@ RETRY_ENABLED = True
 RETRY_TIMES = 3
 RETRY_HTTP_CODES = [500, 502, 503, 504, 400, 403, 404, 408]
 
-# Cache settings
-HTTPCACHE_ENABLED = True
-HTTPCACHE_EXPIRATION_SECS = 3600  # 1 hour
+# Incremental crawling: conditional requests for start pages, and no parsing
+# when they have not changed. Replaces the expiring HTTP cache, which served
+# stale copies for an hour and then refetched everything.
+HTTPCACHE_ENABLED = False
+INCREMENTAL_CRAWL_ENABLED = True
+DOWNLOADER_MIDDLEWARES = {
+    'crawler.middlewares.ConditionalRequestMiddleware': 580,
+}
 
 # Default headers
 DEFAULT_REQUEST_HEADERS = {
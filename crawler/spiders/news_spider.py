@@ -1,6 +1,4 @@
 import scrapy
-import hashlib
-import datetime
 import django
 import os
 import sys
@@ -10,12 +8,26 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'newsfusion.settings')
 django.setup()
 
-from newsapp.models import NewsArticle, NewsSource
+from newsapp.models import NewsSource
+from crawler.items import NewsItem
 
 
 class NewsSpider(scrapy.Spider):
     name = 'news'
-    
+
+    # Articles are yielded as items; NewsfusionPipeline writes them off the reactor thread
+    custom_settings = {
+        'ITEM_PIPELINES': {
+            'crawler.pipelines.NewsfusionPipeline': 300,
+        },
+        'EXTENSIONS': {
+            'crawler.extensions.IngestMetrics': 510,
+        },
+        'DOWNLOADER_MIDDLEWARES': {
+            'crawler.middlewares.ConditionalRequestMiddleware': 580,
+        },
+    }
+
     def __init__(self, *args, keyword=None, source_id=None, **kwargs):
         super(NewsSpider, self).__init__(*args, **kwargs)
         self.keyword = keyword  # For keyword-based search
@@ -41,8 +53,6 @@ class NewsSpider(scrapy.Spider):
             self.logger.info(f"No parser for {response.url}")
             
     def parse_toi(self, response):
-        source = self.get_source(response.url)
-        
         # Times of India article selectors
         articles = response.css('div.card-container')
         
@@ -51,28 +61,11 @@ class NewsSpider(scrapy.Spider):
             url = article.css('h2 a::attr(href)').get()
             summary = article.css('p.card-txt::text').get() or headline
             
-            # Apply keyword filter if specified
-            if self.keyword and self.keyword.lower() not in headline.lower() and self.keyword.lower() not in summary.lower():
-                continue
-                
-            # Create content hash
-            content = (headline + summary).encode('utf-8')
-            content_hash = hashlib.sha256(content).hexdigest()
-            
-            # Check if article already exists
-            if not NewsArticle.objects.filter(content_hash=content_hash).exists():
-                # Save to database
-                NewsArticle.objects.create(
-                    source=source,
-                    headline=headline,
-                    summary=summary,
-                    url=url,
-                    content_hash=content_hash
-                )
+            item = self.build_item(response, headline, summary, url)
+            if item:
+                yield item
     
     def parse_hindu(self, response):
-        source = self.get_source(response.url)
-        
         # The Hindu article selectors
         articles = response.css('div.story-card')
         
@@ -82,24 +75,25 @@ class NewsSpider(scrapy.Spider):
             # Adjust based on actual HTML structure
             summary = article.css('p.intro::text').get() or headline
             
-            # Apply keyword filter if specified
-            if self.keyword and self.keyword.lower() not in headline.lower() and self.keyword.lower() not in summary.lower():
-                continue
-                
-            # Create content hash
-            content = (headline + summary).encode('utf-8')
-            content_hash = hashlib.sha256(content).hexdigest()
+            item = self.build_item(response, headline, summary, url)
+            if item:
+                yield item
+
+    def build_item(self, response, headline, summary, url):
+        """Return a NewsItem, or None if the card has no headline or misses the keyword"""
+        if not headline or not url:
+            return None
             
-            # Check if article already exists
-            if not NewsArticle.objects.filter(content_hash=content_hash).exists():
-                # Save to database
-                NewsArticle.objects.create(
-                    source=source,
-                    headline=headline,
-                    summary=summary,
-                    url=url,
-                    content_hash=content_hash
-                )
+        # Apply keyword filter if specified
+        if self.keyword and self.keyword.lower() not in headline.lower() and self.keyword.lower() not in summary.lower():
+            return None
+
+        return NewsItem(
+            headline=headline,
+            summary=summary,
+            url=response.urljoin(url),
+            source_url=response.url,
+        )
     
     def get_source(self, url):
         for base_url, source in self.source_map.items():
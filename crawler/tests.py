@@ -1,3 +1,503 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+
+from newsapp import postings
+from newsapp.archive import archive_batch, retention_cutoff
+from newsapp.models import Article, ArticleTerm, NewsArticle, NewsSource
+
+from . import dedup, freshness, job_queue, neardup
+from .dedup import ContentHashFilter
+from .extensions import CrawlJobProgress
+from .management.commands.generate_corpus import SYNTHETIC_URL
+from .models import CrawlJob
+from .pipelines import GoogleNewsPipeline
+
+HEADLINES = [
+    'Monsoon arrives early in Kerala as heavy rain lashes coastal districts',
+    'Parliament passes the finance bill after a long debate',
+    'Sensex closes at a record high on strong bank earnings',
+    'ISRO schedules the next lunar mission launch for December',
+    'Supreme Court hears petitions on electoral bonds',
+    'Railways add summer special trains on busy northern routes',
+    'India beat Australia by six wickets in the final over',
+]
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_article(title, summary='', **fields):
+    return Article.objects.create(title=title, summary=summary, source='Example',
+                                  url=f'https://example.com/{content_hash(title)[:12]}', **fields)
+
+
+class ContentHashFilterTests(TestCase):
+
+    def setUp(self):
+        self.stored = [make_article(f'Stored story {index}').content_hash for index in range(20)]
+
+    def build(self, path=None):
+        return ContentHashFilter(Article, path=path, min_capacity=1000).load_or_build()
+
+    def test_stored_hashes_are_possibly_present(self):
+        hash_filter = self.build()
+        new = {content_hash(f'new story {index}') for index in range(20)}
+        definitely_new, maybe = hash_filter.partition(set(self.stored) | new)
+        # No false negatives; false positives only at the error rate
+        self.assertTrue(set(self.stored) <= maybe)
+        self.assertTrue(definitely_new <= new)
+        self.assertGreater(len(definitely_new), 15)
+
+    def test_add_and_refresh(self):
+        hash_filter = self.build()
+        added = content_hash('added by this process')
+        hash_filter.add(added)
+        self.assertTrue(hash_filter.might_contain(added))
+
+        later = make_article('Inserted by another process')
+        self.assertFalse(hash_filter.might_contain(later.content_hash))
+        hash_filter.refresh()
+        self.assertTrue(hash_filter.might_contain(later.content_hash))
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'articles.bloom')
+            self.build(path).save()
+            later = make_article('Inserted after the snapshot')
+
+            loaded = self.build(path)
+            self.assertTrue(all(loaded.might_contain(value) for value in self.stored))
+            # Loading catches up on rows newer than the snapshot
+            self.assertTrue(loaded.might_contain(later.content_hash))
+
+    def test_snapshot_of_another_database_is_rebuilt(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'articles.bloom')
+            self.build(path).save()
+            # A recreated database numbers its rows from 1 again, below the snapshot's max_pk
+            Article.objects.all().delete()
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [Article._meta.db_table])
+            fresh = make_article('First story in the new database')
+
+            loaded = self.build(path)
+            self.assertTrue(loaded.might_contain(fresh.content_hash))
+            self.assertEqual(loaded.max_pk, fresh.pk)
+
+    def test_archived_hashes_are_kept(self):
+        old = make_article('Archived story')
+        Article.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        archive_batch(Article, retention_cutoff(180))
+        self.assertTrue(self.build().might_contain(old.content_hash))
+
+
+@override_settings(NEAR_DUPLICATE_ENABLED=True, NEAR_DUPLICATE_ACTION='mark', NEAR_DUPLICATE_MAX_DISTANCE=3)
+class NearDuplicateTests(TestCase):
+
+    TITLE = 'Monsoon arrives early in Kerala as heavy rain lashes coastal districts'
+    SUMMARY = 'The India Meteorological Department said the monsoon set in over Kerala on Friday'
+
+    def unsaved(self, title, summary=SUMMARY):
+        return Article(title=title, summary=summary, source='Example', url='https://example.com/x',
+                       content_hash=content_hash(title))
+
+    def stored(self, title, summary=SUMMARY):
+        article = self.unsaved(title, summary)
+        neardup.assign_signature(article)
+        article.save()
+        return article
+
+    def test_signature_ignores_publisher_suffix(self):
+        self.assertEqual(neardup.simhash(f'{self.TITLE} - NDTV', self.SUMMARY),
+                         neardup.simhash(f'{self.TITLE} - The Hindu', self.SUMMARY))
+
+    def test_copy_of_stored_story_is_marked(self):
+        story = self.stored(f'{self.TITLE} - NDTV')
+        other = self.unsaved('Parliament passes the finance bill after a long debate', 'Opposition walks out')
+        counters = Counter()
+        keep, deferred = neardup.screen([self.unsaved(f'{self.TITLE} - Mint'), other], counters)
+
+        self.assertEqual([article.duplicate_of_id for article in keep], [story.pk, None])
+        self.assertEqual(deferred, [])
+        self.assertEqual(counters['stored_matches'], 1)
+
+    def test_copy_within_batch_is_deferred(self):
+        first = self.unsaved(f'{self.TITLE} - NDTV')
+        second = self.unsaved(f'{self.TITLE} - Mint')
+        keep, deferred = neardup.screen([first, second])
+        self.assertEqual(keep, [first])
+        self.assertEqual(deferred, [(second, first)])
+
+        first.save()
+        copies = neardup.link_deferred(deferred)
+        self.assertEqual(copies[0].duplicate_of_id, first.pk)
+
+    def test_copies_point_at_the_first_story(self):
+        story = self.stored(f'{self.TITLE} - NDTV')
+        copy = self.stored(f'{self.TITLE} - Mint')
+        Article.objects.filter(pk=copy.pk).update(duplicate_of=story)
+        keep, _ = neardup.screen([self.unsaved(f'{self.TITLE} - Scroll')])
+        self.assertEqual(keep[0].duplicate_of_id, story.pk)
+
+    def test_old_stories_are_not_candidates(self):
+        story = self.stored(f'{self.TITLE} - NDTV')
+        Article.objects.filter(pk=story.pk).update(created_at=timezone.now() - timedelta(days=30))
+        keep, _ = neardup.screen([self.unsaved(f'{self.TITLE} - Mint')], window_days=7)
+        self.assertIsNone(keep[0].duplicate_of_id)
+
+    @override_settings(NEAR_DUPLICATE_ACTION='drop')
+    def test_drop_action(self):
+        self.stored(f'{self.TITLE} - NDTV')
+        counters = Counter()
+        keep, deferred = neardup.screen([self.unsaved(f'{self.TITLE} - Mint')], counters)
+        self.assertEqual((keep, deferred), ([], []))
+        self.assertEqual(counters['dropped'], 1)
+
+
+class CrawlJobLeaseTests(TestCase):
+
+    def setUp(self):
+        past = timezone.now() - timedelta(seconds=1)
+        self.service = CrawlJob.objects.create(key='search:budget', status=CrawlJob.RUNNING, lease_expires_at=past,
+                                               worker=job_queue.worker_name(job_queue.SERVICE_LABEL),
+                                               error='Traceback: secret path')
+        self.queued = CrawlJob.objects.create(key='search:cricket', status=CrawlJob.RUNNING, lease_expires_at=past,
+                                              worker='host:1')
+
+    def test_lapsed_lease_is_not_in_progress(self):
+        self.assertTrue(self.service.abandoned)
+        self.assertFalse(self.service.in_progress)
+        CrawlJob.objects.filter(pk=self.service.pk).update(lease_expires_at=timezone.now() + timedelta(minutes=1))
+        self.service.refresh_from_db()
+        self.assertTrue(self.service.in_progress)
+
+    def test_abandoned_service_jobs_fail(self):
+        self.assertEqual(job_queue.fail_abandoned(), 1)
+        self.assertEqual(CrawlJob.objects.get(pk=self.service.pk).status, CrawlJob.FAILED)
+        # Queue jobs are leased again by a worker instead
+        self.assertEqual(CrawlJob.objects.get(pk=self.queued.pk).status, CrawlJob.RUNNING)
+
+    def test_status_hides_worker_and_error_from_the_public(self):
+        data = self.client.get(reverse('crawl_status'), {'keyword': 'budget'}).json()
+        self.assertFalse(data['crawling'])
+        self.assertNotIn('worker', data['job'])
+        self.assertNotIn('error', data['job'])
+        self.assertEqual(self.client.get(reverse('crawl_status')).json()['active'], [])
+
+    def test_staff_see_worker_and_error(self):
+        self.client.force_login(User.objects.create_user('editor', password='x', is_staff=True))
+        job = self.client.get(reverse('crawl_status'), {'keyword': 'budget'}).json()['job']
+        self.assertEqual((job['worker'], job['error']), (self.service.worker, self.service.error))
+
+
+@override_settings(CRAWL_QUEUE_LEASE_TIMEOUT=60, CRAWL_QUEUE_MAX_ATTEMPTS=2, CRAWL_QUEUE_RETRY_DELAY=0)
+class JobQueueTests(TestCase):
+
+    def expire(self, job):
+        CrawlJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_requests_for_a_keyword_coalesce(self):
+        job = job_queue.enqueue('Cricket  World Cup')
+        again = job_queue.enqueue('cricket world cup')
+        self.assertEqual(again.pk, job.pk)
+        self.assertEqual(CrawlJob.objects.get(pk=job.pk).requests, 2)
+
+    def test_one_worker_claims_a_job(self):
+        job = job_queue.enqueue('budget')
+        leased = job_queue.lease('host:1')
+        self.assertEqual(leased.pk, job.pk)
+        self.assertEqual((leased.status, leased.worker, leased.attempts), (CrawlJob.RUNNING, 'host:1', 1))
+        self.assertIsNone(job_queue.lease('host:2'))
+
+        self.assertEqual(job_queue.renew([job.pk], 'host:2'), 0)
+        self.assertEqual(job_queue.renew([job.pk], 'host:1'), 1)
+        self.assertTrue(job_queue.complete(leased, 'host:1'))
+        self.assertEqual(CrawlJob.objects.get(pk=job.pk).status, CrawlJob.COMPLETED)
+
+    def test_expired_lease_is_taken_over(self):
+        job = job_queue.enqueue('budget')
+        first = job_queue.lease('host:1')
+        self.expire(job)
+
+        second = job_queue.lease('host:2')
+        self.assertEqual((second.pk, second.worker, second.attempts), (job.pk, 'host:2', 2))
+        # The first worker lost its lease and cannot finish the job
+        self.assertFalse(job_queue.complete(first, 'host:1'))
+
+    def test_expired_last_attempt_fails(self):
+        job = job_queue.enqueue('budget')
+        job_queue.lease('host:1')
+        self.expire(job)
+        job_queue.lease('host:2')
+        self.expire(job)
+
+        self.assertIsNone(job_queue.lease('host:3'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, CrawlJob.FAILED)
+        self.assertIsNone(job.lease_expires_at)
+
+    def test_failed_attempt_is_retried_then_fails(self):
+        job = job_queue.enqueue('budget')
+        self.assertTrue(job_queue.fail(job_queue.lease('host:1'), 'host:1', 'timeout'))
+        self.assertFalse(job_queue.fail(job_queue.lease('host:1'), 'host:1', 'timeout'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (CrawlJob.FAILED, 2, 'timeout'))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   CRAWL_BACKEND='queue', CRAWL_FRESHNESS_TTL=900)
+class QueueFreshnessTests(TestCase):
+    """A web process's own cache never hears from the crawl_worker processes"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_crawl_completed_by_a_worker_is_fresh(self):
+        self.assertFalse(freshness.is_fresh('budget'))
+        CrawlJob.objects.create(key='search:budget', status=CrawlJob.COMPLETED, finished_at=timezone.now())
+        self.assertTrue(freshness.is_fresh('budget'))
+        self.assertEqual(freshness.request_refresh('budget'), freshness.FRESH)
+
+    def test_stale_completed_crawl_is_not_fresh(self):
+        CrawlJob.objects.create(key='search:budget', status=CrawlJob.COMPLETED,
+                                finished_at=timezone.now() - timedelta(hours=1))
+        self.assertFalse(freshness.is_fresh('budget'))
+
+    def test_failed_crawl_releases_the_marker(self):
+        self.assertEqual(freshness.request_refresh('budget'), freshness.STARTED)
+        job = CrawlJob.objects.get(key='search:budget')
+        self.assertEqual(freshness.request_refresh('budget'), freshness.REFRESHING)
+
+        # The worker failed the job; its refresh_finished() went to another cache
+        CrawlJob.objects.filter(pk=job.pk).update(status=CrawlJob.FAILED, finished_at=timezone.now())
+        self.assertEqual(freshness.request_refresh('budget'), freshness.STARTED)
+        self.assertEqual(CrawlJob.objects.filter(key='search:budget').count(), 2)
+
+
+class ExportArticlesTests(TestCase):
+
+    def export(self, **options):
+        out, err = StringIO(), StringIO()
+        with mock.patch('sys.stdout', SimpleNamespace(buffer=BytesIO())) as stdout:
+            call_command('export_articles', 'articles', stdout=out, stderr=err, **options)
+        return [json.loads(line)['title'] for line in stdout.buffer.getvalue().decode('utf-8').splitlines()]
+
+    def test_keyword_ignores_stored_whitespace(self):
+        make_article(HEADLINES[0], keyword=' Budget ')
+        make_article(HEADLINES[1], keyword='budget')
+        make_article(HEADLINES[2], keyword='cricket')
+        self.assertEqual(self.export(keyword='BUDGET'), HEADLINES[:2])
+
+
+class GenerateCorpusTests(TestCase):
+
+    def generate(self, *args):
+        call_command('generate_corpus', *args, stdout=StringIO())
+
+    def test_clear_removes_only_generated_rows(self):
+        self.generate('--articles', '400', '--news', '50', '--batch-size', '150', '--near-duplicates', '0.3')
+        generated = Article.objects.filter(url__startswith=SYNTHETIC_URL)
+        self.assertEqual(generated.count(), 400)
+        self.assertTrue(generated.filter(duplicate_of__isnull=False).exists())
+        self.assertTrue(ArticleTerm.objects.filter(article__in=generated).exists())
+
+        real = make_article('A crawled story')
+        copy = make_article('A crawled copy of a generated story', duplicate_of=generated.first())
+
+        self.generate('--clear')
+        self.assertEqual(list(Article.objects.order_by('id').values_list('id', flat=True)), [real.pk, copy.pk])
+        self.assertIsNone(Article.objects.get(pk=copy.pk).duplicate_of_id)
+        self.assertFalse(ArticleTerm.objects.exclude(article__in=[real, copy]).exists())
+        self.assertFalse(NewsArticle.objects.filter(url__startswith=SYNTHETIC_URL).exists())
+        self.assertFalse(NewsSource.objects.filter(url__startswith=SYNTHETIC_URL).exists())
+
+    def test_same_seed_same_corpus(self):
+        self.generate('--articles', '50', '--seed', '7')
+        first = list(Article.objects.order_by('id').values_list('title', flat=True))
+        self.generate('--clear', '--articles', '50', '--seed', '7')
+        self.assertEqual(list(Article.objects.order_by('id').values_list('title', flat=True)), first)
+
+
+def pipeline_item(title):
+    return {'title': title, 'url': f'https://example.com/{content_hash(title)[:12]}',
+            'summary': f'{title} today', 'source': 'Example', 'keyword': 'news'}
+
+
+def expected_postings():
+    """Postings of all HEADLINES, as written for pipeline_item()"""
+    return sum(len(postings.tokenize(title, f'{title} today', 'news')) for title in HEADLINES)
+
+
+class PipelineCrawler:
+    """The parts of a Scrapy crawler the pipelines read"""
+
+    def __init__(self, **settings):
+        self.settings = Settings(settings)
+        self.stats = MemoryStatsCollector(self)
+
+
+@override_settings(DEDUP_FILTER_DIR=None, PIPELINE_BATCH_SIZE=3, PIPELINE_BATCH_INTERVAL=60)
+class PipelineTests(TestCase):
+
+    def setUp(self):
+        # The process-wide filters would remember rows from other tests
+        dedup._filters.clear()
+
+    def open(self, **settings):
+        crawler = PipelineCrawler(PIPELINE_ASYNC_WRITES=False, **settings)
+        pipeline = GoogleNewsPipeline.from_crawler(crawler)
+        spider = SimpleNamespace(keyword='news', crawler=crawler)
+        pipeline.open_spider(spider)
+        return pipeline, spider
+
+    def test_batch_size_from_django_settings(self):
+        pipeline, _ = self.open()
+        self.assertEqual(pipeline.batch_size, 3)
+        # A Scrapy setting wins over the Django one
+        pipeline, _ = self.open(PIPELINE_BATCH_SIZE=5)
+        self.assertEqual(pipeline.batch_size, 5)
+
+    def test_batches_flush_when_full_and_on_close(self):
+        pipeline, spider = self.open()
+        for title in HEADLINES:
+            pipeline.process_item(pipeline_item(title), spider)
+        # Two full batches of three are written, the seventh item waits
+        self.assertEqual(Article.objects.count(), 6)
+        self.assertEqual(pipeline.new_articles_count, 6)
+
+        pipeline.close_spider(spider)
+        self.assertEqual(Article.objects.count(), 7)
+        self.assertEqual(pipeline.new_articles_count, 7)
+        self.assertEqual(spider.crawler.stats.get_value('new_articles_count'), 7)
+        self.assertEqual(ArticleTerm.objects.count(), expected_postings())
+
+    def test_stored_articles_are_not_counted(self):
+        make_article(HEADLINES[0])
+        pipeline, spider = self.open()
+        for title in HEADLINES:
+            pipeline.process_item(pipeline_item(title), spider)
+        pipeline.close_spider(spider)
+        self.assertEqual(Article.objects.count(), 7)
+        self.assertEqual(pipeline.new_articles_count, 6)
+
+    def test_deferred_transactions_lock_before_reading_the_last_id(self):
+        options = {name: value for name, value in connection.settings_dict['OPTIONS'].items()
+                   if name != 'transaction_mode'}
+        pipeline, spider = self.open()
+        with mock.patch.dict(connection.settings_dict, OPTIONS=options), \
+                CaptureQueriesContext(connection) as queries:
+            for title in HEADLINES[:3]:
+                pipeline.process_item(pipeline_item(title), spider)
+        statements = [query['sql'] for query in queries]
+        lock = next(index for index, sql in enumerate(statements) if sql.endswith('WHERE 0'))
+        self.assertIn('MAX', statements[lock + 1])
+        self.assertEqual(pipeline.new_articles_count, 3)
+
+    def test_keywords_are_stored_trimmed(self):
+        pipeline, spider = self.open(PIPELINE_BATCH_SIZE=1)
+        pipeline.process_item(dict(pipeline_item(HEADLINES[0]), keyword='  world   cup '), spider)
+        self.assertEqual(Article.objects.get().keyword, 'world cup')
+
+    def test_per_item_mode(self):
+        pipeline, spider = self.open(PIPELINE_BATCH_SIZE=1)
+        self.assertFalse(pipeline.batching)
+        for count, title in enumerate(HEADLINES, 1):
+            pipeline.process_item(pipeline_item(title), spider)
+            self.assertEqual(Article.objects.count(), count)
+        pipeline.close_spider(spider)
+        self.assertEqual(pipeline.new_articles_count, 7)
+        self.assertEqual(ArticleTerm.objects.count(), expected_postings())
+
+
+def wait(deferred, timeout=10):
+    """Turn the reactor until a Deferred fired by the writer thread has a result"""
+    from twisted.internet import reactor
+
+    results = []
+    deferred.addBoth(results.append)
+    deadline = time.monotonic() + timeout
+    while not results and time.monotonic() < deadline:
+        reactor.iterate(0.01)
+    if not results:
+        raise AssertionError('Deferred did not fire')
+    return results[0]
+
+
+@override_settings(DEDUP_FILTER_DIR=None, PIPELINE_BATCH_SIZE=3, PIPELINE_BATCH_INTERVAL=60,
+                   PIPELINE_ASYNC_WRITES=True, PIPELINE_WRITE_QUEUE_SIZE=1)
+class AsyncPipelineTests(TransactionTestCase):
+    """The writer thread has its own connection, so rows are committed for real"""
+
+    def setUp(self):
+        dedup._filters.clear()
+        self.crawler = PipelineCrawler()
+        self.pipeline = GoogleNewsPipeline.from_crawler(self.crawler)
+        self.spider = SimpleNamespace(keyword='news', crawler=self.crawler)
+        wait(self.pipeline.open_spider(self.spider))
+
+    def tearDown(self):
+        self.pipeline.stop_writer(None)
+
+    def test_writes_run_on_the_writer_thread(self):
+        self.assertTrue(self.pipeline.async_writes)
+        self.assertIsNotNone(self.pipeline.writer)
+        results = [self.pipeline.process_item(pipeline_item(title), self.spider) for title in HEADLINES]
+        # With one write slot, the item after a full batch waits for that batch
+        self.assertTrue(any(hasattr(result, 'addCallback') for result in results))
+        for result in results:
+            if hasattr(result, 'addCallback'):
+                wait(result)
+
+        wait(self.pipeline.close_spider(self.spider))
+        self.assertIsNone(self.pipeline.writer)
+        self.assertEqual(Article.objects.count(), 7)
+        self.assertEqual(self.pipeline.new_articles_count, 7)
+        self.assertEqual(ArticleTerm.objects.count(), expected_postings())
+
+
+class CrawlJobProgressTests(TransactionTestCase):
+    """Progress rows are written on the record_writer thread, not the reactor's"""
+
+    def test_progress_is_written_off_the_reactor(self):
+        job = CrawlJob.objects.create(key='search:budget')
+        stats = PipelineCrawler().stats
+        extension = CrawlJobProgress(stats, interval=0)
+        threads = set()
+        update_record = extension.update_record
+
+        def record_thread(fields):
+            threads.add(threading.current_thread().name)
+            update_record(fields)
+
+        extension.update_record = record_thread
+        wait(extension.spider_opened(SimpleNamespace(keyword='budget', crawl_job_id=job.pk)))
+        stats.set_value('item_scraped_count', 2)
+        extension.maybe_write()
+        wait(extension.spider_closed(None, 'finished'))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.items_scraped), (CrawlJob.RUNNING, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads, {threading.current_thread().name})
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('status/', views.crawl_status, name='crawl_status'),
+    path('metrics/', views.ingest_metrics, name='ingest_metrics'),
+]
@@ -1,3 +1,45 @@
-from django.shortcuts import render
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+from .models import CrawlJob
+from .metrics import render_prometheus
 
 # Create your views here.
+
+RECENT_JOBS = 20
+
+
+@require_safe
+def crawl_status(request):
+    """
+    Crawl progress as JSON, readable from any worker
+
+    ``?keyword=<text>`` returns the latest job for that search (an empty
+    keyword means trending news). Without it, the queued and running jobs
+    and the most recent finished ones are listed. Worker names and error
+    messages are only shown to staff.
+    """
+    from .google_news_crawler import normalize_keyword
+
+    detail = request.user.is_staff
+    if 'keyword' in request.GET:
+        job = CrawlJob.latest_for(normalize_keyword(request.GET['keyword']))
+        return JsonResponse({
+            'crawling': job is not None and job.in_progress,
+            'job': job.as_dict(detail) if job else None,
+        })
+
+    # Jobs whose lease lapsed were left behind by a process that died
+    active = (CrawlJob.objects.filter(status__in=CrawlJob.ACTIVE_STATUSES)
+              .exclude(lease_expires_at__lt=timezone.now()).order_by('created_at'))
+    recent = CrawlJob.objects.exclude(status__in=CrawlJob.ACTIVE_STATUSES)[:RECENT_JOBS]
+    return JsonResponse({
+        'active': [job.as_dict(detail) for job in active],
+        'recent': [job.as_dict(detail) for job in recent],
+    })
+
+
+@require_safe
+def ingest_metrics(request):
+    """Ingest stage timings and crawl counters in the Prometheus text format"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
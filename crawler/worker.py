@@ -0,0 +1,175 @@
+"""
+Crawl worker process for the database-backed job queue
+
+Each worker process runs its own Twisted reactor and CrawlerRunner. It
+polls the queue every CRAWL_WORKER_POLL_INTERVAL seconds and runs up to
+``concurrency`` leased jobs at a time, renewing their leases while they
+run. On SIGINT/SIGTERM it stops leasing, closes its running spiders and
+puts their jobs back in the queue for another worker. Crawls never share
+a process or a GIL with the web tier.
+"""
+import logging
+import os
+import time
+
+import django
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 2
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+class CrawlWorker:
+    """Leases queued crawl jobs and runs them on this process's reactor"""
+
+    def __init__(self, name, concurrency=DEFAULT_CONCURRENCY, poll_interval=DEFAULT_POLL_INTERVAL,
+                 lease_timeout=None, burst=False, max_jobs=None):
+        from . import job_queue
+
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout or job_queue.lease_timeout()
+        self.burst = burst
+        self.max_jobs = max_jobs
+        self.running = {}
+        self.jobs_done = 0
+        self.stopping = False
+        self.stop_requested = False
+        self.runner = None
+        self.poller = None
+        self.renewer = None
+
+    def run(self):
+        """Run until stopped by a signal, or until the queue is empty in burst mode"""
+        from twisted.internet import reactor, task
+        from scrapy.crawler import CrawlerRunner
+        from scrapy.utils.log import configure_logging
+        from .google_news_crawler import crawl_settings
+
+        configure_logging()
+        self.runner = CrawlerRunner(crawl_settings())
+        self.poller = task.LoopingCall(self.poll)
+        self.poller.start(self.poll_interval)
+        self.renewer = task.LoopingCall(self.renew_leases)
+        self.renewer.start(max(1.0, self.lease_timeout / 3), now=False)
+        reactor.addSystemEventTrigger('before', 'shutdown', self.shutdown)
+        logger.info(f"Crawl worker {self.name} started (concurrency {self.concurrency})")
+        reactor.run()
+        logger.info(f"Crawl worker {self.name} stopped after {self.jobs_done} jobs")
+
+    def poll(self):
+        from django.db import close_old_connections
+        from . import job_queue
+
+        if self.stopping:
+            return
+        # Long-lived process: drop connections the database has timed out
+        close_old_connections()
+        while len(self.running) < self.concurrency and not self.limit_reached():
+            try:
+                job = job_queue.lease(self.name, self.lease_timeout)
+            except Exception as e:
+                logger.error(f"Could not lease a crawl job: {str(e)}")
+                return
+            if job is None:
+                break
+            self.start_job(job)
+
+        if self.burst and not self.running:
+            self.stop()
+
+    def limit_reached(self):
+        return self.max_jobs is not None and self.jobs_done + len(self.running) >= self.max_jobs
+
+    def start_job(self, job):
+        from .spiders.google_news_spider import GoogleNewsSpider
+
+        logger.info(f"Worker {self.name} running crawl job {job.pk} for '{job.key}' (attempt {job.attempts})")
+        self.running[job.pk] = job
+        crawler = self.runner.create_crawler(GoogleNewsSpider)
+        deferred = self.runner.crawl(crawler, keyword=job.keyword, crawl_job_id=job.pk)
+        deferred.addCallbacks(self.on_success, self.on_failure,
+                              callbackArgs=(job, crawler), errbackArgs=(job,))
+        deferred.addBoth(self.on_finished, job)
+
+    def on_success(self, _, job, crawler):
+        from . import job_queue
+        from .freshness import refresh_finished
+
+        reason = crawler.stats.get_value('finish_reason') if crawler.stats else None
+        if self.stopping and reason != 'finished':
+            # Interrupted by our own shutdown: let another worker run it
+            job_queue.release(job, self.name)
+            return
+        if reason in (None, 'finished'):
+            if job_queue.complete(job, self.name):
+                refresh_finished(job.key, True)
+        elif not job_queue.fail(job, self.name, f'Spider closed: {reason}'):
+            refresh_finished(job.key, False)
+
+    def on_failure(self, failure, job):
+        from . import job_queue
+        from .freshness import refresh_finished
+
+        if not job_queue.fail(job, self.name, failure.getErrorMessage()):
+            refresh_finished(job.key, False)
+
+    def on_finished(self, result, job):
+        self.running.pop(job.pk, None)
+        self.jobs_done += 1
+        if self.max_jobs is not None and self.jobs_done >= self.max_jobs:
+            self.stop()
+        elif not self.stopping:
+            self.poll()
+
+    def renew_leases(self):
+        from .record_writer import defer_write
+
+        if self.running:
+            # Off the reactor, which would otherwise wait for the write lock
+            return defer_write(self.write_leases, list(self.running))
+
+    def write_leases(self, job_ids):
+        from . import job_queue
+
+        try:
+            held = job_queue.renew(job_ids, self.name, self.lease_timeout)
+            if held < len(job_ids):
+                logger.warning(f"Worker {self.name} lost {len(job_ids) - held} crawl job leases")
+        except Exception as e:
+            logger.error(f"Could not renew crawl job leases: {str(e)}")
+
+    def stop(self):
+        from twisted.internet import reactor
+
+        if not self.stop_requested:
+            self.stop_requested = True
+            reactor.callLater(0, reactor.stop)
+
+    def shutdown(self):
+        """Reactor shutdown trigger: stop leasing and close running spiders"""
+        self.stopping = True
+        for loop in (self.poller, self.renewer):
+            if loop is not None and loop.running:
+                loop.stop()
+        # The reactor waits for this deferred, i.e. for the spiders to close
+        return self.runner.stop()
+
+
+def run_worker_process(index, options):
+    """
+    Entry point of a crawl_worker child process
+
+    Args:
+        index (int): Process number, part of the worker name
+        options (dict): concurrency, poll_interval, lease_timeout, burst, max_jobs
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'newsfusion.settings')
+    django.setup()
+    from .job_queue import worker_name
+
+    # Stagger start-up so the processes do not all poll at the same moment
+    time.sleep(options.get('poll_interval', DEFAULT_POLL_INTERVAL) * (index % 10) / 10)
+    CrawlWorker(worker_name(f'w{index}'), **options).run()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import NewsSource, NewsArticle, Article
+from .models import NewsSource, NewsArticle, Article, ArchivedArticle
 
 @admin.register(NewsSource)
 class NewsSourceAdmin(admin.ModelAdmin):
@@ -21,3 +21,10 @@ class ArticleAdmin(admin.ModelAdmin):
     search_fields = ('title', 'summary', 'keyword')
     readonly_fields = ('content_hash',)
     date_hierarchy = 'created_at'
+
+@admin.register(ArchivedArticle)
+class ArchivedArticleAdmin(admin.ModelAdmin):
+    list_display = ('original_id', 'kind', 'month', 'created_at', 'archived_at')
+    list_filter = ('kind', 'month')
+    search_fields = ('content_hash',)
+    readonly_fields = ('kind', 'original_id', 'content_hash', 'created_at', 'month', 'archived_at')
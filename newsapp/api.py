@@ -0,0 +1,188 @@
+"""
+Read-only JSON API over Article and NewsArticle
+
+Every endpoint answers conditional requests. The ETag is built from the
+newest row's timestamp and id (one seek on the (timestamp, id) index), the
+row count and the ingest generation (newsapp/page_cache.py); Last-Modified
+is the newest timestamp. A client polling an unchanged listing gets a 304
+before any article row is read or serialized.
+
+Listings use the same keyset cursors as the HTML pages, and ``?fields=``
+limits both the JSON and the columns loaded.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition, require_safe
+
+from .models import Article, NewsArticle
+from .page_cache import get_ingest_generation
+from .pagination import paginate
+from .search import matching
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+RESOURCES = {
+    'articles': {
+        'model': Article,
+        'timestamp': 'created_at',
+        'fields': ['id', 'title', 'summary', 'url', 'source', 'published_time', 'keyword', 'created_at'],
+    },
+    'news': {
+        'model': NewsArticle,
+        'timestamp': 'published_date',
+        'fields': ['id', 'headline', 'summary', 'url', 'source', 'published_date'],
+    },
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def base_queryset(resource):
+    spec = RESOURCES[resource]
+    queryset = spec['model'].objects.all()
+    if spec['model'] is Article:
+        # Near-duplicate copies are not listed, as on the HTML pages
+        queryset = queryset.filter(duplicate_of__isnull=True)
+    return queryset
+
+
+def latest_change(request, resource, pk=None):
+    """
+    (timestamp, id, count) of the rows behind a response, looked up once per request
+
+    Inserts change the newest row. Archiving and deletes change the count,
+    even when they remove older rows. Edits and near-duplicate relinks change
+    neither and are covered by the ingest generation in the ETag instead.
+    """
+    cache_attr = f'_api_latest_{resource}_{pk}'
+    if not hasattr(request, cache_attr):
+        spec = RESOURCES[resource]
+        queryset = spec['model'].objects.all()
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        # One seek on the (timestamp, id) index, newest end
+        latest = queryset.order_by(f"-{spec['timestamp']}", '-id').values_list(spec['timestamp'], 'id').first()
+        setattr(request, cache_attr, (*(latest or (None, None)), queryset.count()))
+    return getattr(request, cache_attr)
+
+
+def api_etag(request, resource, pk=None):
+    timestamp, latest_pk, count = latest_change(request, resource, pk)
+    # The representation also depends on the query string (fields, cursor, q)
+    stamp = (f'{resource}|{timestamp.isoformat() if timestamp else ""}|{latest_pk}|{count}|'
+             f'{get_ingest_generation()}|{request.get_full_path()}')
+    return quote_etag(hashlib.md5(stamp.encode('utf-8')).hexdigest())
+
+
+def api_last_modified(request, resource, pk=None):
+    return latest_change(request, resource, pk)[0]
+
+
+def requested_fields(request, resource):
+    """
+    Parse ``?fields=a,b`` against the resource's fields
+
+    Raises:
+        BadRequest: If a field is unknown
+    """
+    allowed = RESOURCES[resource]['fields']
+    value = request.GET.get('fields')
+    if not value:
+        return allowed
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return fields
+
+
+def requested_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def project(queryset, resource, fields):
+    """Load only the requested columns, plus those the cursor needs"""
+    spec = RESOURCES[resource]
+    columns = set(fields) | {'id', spec['timestamp']}
+    if 'source' in fields and spec['model'] is NewsArticle:
+        return queryset.select_related('source').only(*(columns - {'source'}), 'source__name')
+    return queryset.only(*columns)
+
+
+def serialize(obj, fields):
+    data = {}
+    for field in fields:
+        value = getattr(obj, field)
+        if isinstance(obj, NewsArticle) and field == 'source':
+            value = value.name
+        data[field] = value
+    return data
+
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def page_response(request, queryset, resource):
+    try:
+        fields = requested_fields(request, resource)
+        limit = requested_limit(request)
+    except BadRequest as e:
+        return error_response(str(e))
+
+    page = paginate(project(queryset, resource, fields), cursor=request.GET.get('cursor'),
+                    page_size=limit, field=RESOURCES[resource]['timestamp'])
+
+    next_url = None
+    if page.next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    return JsonResponse({
+        'results': [serialize(obj, fields) for obj in page.items],
+        'next_cursor': page.next_cursor,
+        'next': next_url,
+    })
+
+
+@require_safe
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def resource_list(request, resource):
+    """Newest first listing: ?fields=, ?limit=, ?cursor="""
+    return page_response(request, base_queryset(resource), resource)
+
+
+@require_safe
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def resource_search(request, resource):
+    """Full-text search, newest first: ?q= plus the listing parameters"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return error_response('Missing q parameter')
+    queryset = matching(RESOURCES[resource]['model'], query, base_queryset(resource))
+    return page_response(request, queryset, resource)
+
+
+@require_safe
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def resource_detail(request, resource, pk):
+    """One article: ?fields="""
+    try:
+        fields = requested_fields(request, resource)
+    except BadRequest as e:
+        return error_response(str(e))
+
+    obj = project(RESOURCES[resource]['model'].objects.filter(pk=pk), resource, fields).first()
+    if obj is None:
+        return error_response('Not found', status=404)
+    return JsonResponse(serialize(obj, fields))
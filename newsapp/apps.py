@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class NewsappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'newsapp'
+
+    def ready(self):
+        from . import page_cache, postings
+
+        post_save.connect(postings.article_saved, sender=self.get_model('Article'),
+                          dispatch_uid='newsapp.postings.article_saved')
+        # No post_delete handler: it would stop bulk deletes (archiving) from running as one query
+        for model_name in ('Article', 'NewsArticle'):
+            post_save.connect(page_cache.article_changed, sender=self.get_model(model_name),
+                              dispatch_uid=f'newsapp.page_cache.article_changed.{model_name}')
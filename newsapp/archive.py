@@ -0,0 +1,161 @@
+"""
+Retention: moving old articles into a compressed archive table
+
+Rows older than ARTICLE_RETENTION_DAYS are copied into ArchivedArticle and
+deleted from the live table in the same transaction. The fields are kept
+as zlib-compressed JSON. Each batch is one short transaction, so a run
+over millions of rows never holds the write lock for long, and crawls keep
+ingesting between batches. The listings and searches then work on a table
+bounded by the retention window rather than by the site's age.
+
+A story that other outlets' copies still point at (``duplicate_of``) stays
+live until the last of those copies is old enough to go too. Archiving it
+earlier would detach the live copies and show them as separate stories.
+
+Archived rows stay reachable. Their content hashes are still checked at
+ingest (crawler/dedup.py), so the stories are not stored again.
+``get_archived()`` rebuilds an article from its old id for the detail page.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Article, ArchivedArticle, NewsArticle
+
+DEFAULT_RETENTION_DAYS = 180
+DEFAULT_BATCH_SIZE = 500
+COMPRESSION_LEVEL = 6
+
+# Archive kind and age column per archived model
+ARCHIVED_MODELS = {
+    Article: {'kind': ArchivedArticle.KIND_ARTICLE, 'timestamp': 'created_at'},
+    NewsArticle: {'kind': ArchivedArticle.KIND_NEWS, 'timestamp': 'published_date'},
+}
+
+
+def retention_days():
+    """Days rows stay in the live tables; None keeps everything"""
+    return getattr(settings, 'ARTICLE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+
+
+def retention_cutoff(days=None):
+    days = retention_days() if days is None else days
+    return timezone.now() - timedelta(days=days)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        # Full precision: DjangoJSONEncoder would cut microseconds
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def pack(row):
+    """Compressed JSON of a row's field values"""
+    raw = json.dumps(row, default=_json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return raw, zlib.compress(raw, COMPRESSION_LEVEL)
+
+
+def unpack(payload):
+    return json.loads(zlib.decompress(bytes(payload)).decode('utf-8'))
+
+
+def archivable(model, cutoff):
+    """Rows older than ``cutoff`` that can be archived now"""
+    timestamp = ARCHIVED_MODELS[model]['timestamp']
+    queryset = model.objects.filter(**{f'{timestamp}__lt': cutoff})
+    if model is Article:
+        # Along the (duplicate_of, created_at, id) index
+        live_copies = Article.objects.filter(duplicate_of=OuterRef('pk'), created_at__gte=cutoff)
+        queryset = queryset.exclude(Exists(live_copies))
+    return queryset
+
+
+def archive_batch(model, cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Move up to ``batch_size`` of the oldest rows older than ``cutoff`` into the archive
+
+    Returns:
+        tuple: (rows archived, JSON bytes, compressed bytes); no rows means done
+    """
+    spec = ARCHIVED_MODELS[model]
+    timestamp = spec['timestamp']
+    columns = [field.attname for field in model._meta.concrete_fields]
+    with transaction.atomic():
+        # Oldest first, along the (timestamp, id) index
+        rows = list(archivable(model, cutoff).order_by(timestamp, 'id').values(*columns)[:batch_size])
+        if not rows:
+            return 0, 0, 0
+
+        archived = []
+        raw_bytes = packed_bytes = 0
+        for row in rows:
+            raw, payload = pack(row)
+            raw_bytes += len(raw)
+            packed_bytes += len(payload)
+            archived.append(ArchivedArticle(
+                kind=spec['kind'], original_id=row['id'], content_hash=row['content_hash'],
+                created_at=row[timestamp], month=row[timestamp].strftime('%Y-%m'), payload=payload,
+            ))
+        # A row whose story is already archived under the same hash is only deleted
+        ArchivedArticle.objects.bulk_create(archived, ignore_conflicts=True)
+        # Through the ORM, so copies of an archived story left in the table are detached
+        model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+    return len(rows), raw_bytes, packed_bytes
+
+
+def archived_hashes(model, hashes):
+    """The subset of ``hashes`` stored in the archive for a model"""
+    spec = ARCHIVED_MODELS.get(model)
+    if spec is None or not hashes:
+        return set()
+    return set(ArchivedArticle.objects.filter(kind=spec['kind'], content_hash__in=list(hashes))
+               .values_list('content_hash', flat=True))
+
+
+def iter_archived_hashes(model, chunk_size=5000):
+    spec = ARCHIVED_MODELS.get(model)
+    if spec is None:
+        return iter(())
+    return (ArchivedArticle.objects.filter(kind=spec['kind']).order_by()
+            .values_list('content_hash', flat=True).iterator(chunk_size=chunk_size))
+
+
+def archived_count(model):
+    spec = ARCHIVED_MODELS.get(model)
+    return ArchivedArticle.objects.filter(kind=spec['kind']).count() if spec else 0
+
+
+def get_archived(model, pk):
+    """
+    Rebuild an archived row as an unsaved model instance, or None
+
+    The instance has ``archived_at`` set. Relations are not loaded: an
+    archived Article's near-duplicate links may point at deleted rows.
+    """
+    spec = ARCHIVED_MODELS.get(model)
+    if spec is None:
+        return None
+    entry = ArchivedArticle.objects.filter(kind=spec['kind'], original_id=pk).first()
+    if entry is None:
+        return None
+
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    values = {}
+    for name, value in unpack(entry.payload).items():
+        # Fields dropped from the model since the row was archived are skipped
+        field = fields.get(name)
+        if field is None:
+            continue
+        if isinstance(field, models.DateTimeField) and value:
+            value = parse_datetime(value)
+        values[name] = value
+    instance = model(**values)
+    instance.archived_at = entry.archived_at
+    return instance
@@ -0,0 +1,81 @@
+import logging
+
+from django.db import migrations
+from django.db.utils import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# The FTS5 tables as this migration creates them; newsapp/search.py keeps
+# the current definition, and later changes get migrations of their own
+INDEXES = {
+    'Article': ('newsapp_article_fts', ['title', 'summary', 'keyword']),
+    'NewsArticle': ('newsapp_newsarticle_fts', ['headline', 'summary']),
+}
+
+
+def fts_supported(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.newsfusion_fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.newsfusion_fts5_probe')
+            return True
+        except DatabaseError:
+            return False
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if not fts_supported(connection):
+        logger.warning('SQLite FTS5 is not available, search will fall back to table scans')
+        return
+    for model_name, (table, columns) in INDEXES.items():
+        content = apps.get_model('newsapp', model_name)._meta.db_table
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f"coalesce(new.{name}, '')" for name in columns)
+        old_values = ', '.join(f"coalesce(old.{name}, '')" for name in columns)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"{column_list}, content='{content}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {content} BEGIN "
+                f"INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {content} BEGIN "
+                f"INSERT INTO {table}({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {content} BEGIN "
+                f"INSERT INTO {table}({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            )
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, _ in INDEXES.values():
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0003_auto_20250419_2031'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0004_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['created_at', 'id'], name='newsapp_art_created_dde0f9_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_signatures(apps, schema_editor):
+    # Existing rows get signatures so new copies of them are caught; they
+    # are not compared with each other here
+    from crawler.neardup import assign_signature
+
+    Article = apps.get_model('newsapp', 'Article')
+    batch = []
+    for article in Article.objects.only('id', 'title', 'summary').iterator(chunk_size=1000):
+        assign_signature(article)
+        batch.append(article)
+        if len(batch) >= 1000:
+            Article.objects.bulk_update(batch, ['simhash', 'band0', 'band1', 'band2', 'band3'])
+            batch = []
+    if batch:
+        Article.objects.bulk_update(batch, ['simhash', 'band0', 'band1', 'band2', 'band3'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0005_article_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='band0',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='band1',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='band2',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='band3',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='newsapp.article'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='simhash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['band0', 'created_at'], name='newsapp_art_band0_3e91b3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['band1', 'created_at'], name='newsapp_art_band1_ee865f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['band2', 'created_at'], name='newsapp_art_band2_f0225a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['band3', 'created_at'], name='newsapp_art_band3_f907c7_idx'),
+        ),
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
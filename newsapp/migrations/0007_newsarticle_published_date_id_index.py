@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0006_article_near_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsarticle',
+            index=models.Index(fields=['published_date', 'id'], name='newsapp_new_publish_de80b1_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0007_newsarticle_published_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['duplicate_of', 'created_at', 'id'], name='newsapp_art_duplica_35c7e3_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:14
+
+from django.db import migrations, models
+
+
+def backfill_list_fields(apps, schema_editor):
+    # Same values as fill_list_fields(); historical models don't have methods
+    from newsapp.models import make_snippet, normalize_title
+
+    for model_name, fields in (('Article', ['normalized_title', 'snippet']), ('NewsArticle', ['snippet'])):
+        model = apps.get_model('newsapp', model_name)
+        columns = ['id', 'summary'] + (['title', 'source'] if model_name == 'Article' else [])
+        batch = []
+        for row in model.objects.only(*columns).iterator(chunk_size=1000):
+            if model_name == 'Article':
+                row.normalized_title = normalize_title(row.title, row.source)
+            row.snippet = make_snippet(row.summary)
+            batch.append(row)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0008_article_canonical_listing_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='normalized_title',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='snippet',
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name='newsarticle',
+            name='snippet',
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+        migrations.RunPython(backfill_list_fields, migrations.RunPython.noop),
+    ]
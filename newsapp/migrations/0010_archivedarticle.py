@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0009_list_projection_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('article', 'Article'), ('news', 'News article')], max_length=10)),
+                ('original_id', models.BigIntegerField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField()),
+                ('month', models.CharField(max_length=7)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('payload', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'month'], name='newsapp_arc_kind_e9a967_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'original_id'), name='archivedarticle_unique_original'), models.UniqueConstraint(fields=('kind', 'content_hash'), name='archivedarticle_unique_hash')],
+            },
+        ),
+    ]
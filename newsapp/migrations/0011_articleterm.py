@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:18
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the tokenizer in newsapp/postings.py as of this migration;
+# importing that module would load the current models
+MAX_TERM_LENGTH = 64
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were will with'.split()
+)
+
+
+def tokenize(*texts):
+    text = unicodedata.normalize('NFKD', ' '.join(text for text in texts if text).lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return {term[:MAX_TERM_LENGTH] for term in TERM_RE.findall(text) if term not in STOPWORDS}
+
+
+def index_existing_articles(apps, schema_editor):
+    Article = apps.get_model('newsapp', 'Article')
+    table = apps.get_model('newsapp', 'ArticleTerm')._meta.db_table
+    connection = schema_editor.connection
+    last_id = 0
+    while True:
+        batch = list(Article.objects.filter(id__gt=last_id).order_by('id')
+                     .only('id', 'title', 'summary', 'keyword', 'created_at')[:2000])
+        if not batch:
+            break
+        rows = [(term, article.id, connection.ops.adapt_datetimefield_value(article.created_at))
+                for article in batch for term in tokenize(article.title, article.summary, article.keyword)]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} (term, article_id, created_at) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING',
+                rows,
+            )
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0010_archivedarticle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField()),
+                ('article', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='newsapp.article')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['article', 'term'], name='newsapp_art_article_f90c02_idx')],
+                'constraints': [models.UniqueConstraint(fields=('term', 'created_at', 'article'), name='articleterm_unique_posting')],
+            },
+        ),
+        migrations.RunPython(index_existing_articles, migrations.RunPython.noop),
+    ]
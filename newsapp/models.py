@@ -1,8 +1,32 @@
 from django.db import models
+from django.utils.text import Truncator
 import hashlib
+import re
 
 # Create your models here.
 
+# Characters of summary the list pages show (the old truncatechars:150)
+SNIPPET_LENGTH = 150
+TITLE_SUFFIX_DASHES = ('-', '–', '—')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def make_snippet(summary):
+    """Summary shortened exactly as ``truncatechars:SNIPPET_LENGTH`` would"""
+    return Truncator(summary or '').chars(SNIPPET_LENGTH)
+
+
+def normalize_title(title, source=''):
+    """Title with whitespace collapsed and its " - Publisher" suffix removed"""
+    title = _SPACE_RE.sub(' ', title or '').strip()
+    # Google News appends the publisher, which list pages already show
+    for dash in TITLE_SUFFIX_DASHES:
+        suffix = f' {dash} {source}'
+        if source and title.endswith(suffix) and len(title) > len(suffix):
+            return title[:-len(suffix)].rstrip()
+    return title
+
+
 class NewsSource(models.Model):
     name = models.CharField(max_length=100)
     url = models.URLField(max_length=255)
@@ -19,9 +43,18 @@ class NewsArticle(models.Model):
     url = models.URLField(max_length=255)
     published_date = models.DateTimeField(auto_now_add=True)
     content_hash = models.CharField(max_length=64, unique=True)
+    # Precomputed for list pages, so they don't load or truncate the summary
+    snippet = models.CharField(max_length=SNIPPET_LENGTH, blank=True, null=True)
+
+    # Columns the list pages read
+    LIST_FIELDS = ('id', 'headline', 'snippet', 'url', 'published_date', 'source', 'source__name')
     
     class Meta:
         ordering = ['-published_date']
+        indexes = [
+            # Keyset pagination and API freshness checks on (published_date, id)
+            models.Index(fields=['published_date', 'id']),
+        ]
     
     def __str__(self):
         return self.headline
@@ -31,8 +64,13 @@ class NewsArticle(models.Model):
         if not self.content_hash:
             content = (self.headline + self.summary).encode('utf-8')
             self.content_hash = hashlib.sha256(content).hexdigest()
+        self.fill_list_fields()
         super().save(*args, **kwargs)
 
+    def fill_list_fields(self):
+        """Compute the list page columns; bulk_create skips save(), so batch inserts call this"""
+        self.snippet = make_snippet(self.summary)
+
 class Article(models.Model):
     """Model for storing Google News articles"""
     title = models.CharField(max_length=255)
@@ -43,12 +81,38 @@ class Article(models.Model):
     keyword = models.CharField(max_length=100, blank=True, null=True)
     content_hash = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Near-duplicate detection: SimHash of title + summary, and its four
+    # 16-bit bands for candidate lookups (see crawler/neardup.py)
+    simhash = models.BigIntegerField(blank=True, null=True)
+    band0 = models.IntegerField(blank=True, null=True)
+    band1 = models.IntegerField(blank=True, null=True)
+    band2 = models.IntegerField(blank=True, null=True)
+    band3 = models.IntegerField(blank=True, null=True)
+    # First stored copy of the same story, if this article is a near-duplicate
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True,
+                                     related_name='near_duplicates')
+    # Precomputed for list pages, so they don't load or truncate the summary
+    normalized_title = models.CharField(max_length=255, blank=True, null=True)
+    snippet = models.CharField(max_length=SNIPPET_LENGTH, blank=True, null=True)
+
+    # Columns the list pages read
+    LIST_FIELDS = ('id', 'title', 'normalized_title', 'snippet', 'url', 'source', 'published_time', 'created_at')
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['keyword']),
             models.Index(fields=['content_hash']),
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            # Listings skip near-duplicate copies: equality on NULL, then the
+            # keyset order, so SQLite does not sort every canonical row
+            models.Index(fields=['duplicate_of', 'created_at', 'id']),
+            # Near-duplicate candidates: one band value, recent rows only
+            models.Index(fields=['band0', 'created_at']),
+            models.Index(fields=['band1', 'created_at']),
+            models.Index(fields=['band2', 'created_at']),
+            models.Index(fields=['band3', 'created_at']),
         ]
     
     def __str__(self):
@@ -59,4 +123,69 @@ class Article(models.Model):
         if not self.content_hash:
             content = (self.title + self.url).encode('utf-8')
             self.content_hash = hashlib.sha256(content).hexdigest()
+        self.fill_list_fields()
         super().save(*args, **kwargs)
+
+    def fill_list_fields(self):
+        """Compute the list page columns; bulk_create skips save(), so batch inserts call this"""
+        self.normalized_title = normalize_title(self.title, self.source)
+        self.snippet = make_snippet(self.summary)
+
+class ArticleTerm(models.Model):
+    """
+    One posting of the inverted keyword index: a term of an Article's text
+
+    Written at ingest (see newsapp/postings.py), with the article's
+    timestamp copied in so a term's postings can be read newest first.
+    """
+    term = models.CharField(max_length=64)
+    # Indexed together with the term below
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='terms', db_index=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # One posting per term and article; the index also serves term
+            # lookups, prefix ranges and recency order
+            models.UniqueConstraint(fields=['term', 'created_at', 'article'], name='articleterm_unique_posting'),
+        ]
+        indexes = [
+            # "Does this article have the term": one seek, no table lookups;
+            # also finds an article's postings when it is deleted
+            models.Index(fields=['article', 'term']),
+        ]
+
+    def __str__(self):
+        return f'{self.term} -> {self.article_id}'
+
+class ArchivedArticle(models.Model):
+    """
+    An Article or NewsArticle moved out of its table by the retention job
+
+    The row's fields are kept as zlib-compressed JSON (see newsapp/archive.py).
+    The content hash stays indexed so archived stories are not ingested again.
+    """
+    KIND_ARTICLE = 'article'
+    KIND_NEWS = 'news'
+    KIND_CHOICES = [(KIND_ARTICLE, 'Article'), (KIND_NEWS, 'News article')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    original_id = models.BigIntegerField()
+    content_hash = models.CharField(max_length=64)
+    # Timestamp of the original row, and its month (YYYY-MM) as the partition key
+    created_at = models.DateTimeField()
+    month = models.CharField(max_length=7)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    payload = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'original_id'], name='archivedarticle_unique_original'),
+            models.UniqueConstraint(fields=['kind', 'content_hash'], name='archivedarticle_unique_hash'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'month']),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.original_id} ({self.month})'
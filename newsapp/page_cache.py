@@ -0,0 +1,116 @@
+"""
+Rendered-page cache for the article listings, invalidated by ingest
+
+Listing pages only change when a pipeline inserts rows, so they are cached
+whole, keyed by view, query, page cursor and viewer. A global "ingest
+generation" counter in the Django cache is part of every key. The
+pipelines bump it after each committed insert, and so does every save()
+of an article (e.g. an edit in the admin), so every cached page goes
+stale at once without tracking which pages a write affects. Between
+crawls a cache hit costs no queries and no template rendering.
+
+The generation is bumped by whichever process wrote the rows: a crawl
+service thread, a crawl_worker process or a management command. The cache
+backend must therefore be shared between processes. With a per-process
+backend (local memory) the page cache stays off rather than serving pages
+that never go stale.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'ingest:generation'
+DEFAULT_TIMEOUT = 3600
+# The per-process backend warning is logged once
+_warned_local_cache = False
+
+
+def enabled():
+    """Whether listing pages are cached; never with a per-process cache backend"""
+    global _warned_local_cache
+    if not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+        return False
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)):
+        if not _warned_local_cache:
+            logger.warning('PAGE_CACHE_ENABLED is ignored: the default cache is not shared between processes')
+            _warned_local_cache = True
+        return False
+    return True
+
+
+def get_ingest_generation():
+    """Current ingest generation; changes whenever new articles are committed"""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_ingest_generation():
+    """Invalidate every cached page"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, timeout=None)
+
+
+def bump_on_commit():
+    """Bump the generation once the current transaction commits"""
+    transaction.on_commit(bump_ingest_generation)
+
+
+def article_changed(sender, **kwargs):
+    """post_save handler: a row saved outside the pipelines (e.g. edited) changes the pages too"""
+    bump_on_commit()
+
+
+def page_cache_key(request, view_name, key_parts):
+    user = request.user
+    viewer = f'user-{user.pk}' if user.is_authenticated else 'anon'
+    digest = hashlib.md5('\x00'.join(str(part) for part in key_parts).encode('utf-8')).hexdigest()
+    return f'page:{view_name}:{get_ingest_generation()}:{viewer}:{digest}'
+
+
+def cached_response(request, view_name, key_parts, render_response):
+    """
+    Return a cached rendering of a page, or render and cache it
+
+    Args:
+        request: The current request
+        view_name (str): Name of the view, part of the key
+        key_parts (list): Request values the page depends on (keyword, cursor, ...)
+        render_response (callable): Builds the response on a cache miss
+
+    Pages that display or queue flash messages, set cookies or are not 200
+    are never cached, and requests carrying pending messages bypass the cache.
+    """
+    if not enabled() or request.method != 'GET':
+        return render_response()
+
+    # Messages waiting to be shown make the page specific to this request
+    storage = getattr(request, '_messages', None)
+    if 'messages' in request.COOKIES or (storage is not None and storage.added_new):
+        return render_response()
+
+    key = page_cache_key(request, view_name, key_parts)
+    response = cache.get(key)
+    if response is not None:
+        return response
+
+    response = render_response()
+
+    if storage is not None and (storage.used or storage.added_new):
+        return response
+    if response.status_code != 200 or response.cookies or getattr(response, 'streaming', False):
+        return response
+
+    cache.set(key, response, timeout=getattr(settings, 'PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return response
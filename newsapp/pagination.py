@@ -0,0 +1,93 @@
+"""
+Keyset (cursor) pagination for article listings
+
+Pages are ordered by (timestamp, id) descending and each page starts
+strictly after the last row of the previous one, so every page is a
+bounded index range scan whatever its depth. Cursors are opaque tokens
+holding the position of the last row shown.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the next (older) page"""
+
+    def __init__(self, items, next_cursor=None, cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(timestamp, pk):
+    """Encode a (timestamp, id) position as an opaque URL-safe token"""
+    raw = f'{timestamp.isoformat()}|{pk}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor token back into (timestamp, id)
+
+    Raises:
+        InvalidCursor: If the token was not produced by encode_cursor
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        raise InvalidCursor(f'Invalid cursor: {token!r}')
+
+
+def paginate(queryset, cursor=None, page_size=20, field='created_at'):
+    """
+    Return the page of ``queryset`` that follows ``cursor``
+
+    Args:
+        queryset: Unordered or ordered queryset; it is re-ordered by (field, id) descending
+        cursor (str, optional): Token from a previous page's next_cursor. An
+            invalid token is treated as the first page.
+        page_size (int): Rows per page
+        field (str): Timestamp field to order by
+
+    Returns:
+        KeysetPage
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except InvalidCursor:
+            cursor = None
+
+    if position is not None:
+        timestamp, pk = position
+        # (field, id) < (timestamp, pk), written so the field's index bounds the scan
+        queryset = queryset.filter(**{f'{field}__lte': timestamp}).exclude(**{field: timestamp, 'id__gte': pk})
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(rows, next_cursor=next_cursor, cursor=cursor)
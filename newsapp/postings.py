@@ -0,0 +1,190 @@
+"""
+Inverted keyword index over Article, written at ingest
+
+``Article.keyword`` only holds the keyword a crawl was started for. Each
+stored article's title, summary and keyword are split into terms, and one
+ArticleTerm posting (term, article, created_at) is written per distinct
+term. The postings table is indexed on (term, created_at, article).
+
+A search word is answered with range seeks on that index. Words match as
+prefixes, as in the FTS search, so "crick" still finds "cricket". A query
+with several words intersects their postings, and the listings read the
+matches newest first (see ``filter_matching()``). Stopwords are not
+indexed: a query made only of stopwords goes to the FTS index instead.
+
+Articles saved through the ORM (``save()``, ``create()``, the admin) are
+indexed by a ``post_save`` handler, and an edited article is indexed again;
+the postings go with their article through the foreign key's cascade.
+``bulk_create()`` sends no signal, so the pipelines and generate_corpus
+index their batches themselves. Rows written some other way (raw SQL,
+``QuerySet.update()`` of the text, older databases) are added by
+``manage.py rebuild_search_index``.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection as default_connection, connections
+from django.db.models import Exists, OuterRef
+
+from .models import Article, ArticleTerm
+
+MAX_TERM_LENGTH = 64
+# Postings counted per term when choosing how to intersect them
+COUNT_CAP = 20000
+# Rows a listing page reads, for that choice
+LISTING_PAGE_SIZE = 30
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Article fields the postings are built from
+INDEXED_FIELDS = frozenset(['title', 'summary', 'keyword', 'created_at'])
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were will with'.split()
+)
+
+
+def enabled():
+    return getattr(settings, 'SEARCH_POSTINGS_ENABLED', True)
+
+
+def _terms(text):
+    """Lowercase word tokens without accents, as FTS5's unicode61 tokenizer splits them"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [term[:MAX_TERM_LENGTH] for term in _TERM_RE.findall(text) if term not in STOPWORDS]
+
+
+def tokenize(*texts):
+    """Distinct index terms of the given texts"""
+    return set(_terms(' '.join(text for text in texts if text)))
+
+
+def query_terms(text):
+    """Distinct terms of a search query, in order; empty if only stopwords"""
+    return list(dict.fromkeys(_terms(text or '')))
+
+
+def index_articles(articles, connection=default_connection):
+    """
+    Write the postings of stored articles
+
+    Args:
+        articles: Article instances with ``pk`` and ``created_at`` set
+
+    Returns:
+        int: Postings written; existing ones are left alone
+    """
+    ops = connection.ops
+    rows = []
+    for article in articles:
+        if article.pk is None:
+            continue
+        created_at = ops.adapt_datetimefield_value(article.created_at)
+        for term in tokenize(article.title, article.summary, article.keyword):
+            rows.append((term, article.pk, created_at))
+    if not rows:
+        return 0
+
+    # Tens of postings per article: plain executemany, no model instances
+    table = ArticleTerm._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (term, article_id, created_at) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING',
+            rows,
+        )
+    return len(rows)
+
+
+def article_saved(sender, instance, created, update_fields=None, using=None, **kwargs):
+    """post_save handler for Article: write the postings, replacing an edited article's"""
+    if not enabled():
+        return
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    if not created:
+        ArticleTerm.objects.using(using).filter(article_id=instance.pk).delete()
+    index_articles([instance], connections[using])
+
+
+def _prefix_end(prefix):
+    """Smallest string after every string starting with ``prefix``"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def term_postings(term):
+    """Article ids with a term starting with ``term``: one range on the postings index"""
+    return ArticleTerm.objects.filter(term__gte=term, term__lt=_prefix_end(term)).values('article_id')
+
+
+def has_term(term, article=OuterRef('pk')):
+    """Condition: the article has a term starting with ``term`` (one seek on the (article, term) index)"""
+    return Exists(ArticleTerm.objects.filter(article_id=article, term__gte=term, term__lt=_prefix_end(term)))
+
+
+def term_counts(terms, connection=default_connection):
+    """
+    Postings per term, counted up to COUNT_CAP, and the highest article id
+
+    One round trip; each count reads at most COUNT_CAP index entries.
+    """
+    table = ArticleTerm._meta.db_table
+    counts = [f'(SELECT count(*) FROM (SELECT 1 FROM {table} WHERE term >= %s AND term < %s LIMIT %s))'
+              for _ in terms]
+    params = [value for term in terms for value in (term, _prefix_end(term), COUNT_CAP)]
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {", ".join(counts)}, (SELECT max(id) FROM {Article._meta.db_table})', params)
+        row = cursor.fetchone()
+    return dict(zip(terms, row[:-1])), row[-1] or 0
+
+
+def filter_matching(queryset, terms):
+    """
+    Filter an Article queryset down to rows having every term, as prefixes
+
+    Listings read matches newest first, so there are two ways to intersect:
+    walk the newest articles and seek each one's postings, which is fast
+    when matches are common, or start from the rarest term's postings and
+    check the other terms on those articles only, which gives the listing
+    a short ``id IN (...)`` list. The postings counts pick the cheaper one.
+
+    Args:
+        queryset: Article queryset; its ordering is left alone
+        terms (list): Output of ``query_terms()``, not empty
+    """
+    counts, articles = term_counts(terms)
+    # Rarest first, so most rows fail on their first seek
+    terms = sorted(terms, key=counts.get)
+    rarest = terms[0]
+    if not counts[rarest]:
+        return queryset.none()
+
+    # Share of articles expected to match, if the terms were independent
+    share = 1.0
+    for term in terms:
+        share *= min(1.0, counts[term] / max(articles, 1))
+    # Walking reads about a page / share articles; the other plan reads the rarest term's postings
+    if LISTING_PAGE_SIZE / share < counts[rarest]:
+        for term in terms:
+            queryset = queryset.filter(has_term(term))
+        return queryset
+
+    matches = term_postings(rarest)
+    for term in terms[1:]:
+        matches = matches.filter(has_term(term, OuterRef('article_id')))
+    return queryset.filter(id__in=matches)
+
+
+def rebuild(batch_size=2000, connection=default_connection):
+    """Index every stored article again; returns the postings written"""
+    ArticleTerm.objects.all().delete()
+    written = 0
+    last_id = 0
+    columns = ('id', 'title', 'summary', 'keyword', 'created_at')
+    while True:
+        batch = list(Article.objects.filter(id__gt=last_id).order_by('id').only(*columns)[:batch_size])
+        if not batch:
+            return written
+        written += index_articles(batch, connection)
+        last_id = batch[-1].id
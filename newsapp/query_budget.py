@@ -0,0 +1,168 @@
+"""
+Per-request SQL budgets and N+1 detection
+
+QueryBudgetMiddleware records every query a request runs through a
+database execute wrapper, so it works without DEBUG. It keeps the count,
+the total SQL time and how often each statement fingerprint repeats. A
+fingerprint is the SQL with literals and parameter lists collapsed, so
+the same lookup for different rows has one fingerprint. A fingerprint
+seen QUERY_BUDGET_REPEAT_THRESHOLD times in one request is reported as a
+likely N+1. Requests over the budget for their URL name in QUERY_BUDGETS
+(QUERY_BUDGET_DEFAULT otherwise) are logged as warnings.
+
+Tests use ``query_budget()`` to fail when a view's query count regresses:
+
+    with query_budget(view='index'):
+        client.get('/')
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = 10
+DEFAULT_REPEAT_THRESHOLD = 5
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """The statement with literals and parameters replaced, IN lists collapsed"""
+    sql = _LITERAL_RE.sub('?', sql).replace('%s', '?')
+    sql = _LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def get_budget(view_name):
+    """Query budget for a URL name"""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', DEFAULT_BUDGET))
+
+
+def repeat_threshold():
+    return getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more queries than its budget, or repeated a statement"""
+
+
+class QueryRecorder:
+    """Execute wrapper counting queries, SQL time and statement fingerprints"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @contextmanager
+    def record(self):
+        """Record the queries run on every database inside the block"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def repeated(self, threshold):
+        """(fingerprint, times) for statements run at least ``threshold`` times"""
+        return [(sql, times) for sql, times in self.fingerprints.most_common() if times >= threshold]
+
+    def problems(self, budget=None, threshold=None):
+        """Descriptions of the budget being exceeded and of likely N+1 statements"""
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} queries, budget {budget}')
+        if threshold is not None:
+            for sql, times in self.repeated(threshold):
+                problems.append(f'likely N+1, {times}x: {sql[:200]}')
+        return problems
+
+
+@contextmanager
+def query_budget(max_queries=None, view=None, allow_repeats=False):
+    """
+    Fail a test when a block exceeds its query budget or looks like an N+1
+
+    Args:
+        max_queries (int, optional): Most queries allowed; defaults to the
+            QUERY_BUDGETS entry for ``view``
+        view (str, optional): URL name whose configured budget applies
+        allow_repeats (bool): Don't fail on repeated statements
+
+    Raises:
+        QueryBudgetExceeded: An AssertionError, so test runners report a failure
+    """
+    if max_queries is None and view is not None:
+        max_queries = get_budget(view)
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    problems = recorder.problems(max_queries, None if allow_repeats else repeat_threshold())
+    if problems:
+        raise QueryBudgetExceeded(f"Query budget exceeded{f' for {view}' if view else ''}: " + '; '.join(problems))
+
+
+class QueryBudgetMiddleware:
+    """Log requests that exceed their view's query budget or repeat statements"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        self.report(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        # Under ASGI, sync views and their queries run on the request's
+        # thread-sensitive worker thread, which has its own connections:
+        # install the wrappers there
+        recorder = QueryRecorder()
+        recording = ExitStack()
+        await sync_to_async(recording.enter_context)(recorder.record())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+        self.report(request, recorder)
+        return response
+
+    def report(self, request, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match is not None else request.path
+        problems = recorder.problems(get_budget(view_name), repeat_threshold())
+        summary = (f"{request.method} {request.path} ({view_name}): {recorder.count} queries "
+                   f"in {recorder.duration * 1000:.1f} ms")
+        if problems:
+            logger.warning(f"{summary}; " + '; '.join(problems))
+        else:
+            logger.debug(summary)
@@ -0,0 +1,225 @@
+"""
+Full-text search over Article and NewsArticle
+
+Each table has an external-content FTS5 index kept in sync by triggers,
+so every insert path (create, bulk_create, raw SQL) is covered without
+hooks in the pipelines. Searches are ranked with BM25, title weighted
+above summary, and ties go to the newest article. On databases without
+FTS5 the functions fall back to ``icontains`` filters ordered by recency.
+
+``matching()``, behind the listings, first tries the Article postings
+index written at ingest (newsapp/postings.py), then FTS5, then icontains.
+"""
+import logging
+import re
+
+from django.db import connection as default_connection
+from django.db.models import Q, prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.db.utils import DatabaseError
+
+from . import postings
+from .models import Article, NewsArticle
+
+logger = logging.getLogger(__name__)
+
+# Indexed columns per model, with their BM25 weights, and the relations
+# the result templates display (loaded with the results, not per row)
+FTS_INDEXES = {
+    Article: {
+        'table': 'newsapp_article_fts',
+        'columns': [('title', 10.0), ('summary', 5.0), ('keyword', 2.0)],
+        'order_field': 'created_at',
+        'fallback_fields': ['title', 'summary', 'keyword'],
+        'related': [],
+    },
+    NewsArticle: {
+        'table': 'newsapp_newsarticle_fts',
+        'columns': [('headline', 10.0), ('summary', 5.0)],
+        'order_field': 'published_date',
+        'fallback_fields': ['headline', 'summary'],
+        'related': ['source'],
+    },
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = set()
+
+
+def fts_supported(connection=default_connection):
+    """Whether the database is SQLite built with the FTS5 extension"""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Some builds load FTS5 without reporting the compile option
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.newsfusion_fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.newsfusion_fts5_probe')
+            return True
+        except DatabaseError:
+            return False
+
+
+def fts_available(model, connection=default_connection):
+    """Whether the FTS index for a model exists in this database"""
+    table = FTS_INDEXES[model]['table']
+    if table in _available:
+        return True
+    if connection.vendor != 'sqlite':
+        return False
+    if table in connection.introspection.table_names(include_views=False):
+        _available.add(table)
+        return True
+    return False
+
+
+def create_fts_index(model, connection=default_connection):
+    """Create a model's FTS5 table and sync triggers, and index existing rows"""
+    spec = FTS_INDEXES[model]
+    table = spec['table']
+    content = model._meta.db_table
+    columns = [name for name, _ in spec['columns']]
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f"coalesce(new.{name}, '')" for name in columns)
+    old_values = ', '.join(f"coalesce(old.{name}, '')" for name in columns)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"{column_list}, content='{content}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {content} BEGIN "
+            f"INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {content} BEGIN "
+            f"INSERT INTO {table}({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {content} BEGIN "
+            f"INSERT INTO {table}({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+    rebuild_fts_index(model, connection)
+    _available.add(table)
+
+
+def drop_fts_index(model, connection=default_connection):
+    """Drop a model's FTS5 table and triggers"""
+    table = FTS_INDEXES[model]['table']
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    _available.discard(table)
+
+
+def rebuild_fts_index(model, connection=default_connection):
+    """Re-read every row of the content table into the index"""
+    table = FTS_INDEXES[model]['table']
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+
+
+def build_match_query(text):
+    """
+    Turn free text into a safe FTS5 query: every word must match, as a
+    prefix, so "crick" still finds "cricket" as icontains did
+
+    Returns:
+        str or None: MATCH expression, or None if the text has no words
+    """
+    terms = _TERM_RE.findall(text or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(model, text, limit=30):
+    """
+    Return articles matching ``text``, best BM25 match first, newest first on ties
+
+    Args:
+        model: Article or NewsArticle
+        text (str): User search text
+        limit (int, optional): Maximum rows, None for no limit
+    """
+    spec = FTS_INDEXES[model]
+    if not fts_available(model):
+        return list(_fallback_queryset(model, text)[:limit] if limit else _fallback_queryset(model, text))
+
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    table = spec['table']
+    content = model._meta.db_table
+    weights = ', '.join(str(weight) for _, weight in spec['columns'])
+    order_field = spec['order_field']
+    sql = (
+        f"SELECT a.* FROM {table} f JOIN {content} a ON a.id = f.rowid "
+        f"WHERE {table} MATCH %s "
+        f"ORDER BY bm25({table}, {weights}), a.{order_field} DESC, a.id DESC "
+        f"LIMIT %s"
+    )
+    try:
+        rows = list(model.objects.raw(sql, [match, limit if limit else -1]))
+        prefetch_related_objects(rows, *spec['related'])
+        return rows
+    except DatabaseError as e:
+        logger.warning(f"Full-text search failed, falling back to a table scan: {str(e)}")
+        return list(_fallback_queryset(model, text)[:limit] if limit else _fallback_queryset(model, text))
+
+
+def matching(model, text, queryset=None):
+    """
+    Filter a queryset down to rows matching ``text``, leaving its ordering alone
+
+    Article queries go through the postings index (``postings.filter_matching()``).
+    Otherwise the FTS index is used as an ``id IN (...)`` subquery when available.
+    """
+    queryset = queryset if queryset is not None else model.objects.all()
+    if model is Article and postings.enabled():
+        terms = postings.query_terms(text)
+        if terms:
+            return postings.filter_matching(queryset, terms)
+    if not fts_available(model):
+        return queryset.filter(_fallback_filter(model, text))
+
+    match = build_match_query(text)
+    if match is None:
+        return queryset.none()
+    table = FTS_INDEXES[model]['table']
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+    )
+
+
+def search_articles(text, limit=30):
+    """Ranked search over Google News articles"""
+    return search(Article, text, limit)
+
+
+def search_news_articles(text, limit=None):
+    """Ranked search over source-crawled news articles"""
+    return search(NewsArticle, text, limit)
+
+
+def _fallback_filter(model, text):
+    condition = Q()
+    for field in FTS_INDEXES[model]['fallback_fields']:
+        condition |= Q(**{f'{field}__icontains': text})
+    return condition
+
+
+def _fallback_queryset(model, text):
+    spec = FTS_INDEXES[model]
+    return model.objects.filter(_fallback_filter(model, text)).select_related(*spec['related']).order_by(
+        f"-{spec['order_field']}", '-id')
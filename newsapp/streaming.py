@@ -0,0 +1,117 @@
+"""
+Server-sent events for search results that arrive while a crawl is running
+
+The results page opens one EventSource for its keyword. The stream sends
+each newly saved matching Article as an ``article`` event, then ``done``
+once the crawl job for the keyword has finished. The browser no longer
+has to refresh, which used to mean another search and another crawl.
+
+Each poll reads the highest Article id, one step down the primary key,
+and the matching query only runs when it has changed. The crawl may be
+writing from another process (a crawl_worker, another web worker), so
+the database is watched rather than anything held in this process. Serve it from the ASGI application
+(newsfusion/asgi.py): an async view holds no worker thread while it waits.
+A WSGI server would read the whole stream before sending any of it, so
+there the view asks for one pass only: the response ends after the
+articles saved so far, and the browser's EventSource reconnects after the
+retry delay, which makes it a poll.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.urls import reverse
+
+from crawler.google_news_crawler import normalize_keyword
+from crawler.models import CrawlJob
+from .models import Article
+from .search import matching
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_DURATION = 300
+KEEPALIVE_INTERVAL = 15
+BATCH_SIZE = 50
+
+
+def format_event(event, data, event_id=None):
+    """Serialize one server-sent event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def article_payload(article):
+    return {
+        'id': article.id,
+        'title': article.normalized_title or article.title,
+        'summary': article.snippet or '',
+        'url': article.url,
+        'source': article.source,
+        'published_time': article.published_time,
+        'detail_url': reverse('google_news_detail', args=[article.id]),
+    }
+
+
+def fetch_new_articles(keyword, after_id):
+    """Matching articles saved after ``after_id``, oldest first"""
+    articles = matching(Article, keyword).filter(id__gt=after_id, duplicate_of__isnull=True)
+    articles = articles.only(*Article.LIST_FIELDS).order_by('id')[:BATCH_SIZE]
+    return [article_payload(article) for article in articles]
+
+
+def latest_article_id():
+    return Article.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def crawl_finished(keyword):
+    # The crawl may be running in another worker process
+    job = CrawlJob.latest_for(normalize_keyword(keyword))
+    return job is None or not job.in_progress
+
+
+async def article_events(keyword, after_id=0, once=False):
+    """
+    Yield SSE messages for new matching articles until the keyword's crawl ends
+
+    Args:
+        keyword (str): Search keyword
+        after_id (int): Highest article id the client already has
+        once (bool): Stop after the first pass without ``done``, so the
+            client reconnects later (for servers that cannot stream)
+    """
+    poll_interval = getattr(settings, 'SSE_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    deadline = time.monotonic() + getattr(settings, 'SSE_MAX_DURATION', DEFAULT_MAX_DURATION)
+    last_keepalive = time.monotonic()
+    seen_latest = None
+
+    yield 'retry: 5000\n\n'
+    while True:
+        finished = await sync_to_async(crawl_finished)(keyword)
+
+        latest = await sync_to_async(latest_article_id)()
+        if latest != seen_latest or finished:
+            seen_latest = latest
+            while True:
+                payloads = await sync_to_async(fetch_new_articles)(keyword, after_id)
+                for payload in payloads:
+                    after_id = payload['id']
+                    yield format_event('article', payload, event_id=after_id)
+                if len(payloads) < BATCH_SIZE:
+                    break
+
+        if finished or time.monotonic() >= deadline:
+            yield format_event('done', {'last_id': after_id})
+            return
+        if once:
+            return
+
+        if time.monotonic() - last_keepalive >= KEEPALIVE_INTERVAL:
+            last_keepalive = time.monotonic()
+            yield ': keepalive\n\n'
+        await asyncio.sleep(poll_interval)
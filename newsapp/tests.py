@@ -1,3 +1,288 @@
-from django.test import TestCase
+import asyncio
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from crawler import freshness
+from crawler.models import CrawlJob
+
+from . import page_cache, postings
+from .archive import archivable, archive_batch, archived_hashes, get_archived, retention_cutoff
+from .models import Article, ArticleTerm
+from .pagination import decode_cursor, encode_cursor, paginate
+from .query_budget import query_budget
+from .search import matching
+from .streaming import article_events
+
+
+def make_article(title, summary='', keyword=None, age=None, **fields):
+    """Store an Article; ``age`` (a timedelta) backdates its created_at"""
+    article = Article.objects.create(title=title, summary=summary, keyword=keyword,
+                                     url=f'https://example.com/{Article.objects.count()}',
+                                     source='Example', **fields)
+    if age is not None:
+        article.created_at = timezone.now() - age
+        Article.objects.filter(pk=article.pk).update(created_at=article.created_at)
+    return article
+
+
+class PaginateTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.articles = [make_article(f'Story {index}') for index in range(7)]
+        # Two pairs share a timestamp, so the id has to break the tie
+        stamps = [now, now, now - timedelta(minutes=1), now - timedelta(minutes=2),
+                  now - timedelta(minutes=2), now - timedelta(minutes=3), now - timedelta(minutes=4)]
+        for article, stamp in zip(self.articles, stamps):
+            Article.objects.filter(pk=article.pk).update(created_at=stamp)
+
+    def test_cursors_walk_every_row_once_in_order(self):
+        expected = list(Article.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen, cursor = [], None
+        while True:
+            page = paginate(Article.objects.all(), cursor, page_size=3)
+            seen.extend(article.pk for article in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_last_page_has_no_cursor(self):
+        page = paginate(Article.objects.all(), page_size=7)
+        self.assertEqual(len(page), 7)
+        self.assertIsNone(page.next_cursor)
+
+    def test_invalid_cursor_gives_first_page(self):
+        first = paginate(Article.objects.all(), page_size=3)
+        page = paginate(Article.objects.all(), 'not a cursor', page_size=3)
+        self.assertEqual([a.pk for a in page], [a.pk for a in first])
+        self.assertIsNone(page.cursor)
+
+    def test_cursor_round_trip(self):
+        stamp = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(stamp, 42)), (stamp, 42))
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return HttpResponse(f'render {self.renders}')
+
+    def get(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        return page_cache.cached_response(request, 'home', [''], self.render).content
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_off_with_a_per_process_cache(self):
+        self.assertFalse(page_cache.enabled())
+        self.assertEqual((self.get(), self.get()), (b'render 1', b'render 2'))
+
+    def test_cached_until_the_next_ingest(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}):
+            self.assertTrue(page_cache.enabled())
+            self.assertEqual((self.get(), self.get()), (b'render 1', b'render 1'))
+            page_cache.bump_ingest_generation()
+            self.assertEqual(self.get(), b'render 2')
+
+
+class ApiConditionalTests(TestCase):
+
+    def setUp(self):
+        self.old = make_article('Budget session opens', age=timedelta(days=200))
+        self.recent = make_article('Election results')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared_cache = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}})
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+
+    def get(self, etag=None):
+        headers = {'if_none_match': etag} if etag else {}
+        return self.client.get(reverse('api_article_list'), headers=headers)
+
+    def test_unchanged_listing_is_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_archiving_an_older_row_changes_the_etag(self):
+        etag = self.get()['ETag']
+        self.assertEqual(archive_batch(Article, retention_cutoff(180))[0], 1)
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_edit_changes_the_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.old.title = 'Budget session opens with protests'
+            self.old.save()
+        self.assertEqual(self.get(etag).status_code, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   PAGE_CACHE_ENABLED=False)
+class QueryBudgetTests(TestCase):
+    """Every page renders within its QUERY_BUDGETS entry, however many rows it lists"""
+
+    def setUp(self):
+        # Enough rows to fill a page, some with copies, so an N+1 repeats past the threshold
+        for index in range(40):
+            story = make_article(f'Cricket story {index}', f'Summary of match {index}', keyword='cricket',
+                                 age=timedelta(minutes=index))
+            if index % 4 == 0:
+                make_article(f'Cricket story {index} - News18', duplicate_of=story)
+        self.story = Article.objects.filter(duplicate_of__isnull=True, near_duplicates__isnull=False).first()
+        # Fresh, so no view starts a crawl
+        freshness.mark_crawled()
+        freshness.mark_crawled('cricket')
+
+    def test_home(self):
+        with query_budget(view='index'):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(len(response.context['articles']), 20)
+
+    def test_search(self):
+        with query_budget(view='search'):
+            response = self.client.get(reverse('search'), {'q': 'cricket'})
+        self.assertEqual(len(response.context['articles']), 30)
+
+    def test_detail(self):
+        with query_budget(view='article_detail'):
+            response = self.client.get(reverse('article_detail', args=[self.story.pk]))
+        self.assertEqual(response.context['article'].pk, self.story.pk)
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        self.cutoff = retention_cutoff(180)
+
+    def test_round_trip(self):
+        old = make_article('Budget session opens', 'Finance minister presents', keyword='budget',
+                           age=timedelta(days=200))
+        recent = make_article('Election results', age=timedelta(days=10))
+
+        moved, raw_bytes, packed_bytes = archive_batch(Article, self.cutoff)
+        self.assertEqual(moved, 1)
+        self.assertGreater(raw_bytes, 0)
+        self.assertFalse(Article.objects.filter(pk=old.pk).exists())
+        self.assertTrue(Article.objects.filter(pk=recent.pk).exists())
+        self.assertEqual(archived_hashes(Article, {old.content_hash, recent.content_hash}), {old.content_hash})
+
+        restored = get_archived(Article, old.pk)
+        self.assertEqual((restored.title, restored.summary, restored.keyword),
+                         (old.title, old.summary, old.keyword))
+        self.assertEqual(restored.created_at, old.created_at)
+        self.assertIsNotNone(restored.archived_at)
+        self.assertEqual(archive_batch(Article, self.cutoff)[0], 0)
+
+    def test_story_with_live_copies_stays(self):
+        story = make_article('Rail fares go up', age=timedelta(days=200))
+        copy = make_article('Rail fares go up - News18', duplicate_of=story, age=timedelta(days=20))
+
+        self.assertFalse(archivable(Article, self.cutoff).exists())
+        self.assertEqual(archive_batch(Article, self.cutoff)[0], 0)
+        copy.refresh_from_db()
+        self.assertEqual(copy.duplicate_of_id, story.pk)
+
+    def test_story_goes_with_old_copies(self):
+        story = make_article('Rail fares go up', age=timedelta(days=200))
+        make_article('Rail fares go up - News18', duplicate_of=story, age=timedelta(days=190))
+
+        self.assertEqual(archive_batch(Article, self.cutoff)[0], 2)
+        self.assertFalse(Article.objects.exists())
+
+
+class MatchingTests(TestCase):
+
+    def setUp(self):
+        self.final = make_article('Cricket final in Mumbai', 'India beat Australia', keyword='cricket')
+        self.cup = make_article('Cricket world cup squad named', 'Selectors pick fifteen players')
+        self.monsoon = make_article('Monsoon reaches Kerala', 'Heavy rain expected in India')
+
+    def ids(self, text):
+        return set(matching(Article, text).values_list('id', flat=True))
+
+    def test_saved_articles_are_indexed(self):
+        self.assertTrue(ArticleTerm.objects.filter(article=self.final, term='mumbai').exists())
+        self.assertFalse(ArticleTerm.objects.filter(term='in').exists())
+
+    def test_prefix_and_intersection(self):
+        self.assertEqual(self.ids('crick'), {self.final.pk, self.cup.pk})
+        self.assertEqual(self.ids('cricket india'), {self.final.pk})
+        self.assertEqual(self.ids('india'), {self.final.pk, self.monsoon.pk})
+        self.assertEqual(self.ids('hockey'), set())
+
+    def test_both_plans_agree(self):
+        queryset = Article.objects.order_by('-created_at')
+        terms = postings.query_terms('cricket india')
+        for page_size in (0, 10 ** 9):
+            with mock.patch.object(postings, 'LISTING_PAGE_SIZE', page_size):
+                found = set(postings.filter_matching(queryset, terms).values_list('id', flat=True))
+            self.assertEqual(found, {self.final.pk})
+
+    def test_edit_replaces_postings(self):
+        self.cup.title = 'Hockey world cup squad named'
+        self.cup.save()
+        self.assertEqual(self.ids('cricket'), {self.final.pk})
+        self.assertEqual(self.ids('hockey'), {self.cup.pk})
+
+    def test_delete_removes_postings(self):
+        pk = self.monsoon.pk
+        self.monsoon.delete()
+        self.assertFalse(ArticleTerm.objects.filter(article_id=pk).exists())
+
+    def test_stopwords_only_query_uses_full_text_search(self):
+        self.assertEqual(postings.query_terms('the of'), [])
+        self.assertEqual(self.ids('the'), set())
+
+    def test_rebuild_restores_missing_postings(self):
+        ArticleTerm.objects.all().delete()
+        postings.rebuild()
+        self.assertEqual(self.ids('crick'), {self.final.pk, self.cup.pk})
+
+
+@override_settings(SSE_POLL_INTERVAL=0.01, SSE_MAX_DURATION=10, PAGE_CACHE_ENABLED=False)
+class SearchStreamTests(TestCase):
+
+    def test_articles_saved_elsewhere_wake_the_stream(self):
+        job = CrawlJob.objects.create(key='search:cricket', status=CrawlJob.RUNNING, worker='host:1',
+                                      lease_expires_at=timezone.now() + timedelta(minutes=1))
+
+        async def run():
+            events = article_events('cricket')
+            self.assertTrue((await events.__anext__()).startswith('retry:'))
+            waiting = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0.05)
+            # Saved without touching this process's state, as a crawl_worker would
+            article = await sync_to_async(make_article)('Cricket final in Mumbai')
+            first = await asyncio.wait_for(waiting, 5)
+            await sync_to_async(CrawlJob.objects.filter(pk=job.pk).update)(status=CrawlJob.COMPLETED)
+            done = await asyncio.wait_for(events.__anext__(), 5)
+            return article, first, done
+
+        article, first, done = async_to_sync(run)()
+        self.assertIn('event: article', first)
+        self.assertIn(f'id: {article.pk}', first)
+        self.assertIn('event: done', done)
+
+    def test_results_page_only_mentions_a_queued_crawl(self):
+        make_article('Cricket final in Mumbai')
+        for outcome, crawling in ((freshness.FRESH, False), (freshness.STARTED, True)):
+            with mock.patch('newsapp.views.request_refresh', return_value=outcome):
+                response = self.client.get(reverse('search'), {'q': 'cricket'})
+            self.assertEqual('The crawler is fetching' in response.content.decode(), crawling)
+            self.assertEqual(reverse('search_stream') in response.content.decode(), crawling)
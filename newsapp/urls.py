@@ -1,7 +1,7 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from django.views.generic import RedirectView
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', views.google_news_home, name='index'),
@@ -9,7 +9,16 @@ urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='newsapp/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('search/', views.google_news_search, name='search'),
+    path('search/stream/', views.google_news_stream, name='search_stream'),
     path('article/<int:article_id>/', views.google_news_detail, name='article_detail'),
+
+    # Read-only JSON API
+    path('api/articles/', api.resource_list, {'resource': 'articles'}, name='api_article_list'),
+    path('api/articles/search/', api.resource_search, {'resource': 'articles'}, name='api_article_search'),
+    path('api/articles/<int:pk>/', api.resource_detail, {'resource': 'articles'}, name='api_article_detail'),
+    path('api/news/', api.resource_list, {'resource': 'news'}, name='api_news_list'),
+    path('api/news/search/', api.resource_search, {'resource': 'news'}, name='api_news_search'),
+    path('api/news/<int:pk>/', api.resource_detail, {'resource': 'news'}, name='api_news_detail'),
     
     # Old dashboard urls (kept for compatibility but redirected)
     path('dashboard/', RedirectView.as_view(pattern_name='index'), name='dashboard'),
@@ -1,11 +1,18 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Q
 from .models import NewsArticle, NewsSource, Article
+from .search import search_news_articles, matching
+from .pagination import paginate
+from .page_cache import cached_response
+from .streaming import article_events
+from .archive import get_archived
 from crawler.crawler_api import run_crawler
-from crawler.google_news_crawler import run_google_news_crawler
+from crawler.freshness import request_refresh, FRESH
 import re
 
 def index(request):
@@ -32,12 +39,11 @@ def register(request):
 @login_required
 def dashboard(request):
     """Dashboard view - shows trending news articles"""
-    # Get the latest 20 articles
-    articles = NewsArticle.objects.all()[:20]
-    sources = NewsSource.objects.filter(is_active=True)
+    # Get the latest 20 articles, with the source each one shows and only the listed columns
+    articles = list(NewsArticle.objects.select_related('source').only(*NewsArticle.LIST_FIELDS)[:20])
     
     # If there are no articles, trigger the crawler
-    if articles.count() == 0 and sources.count() > 0:
+    if not articles and NewsSource.objects.filter(is_active=True).exists():
         run_crawler()
         messages.info(request, 'Fetching latest news. Please refresh in a moment.')
     
@@ -62,8 +68,7 @@ def search(request):
         
         # Get matching articles - filtering out articles where keyword was just appended
         # Look for articles where the keyword appears naturally in the content
-        articles = NewsArticle.objects.filter(headline__icontains=keyword) | \
-                  NewsArticle.objects.filter(summary__icontains=keyword)
+        articles = search_news_articles(keyword)
         
         # Filter out articles where the keyword was clearly appended
         # (looking for patterns like "related to keyword" or "The article discusses keyword")
@@ -78,8 +83,8 @@ def search(request):
                 filtered_articles.append(article)
         
         # Use all articles if our filtering removed too many
-        if len(filtered_articles) < 3 and articles.count() > 0:
-            filtered_articles = list(articles)
+        if len(filtered_articles) < 3 and len(articles) > 0:
+            filtered_articles = articles
             
         articles = filtered_articles
     else:
@@ -100,53 +105,110 @@ def article_detail(request, article_id):
 # Google News Views
 def google_news_home(request):
     """Google News home view showing trending articles"""
-    # Trigger a crawl every time the page is refreshed (for trending news)
-    run_google_news_crawler()
+    # Refresh trending news in the background once the stored articles are stale
+    request_refresh()
     
-    # Get the latest articles
-    articles = Article.objects.all().order_by('-created_at')[:20]
-    
-    context = {
-        'articles': articles,
-        'title': 'Trending News'
-    }
-    return render(request, 'newsapp/google_news_home.html', context)
+    # Get the latest articles, one keyset page at a time
+    cursor = request.GET.get('cursor', '')
+
+    def render_page():
+        # Near-duplicate copies of a story are only listed on its detail page;
+        # the cards read the precomputed snippet, never the full summary
+        queryset = Article.objects.filter(duplicate_of__isnull=True).only(*Article.LIST_FIELDS)
+        page = paginate(queryset, cursor=cursor, page_size=20)
+        context = {
+            'articles': page.items,
+            'cursor': page.cursor or '',
+            'next_cursor': page.next_cursor,
+            'title': 'Trending News'
+        }
+        return render(request, 'newsapp/google_news_home.html', context)
+
+    # Served from the page cache until the next crawl inserts articles
+    return cached_response(request, 'google_news_home', [cursor], render_page)
 
 def google_news_search(request):
     """Google News search view"""
     keyword = request.GET.get('q', '')
     
     if keyword:
-        # Trigger crawler for this keyword
-        run_google_news_crawler(keyword=keyword)
-        messages.info(request, f'Fetching news for "{keyword}". Results will appear as they are crawled.')
+        # Trigger crawler for this keyword unless it was crawled recently
+        crawling = request_refresh(keyword) != FRESH
+        if crawling:
+            messages.info(request, f'Fetching news for "{keyword}". Results will appear as they are crawled.')
         
-        # Get articles matching the keyword
-        articles = Article.objects.filter(
-            Q(keyword=keyword) | 
-            Q(title__icontains=keyword) | 
-            Q(summary__icontains=keyword)
-        ).order_by('-created_at')[:30]
-        
-        context = {
-            'articles': articles,
-            'keyword': keyword,
-            'title': f'Search Results for "{keyword}"'
-        }
+        # Get articles matching the keyword, newest first, one keyset page at a time
+        cursor = request.GET.get('cursor', '')
+
+        def render_page():
+            queryset = matching(Article, keyword).filter(duplicate_of__isnull=True).only(*Article.LIST_FIELDS)
+            page = paginate(queryset, cursor=cursor, page_size=30)
+            context = {
+                'articles': page.items,
+                'cursor': page.cursor or '',
+                'next_cursor': page.next_cursor,
+                # The first page subscribes to articles saved after the newest one shown
+                'latest_id': max((article.id for article in page.items), default=0),
+                'keyword': keyword,
+                # Only then does the page say so and open the stream
+                'crawling': crawling,
+                'title': f'Search Results for "{keyword}"'
+            }
+            return render(request, 'newsapp/google_news_results.html', context)
+
+        # Served from the page cache until the next crawl inserts articles
+        return cached_response(request, 'google_news_search', [keyword, cursor, crawling], render_page)
     else:
         # If no keyword, show trending news
         return redirect('google_news_home')
-        
-    return render(request, 'newsapp/google_news_results.html', context)
+
+async def google_news_stream(request):
+    """Server-sent events for articles saved while a search crawl is running"""
+    keyword = request.GET.get('q', '')
+    if not keyword:
+        return HttpResponseBadRequest('Missing search keyword')
+
+    # EventSource sends Last-Event-ID when it reconnects
+    after = request.headers.get('Last-Event-ID') or request.GET.get('after') or 0
+    try:
+        after_id = int(after)
+    except ValueError:
+        after_id = 0
+
+    # Under WSGI the response is buffered, so answer right away and let the client poll
+    once = not isinstance(request, ASGIRequest)
+    response = StreamingHttpResponse(article_events(keyword, after_id, once=once), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 def google_news_detail(request, article_id):
     """Google News article detail view"""
-    article = get_object_or_404(Article, id=article_id)
+    article = Article.objects.filter(id=article_id).first()
+    archived = article is None
+    if archived:
+        # Links to articles moved out by the retention job keep working
+        article = get_archived(Article, article_id)
+        if article is None:
+            raise Http404('No article matches the given query.')
     keyword = request.GET.get('q', '')
+    # Cursor of the listing page we came from, so "Back" returns to it
+    cursor = request.GET.get('cursor', '')
+
+    # Other outlets' copies of the same story (archived copies are detached)
+    other_coverage = []
+    if not archived:
+        canonical_id = article.duplicate_of_id or article.id
+        other_coverage = Article.objects.filter(
+            Q(id=canonical_id) | Q(duplicate_of_id=canonical_id)
+        ).exclude(id=article.id).order_by('created_at')[:10]
     
     context = {
         'article': article,
+        'archived': archived,
+        'other_coverage': other_coverage,
         'keyword': keyword,
+        'cursor': cursor,
         'from_search': bool(keyword)
     }
     return render(request, 'newsapp/google_news_detail.html', context)
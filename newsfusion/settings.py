@@ -71,6 +71,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'newsapp.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'newsfusion.urls'
@@ -104,6 +105,28 @@ DATABASES = {
     }
 }
 
+# SQLite concurrent-writer mode, for crawls writing while web workers read.
+# WAL journaling lets readers run during a write; writers wait up to
+# `timeout` seconds for the lock instead of failing with "database is
+# locked"; IMMEDIATE transactions take the write lock when they begin, so
+# two read-then-write transactions cannot deadlock on the upgrade (which no
+# timeout can resolve). The pragmas run on every new connection.
+# `manage.py stress_database` checks the setup under parallel load.
+SQLITE_CONCURRENT_MODE = os.environ.get('SQLITE_CONCURRENT_MODE', '1') != '0'
+if SQLITE_CONCURRENT_MODE:
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'    # Durable across crashes in WAL mode, fsyncs at checkpoints
+            'PRAGMA busy_timeout=20000;'
+            'PRAGMA cache_size=-32000;'     # 32 MB page cache per connection
+            'PRAGMA mmap_size=268435456;'   # 256 MB memory-mapped reads
+            'PRAGMA temp_store=MEMORY;'
+        ),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -162,3 +185,111 @@ TEMPLATES[0]['DIRS'] = [BASE_DIR / 'templates']
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+
+# Crawl pipelines: items are written with one bulk_create per batch,
+# flushed when full, when the oldest item is older than the interval
+# (seconds) or when the spider closes. A batch size of 1 disables batching.
+PIPELINE_BATCH_SIZE = 50
+PIPELINE_BATCH_INTERVAL = 5.0
+# Database writes run on one writer thread per pipeline, off the reactor.
+# Once this many writes are queued, items wait for theirs to finish, which
+# pauses new downloads until the writer catches up.
+PIPELINE_ASYNC_WRITES = True
+PIPELINE_WRITE_QUEUE_SIZE = 4
+
+# Ingest deduplication: Bloom filter over stored content hashes, so
+# definitely-new articles skip the duplicate lookup query
+DEDUP_FILTER_ENABLED = True
+DEDUP_FILTER_DIR = BASE_DIR / 'var' / 'dedup'
+DEDUP_FILTER_ERROR_RATE = 0.001
+
+# Crawl service: maximum spiders running at once in this process, and how
+# many finished jobs to keep for status lookups
+CRAWL_SERVICE_MAX_CONCURRENT = 2
+CRAWL_SERVICE_HISTORY_SIZE = 200
+
+# Crawl freshness: page views within this many seconds of the last
+# successful crawl for a keyword do not trigger a new one. The refresh
+# timeout releases the single-refresh marker if a crawl never reports back.
+CRAWL_FRESHNESS_TTL = 900
+CRAWL_REFRESH_TIMEOUT = 600
+
+# The page cache, the ingest generation and the crawl freshness markers must
+# be seen by every process: web workers, crawl_worker and management
+# commands. The file cache is shared by the processes of one machine; use
+# Redis or Memcached when they run on several.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache',
+    }
+}
+
+# Listing page cache: rendered pages are reused until the pipelines commit
+# new articles (which bumps the ingest generation) or the timeout passes.
+# It stays off with a per-process cache backend, which would not see the bumps.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 3600
+
+# Search result streaming (server-sent events): how often an open stream
+# checks for new articles, and the longest it stays open
+SSE_POLL_INTERVAL = 1.0
+SSE_MAX_DURATION = 300
+
+# Near-duplicate stories: articles whose title + summary SimHash is within
+# NEAR_DUPLICATE_MAX_DISTANCE bits (at most 3) of an article stored in the
+# last NEAR_DUPLICATE_WINDOW_DAYS are either stored as hidden copies
+# ('mark') or not stored at all ('drop')
+NEAR_DUPLICATE_ENABLED = True
+NEAR_DUPLICATE_ACTION = 'mark'
+NEAR_DUPLICATE_MAX_DISTANCE = 3
+NEAR_DUPLICATE_WINDOW_DAYS = 7
+
+# Crawl job records: how often a running spider writes its progress
+# (seconds), and how long finished jobs are kept (days)
+CRAWL_JOB_PROGRESS_INTERVAL = 2.0
+CRAWL_JOB_RETENTION_DAYS = 30
+
+# Crawl backend: 'thread' runs crawls on the in-process crawl service;
+# 'queue' stores them as CrawlJob rows for `manage.py crawl_worker`, which
+# can run on several machines (needs a shared cache for crawl freshness)
+CRAWL_BACKEND = 'thread'
+CRAWL_QUEUE_LEASE_TIMEOUT = 300
+CRAWL_QUEUE_MAX_ATTEMPTS = 3
+CRAWL_QUEUE_RETRY_DELAY = 30
+CRAWL_WORKER_PROCESSES = None  # CPU count
+CRAWL_WORKER_CONCURRENCY = 2
+CRAWL_WORKER_POLL_INTERVAL = 2.0
+
+# Incremental crawling: start pages are fetched with If-None-Match /
+# If-Modified-Since and skipped without parsing when the server answers 304
+# or the page fingerprint is unchanged (`-a incremental=0` forces a full crawl)
+INCREMENTAL_CRAWL_ENABLED = True
+
+# Ingest metrics: per-stage timings (fetch, parse, dedup, neardup, db_write, postings)
+# and crawl counters, summed over all crawls and served at /crawler/metrics/
+INGEST_METRICS_ENABLED = True
+
+# SQL budgets: requests running more queries than their URL name's budget,
+# or one statement QUERY_BUDGET_REPEAT_THRESHOLD times (a likely N+1), are
+# logged as warnings by newsapp.query_budget.QueryBudgetMiddleware
+QUERY_BUDGET_ENABLED = True
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGET_REPEAT_THRESHOLD = 5
+QUERY_BUDGETS = {
+    'index': 4,
+    'search': 4,
+    'article_detail': 4,
+    'google_news_detail': 4,
+}
+
+# Retention: `manage.py archive_articles` moves Article / NewsArticle rows
+# older than this many days into the compressed ArchivedArticle table, in
+# batches of ARCHIVE_BATCH_SIZE rows per transaction (None keeps everything)
+ARTICLE_RETENTION_DAYS = 180
+ARCHIVE_BATCH_SIZE = 500
+
+# Search postings: ingest writes an inverted index of Article terms
+# (newsapp.postings) and searches seek it before falling back to FTS5;
+# after turning this back on, run `manage.py rebuild_search_index`
+SEARCH_POSTINGS_ENABLED = True